@@ -15,6 +15,8 @@ from fastapi.staticfiles import StaticFiles
 import uuid
 
 from sources.llm_provider import Provider
+from sources.llm_cache import LLMCache
+from sources.request_scheduler import RequestScheduler
 from sources.interaction import Interaction
 from sources.agents import CasualAgent, CoderAgent, FileAgent, PlannerAgent, BrowserAgent
 from sources.browser import Browser, create_driver
@@ -50,6 +52,11 @@ if not os.path.exists(".screenshots"):
     os.makedirs(".screenshots")
 api.mount("/screenshots", StaticFiles(directory=".screenshots"), name="screenshots")
 
+stream_buffer = []
+
+def on_stream_chunk(chunk: str) -> None:
+    stream_buffer.append(chunk)
+
 def initialize_system():
     stealth_mode = config.getboolean('BROWSER', 'stealth_mode')
     personality_folder = "jarvis" if config.getboolean('MAIN', 'jarvis_personality') else "base"
@@ -77,8 +84,15 @@ def initialize_system():
         provider_name=config["MAIN"]["provider_name"],
         model=config["MAIN"]["provider_model"],
         server_address=config["MAIN"]["provider_server_address"],
-        is_local=config.getboolean('MAIN', 'is_local')
+        is_local=config.getboolean('MAIN', 'is_local'),
+        response_cache=LLMCache() if config.getboolean('MAIN', 'llm_cache', fallback=False) else None,
+        scheduler=RequestScheduler(config.getint('MAIN', 'max_concurrent_requests', fallback=4)),
+        load_balancing=config.get('MAIN', 'load_balancing', fallback="least_outstanding"),
+        hedge_after=config.getfloat('MAIN', 'hedge_after', fallback=0) or None,
+        keep_alive=config.get('MAIN', 'ollama_keep_alive', fallback=None),
+        max_context_length=config.getint('MAIN', 'max_context_length', fallback=0) or None
     )
+    provider.start_warm_up()
     logger.info(f"Provider initialized: {provider.provider_name} ({provider.model})")
 
     browser = Browser(
@@ -114,6 +128,8 @@ def initialize_system():
             provider=provider, verbose=False, browser=browser
         )
     ]
+    for agent in agents:
+        agent.set_stream_callback(on_stream_chunk)
     logger.info("Agents initialized")
 
     interaction = Interaction(
@@ -145,7 +161,23 @@ async def get_screenshot():
 @api.get("/health")
 async def health_check():
     logger.info("Health check endpoint called")
-    return {"status": "healthy", "version": "0.1.0"}
+    provider = interaction.agents[0].llm
+    return {"status": "healthy" if provider.is_warm() else "warming_up", "version": "0.1.0",
+            "models": provider.warm_status}
+
+@api.get("/llm_queue")
+async def llm_queue():
+    provider = interaction.agents[0].llm
+    return JSONResponse(status_code=200, content={**provider.scheduler.get_metrics(),
+                                                  "endpoints": provider.balancer.get_status()})
+
+@api.get("/llm_metrics")
+async def llm_metrics(group_by: str = "agent"):
+    provider = interaction.agents[0].llm
+    try:
+        return JSONResponse(status_code=200, content=provider.telemetry.get_summary(group_by))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
 
 @api.get("/is_active")
 async def is_active():
@@ -183,6 +215,16 @@ async def get_latest_answer():
         return JSONResponse(status_code=200, content=query_resp_history[-1])
     return JSONResponse(status_code=404, content={"error": "No answer available"})
 
+@api.get("/stream_answer")
+async def get_stream_answer(offset: int = 0):
+    text = "".join(stream_buffer)
+    return JSONResponse(status_code=200, content={
+        "text": text[offset:],
+        "offset": len(text),
+        "agent_name": interaction.current_agent.agent_name if interaction.current_agent else "None",
+        "is_generating": is_generating
+    })
+
 async def think_wrapper(interaction, query):
     try:
         interaction.last_query = query
@@ -221,9 +263,14 @@ async def process_query(request: QueryRequest):
     if is_generating:
         logger.warning("Another query is being processed, please wait.")
         return JSONResponse(status_code=429, content=query_resp.jsonify())
+    if not interaction.agents[0].llm.is_warm():
+        logger.warning("The model is still loading, please wait.")
+        query_resp.status = "Model is loading"
+        return JSONResponse(status_code=503, content=query_resp.jsonify())
 
     try:
         is_generating = True
+        stream_buffer.clear()
         success = await think_wrapper(interaction, request.query)
         is_generating = False
 
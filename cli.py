@@ -6,6 +6,8 @@ import configparser
 import asyncio
 
 from sources.llm_provider import Provider
+from sources.llm_cache import LLMCache
+from sources.request_scheduler import RequestScheduler
 from sources.interaction import Interaction
 from sources.agents import Agent, CoderAgent, CasualAgent, FileAgent, PlannerAgent, BrowserAgent, McpAgent
 from sources.browser import Browser, create_driver
@@ -26,7 +28,14 @@ async def main():
     provider = Provider(provider_name=config["MAIN"]["provider_name"],
                         model=config["MAIN"]["provider_model"],
                         server_address=config["MAIN"]["provider_server_address"],
-                        is_local=config.getboolean('MAIN', 'is_local'))
+                        is_local=config.getboolean('MAIN', 'is_local'),
+                        response_cache=LLMCache() if config.getboolean('MAIN', 'llm_cache', fallback=False) else None,
+                        scheduler=RequestScheduler(config.getint('MAIN', 'max_concurrent_requests', fallback=4)),
+                        load_balancing=config.get('MAIN', 'load_balancing', fallback="least_outstanding"),
+                        hedge_after=config.getfloat('MAIN', 'hedge_after', fallback=0) or None,
+                        keep_alive=config.get('MAIN', 'ollama_keep_alive', fallback=None),
+                        max_context_length=config.getint('MAIN', 'max_context_length', fallback=0) or None)
+    provider.start_warm_up()
 
     browser = Browser(
         create_driver(headless=config.getboolean('BROWSER', 'headless_browser'), stealth_mode=stealth_mode, lang=languages[0]),
@@ -54,12 +63,19 @@ async def main():
         #            provider=provider, verbose=False), # NOTE under development
     ]
 
+    if config.getboolean('MAIN', 'stream_output', fallback=False):
+        for agent in agents:
+            agent.set_stream_callback(lambda chunk: pretty_print(chunk, color="status", no_newline=True))
+
     interaction = Interaction(agents,
                               tts_enabled=config.getboolean('MAIN', 'speak'),
                               stt_enabled=config.getboolean('MAIN', 'listen'),
                               recover_last_session=config.getboolean('MAIN', 'recover_last_session'),
                               langs=languages
                             )
+    if not provider.is_warm():
+        pretty_print("Waiting for the model to load...", color="status")
+        await asyncio.to_thread(provider.wait_until_warm)
     try:
         while interaction.is_active:
             interaction.get_user()
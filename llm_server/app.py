@@ -1,8 +1,10 @@
 #!/usr/bin python3
 
 import argparse
-import time
-from flask import Flask, jsonify, request
+import json
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
 from sources.llamacpp_handler import LlamacppLLM
 from sources.ollama_handler import OllamaLLM
@@ -10,44 +12,145 @@ from sources.ollama_handler import OllamaLLM
 parser = argparse.ArgumentParser(description='AgenticSeek server script')
 parser.add_argument('--provider', type=str, help='LLM backend library to use. set to [ollama], [vllm] or [llamacpp]', required=True)
 parser.add_argument('--port', type=int, help='port to use', required=True)
+parser.add_argument('--workers', type=int, default=2, help='number of generations running at the same time')
+parser.add_argument('--max-queue', type=int, default=16, help='number of generations waiting for a worker before requests are refused')
+parser.add_argument('--cache', action='store_true', help='answer a conversation already answered from the prompt cache instead of generating again')
+parser.add_argument('--max-memory', type=float, default=None, help='memory budget of the loaded models in GB, least recently used models are unloaded over it')
+parser.add_argument('--max-models', type=int, default=None, help='maximum number of models loaded at the same time')
+parser.add_argument('--n-ctx', type=int, default=4096, help='llama.cpp context size in tokens')
+parser.add_argument('--n-threads', type=int, default=None, help='llama.cpp number of CPU threads')
+parser.add_argument('--n-batch', type=int, default=512, help='llama.cpp number of prompt tokens evaluated at once')
+parser.add_argument('--no-mmap', action='store_true', help='llama.cpp reads the model file instead of mapping it in memory')
+parser.add_argument('--mlock', action='store_true', help='llama.cpp locks the model in RAM')
+parser.add_argument('--batch-size', type=int, default=1, help='llama.cpp number of generations decoded together (continuous batching)')
+parser.add_argument('--state-cache', type=float, default=1.0, help='llama.cpp memory in GB of the conversation KV states kept per model')
+parser.add_argument('--gguf', type=str, default="*Q8_0.gguf", help='llama.cpp GGUF file pattern to download from the model repository')
 args = parser.parse_args()
 
-app = Flask(__name__)
+app = FastAPI(title="AgenticSeek LLM server")
 
 assert args.provider in ["ollama", "llamacpp"], f"Provider {args.provider} does not exists. see --help for more information"
 
 handler_map = {
-    "ollama": OllamaLLM(),
-    "llamacpp": LlamacppLLM(),
+    "ollama": OllamaLLM,
+    "llamacpp": LlamacppLLM,
 }
 
-generator = handler_map[args.provider]
+handler_options = {
+    "ollama": {},
+    "llamacpp": {
+        "n_ctx": args.n_ctx,
+        "n_threads": args.n_threads,
+        "n_batch": args.n_batch,
+        "use_mmap": not args.no_mmap,
+        "use_mlock": args.mlock,
+        "gguf_file": args.gguf,
+        "batch_size": args.batch_size,
+        "state_cache_bytes": int(args.state_cache * 1024**3),
+    },
+}
+
+# with continuous batching each batched generation holds a worker while it is decoded
+workers = max(args.workers, args.batch_size) if args.provider == "llamacpp" else args.workers
+max_memory = int(args.max_memory * 1024**3) if args.max_memory else None
+generator = handler_map[args.provider](max_workers=workers, max_queue=args.max_queue, use_cache=args.cache,
+                                       max_memory=max_memory, max_models=args.max_models,
+                                       **handler_options[args.provider])
+
+def error(message: str, status_code: int) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=status_code)
 
-@app.route('/generate', methods=['POST'])
-def start_generation():
+@app.post('/generate')
+async def start_generation(request: Request):
     if generator is None:
-        return jsonify({"error": "Generator not initialized"}), 401
-    data = request.get_json()
+        return error("Generator not initialized", 401)
+    data = await request.json()
+    if data.get('model') is None and generator.model is None:
+        return error("Model not set", 403)
     history = data.get('messages', [])
-    if generator.start(history):
-        return jsonify({"message": "Generation started"}), 202
-    return jsonify({"error": "Generation already in progress"}), 402
+    request_id = generator.start(history, data.get('request_id'), data.get('model'))
+    if request_id is not None:
+        return JSONResponse({"message": "Generation started", "request_id": request_id}, status_code=202)
+    return error("Generation queue full or request already in progress", 429)
 
-@app.route('/setup', methods=['POST'])
-def setup():
-    data = request.get_json()
+@app.post('/setup')
+def setup(data: dict):
+    # sync route: loading the model runs in the thread pool without blocking the event loop
     model = data.get('model', None)
     if model is None:
-        return jsonify({"error": "Model not provided"}), 403
+        return error("Model not provided", 403)
     generator.set_model(model)
-    return jsonify({"message": "Model set"}), 200
+    return {"message": "Model set"}
+
+@app.get('/model_info')
+def model_info(model: str | None = None):
+    model = model or generator.model
+    if model is None:
+        return error("Model not set", 403)
+    return {"model": model, "context_length": generator.get_context_length(model)}
+
+@app.get('/models')
+async def models():
+    return generator.models.get_metrics()
 
-@app.route('/get_updated_sentence')
-def get_updated_sentence():
+@app.get('/metrics')
+async def metrics():
+    """
+    Metrics in the Prometheus text exposition format.
+    """
+    return PlainTextResponse(generator.render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get('/status')
+async def status(offset: int = 0, request_id: str | None = None, timeout: float = 0):
+    """
+    Text generated after offset, the client sends back the offset of the answer on the next call.
+    With a timeout, wait until new text is generated or the generation ends.
+    """
+    if timeout > 0:
+        status = await generator.async_wait_for_update(offset, timeout, request_id)
+    else:
+        status = generator.get_status(request_id, offset)
+    if status is None:
+        return error(f"Unknown request id {request_id}", 404)
+    return status
+
+@app.get('/get_updated_sentence')
+async def get_updated_sentence(offset: int | None = None, request_id: str | None = None, timeout: float = 30.0):
     if not generator:
-        return jsonify({"error": "Generator not initialized"}), 405
-    print(generator.get_status())
-    return generator.get_status()
+        return error("Generator not initialized", 405)
+    if offset is not None:
+        # long-poll, only return the text generated after offset
+        status = await generator.async_wait_for_update(offset, timeout, request_id)
+    else:
+        status = generator.get_status(request_id)
+    if status is None:
+        return error(f"Unknown request id {request_id}", 404)
+    return status
+
+@app.get('/stream')
+async def stream(request_id: str | None = None):
+    if not generator:
+        return error("Generator not initialized", 405)
+    request_id = request_id or generator.last_request_id
+    if generator.get_session(request_id) is None:
+        return error(f"Unknown request id {request_id}", 404)
+
+    async def events():
+        offset = 0
+        while True:
+            status = await generator.async_wait_for_update(offset, request_id=request_id)
+            if status is None:
+                # the session expired while streaming
+                yield f"event: error\ndata: {json.dumps({'error': f'Unknown request id {request_id}'})}\n\n"
+                break
+            offset = status["offset"]
+            if status["sentence"]:
+                yield f"data: {json.dumps({'text': status['sentence']})}\n\n"
+            if status["is_complete"]:
+                yield "event: done\ndata: {}\n\n"
+                break
+    return StreamingResponse(events(), media_type='text/event-stream', headers={"Cache-Control": "no-cache"})
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', threaded=True, debug=True, port=args.port)
\ No newline at end of file
+    # no access log: pollers would log a line per poll
+    uvicorn.run(app, host='0.0.0.0', port=args.port, access_log=False)
@@ -0,0 +1,168 @@
+import threading
+import logging
+from collections import deque
+
+class Sequence:
+    """
+    One generation decoded by the batch scheduler.
+    """
+    def __init__(self, tokens: list, state, max_new_tokens: int):
+        self.tokens = tokens
+        self.state = state
+        self.max_new_tokens = max_new_tokens
+        self.seq_id = None
+        self.n_past = 0
+        self.n_generated = 0
+        self.last_token = None
+        self.pending = b"" # bytes of an incomplete utf-8 character
+        self.error = None
+        self.done = threading.Event()
+
+class BatchScheduler:
+    """
+    Continuous batching: every step decodes one token of each active sequence in a single batch,
+    and waiting sequences are admitted as soon as a sequence finishes, instead of running whole generations one after the other.
+    The backend must implement:
+        prefill(seq_id, tokens) -> next token
+        decode([(seq_id, token, pos), ...]) -> next token of each sequence
+        is_eos(token) -> bool
+        detokenize(token) -> bytes
+        release(seq_id)
+    """
+    def __init__(self, backend, max_sequences: int = 4, max_waiting: int = 64):
+        """
+        Args:
+            backend: Model decoding several sequences at once.
+            max_sequences (int): Number of sequences decoded together.
+            max_waiting (int): Number of sequences waiting for a slot before new ones are refused.
+        """
+        self.backend = backend
+        self.max_sequences = max_sequences
+        self.max_waiting = max_waiting
+        self.waiting = deque()
+        self.active = []
+        self.free_ids = list(range(max_sequences - 1, -1, -1))
+        self.cond = threading.Condition()
+        self.thread = None
+        self.running = True
+        self.steps = 0
+        self.decoded_tokens = 0
+        self.logger = logging.getLogger(__name__)
+
+    def submit(self, tokens: list, state, max_new_tokens: int) -> Sequence:
+        """
+        Queue a sequence, its text is appended to state as it is decoded.
+        """
+        sequence = Sequence(tokens, state, max_new_tokens)
+        with self.cond:
+            if len(self.waiting) >= self.max_waiting:
+                raise Exception("Batch queue full")
+            self.waiting.append(sequence)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.loop, daemon=True, name="batch-scheduler")
+                self.thread.start()
+            self.cond.notify()
+        return sequence
+
+    def generate(self, tokens: list, state, max_new_tokens: int) -> None:
+        """
+        Decode a sequence and wait until it is done.
+        """
+        sequence = self.submit(tokens, state, max_new_tokens)
+        sequence.done.wait()
+        if sequence.error is not None:
+            raise sequence.error
+
+    def loop(self) -> None:
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.waiting or self.active or not self.running)
+                if not self.running:
+                    return
+            try:
+                self.admit()
+                if self.active:
+                    self.step()
+            except Exception as e:
+                self.logger.error(f"Batch decoding failed: {e}")
+                for sequence in list(self.active):
+                    sequence.error = e
+                    self.retire(sequence)
+
+    def admit(self) -> None:
+        """
+        Prefill the waiting sequences while there are free slots.
+        """
+        while self.free_ids:
+            with self.cond:
+                if not self.waiting:
+                    return
+                sequence = self.waiting.popleft()
+            sequence.seq_id = self.free_ids.pop()
+            self.active.append(sequence)
+            try:
+                token = self.backend.prefill(sequence.seq_id, sequence.tokens)
+            except Exception as e:
+                sequence.error = e
+                self.retire(sequence)
+                continue
+            sequence.n_past = len(sequence.tokens)
+            self.emit(sequence, token)
+
+    def step(self) -> None:
+        """
+        Decode one token of every active sequence.
+        """
+        sequences = list(self.active)
+        tokens = self.backend.decode([(s.seq_id, s.last_token, s.n_past) for s in sequences])
+        self.steps += 1
+        self.decoded_tokens += len(sequences)
+        for sequence, token in zip(sequences, tokens):
+            sequence.n_past += 1
+            self.emit(sequence, token)
+
+    def emit(self, sequence: Sequence, token: int) -> None:
+        """
+        Stream the text of a decoded token, or retire the sequence at the end of its generation.
+        """
+        if self.backend.is_eos(token) or sequence.n_generated >= sequence.max_new_tokens:
+            self.retire(sequence)
+            return
+        sequence.n_generated += 1
+        sequence.last_token = token
+        sequence.pending += self.backend.detokenize(token)
+        try:
+            text = sequence.pending.decode("utf-8")
+        except UnicodeDecodeError:
+            if len(sequence.pending) < 4:
+                return
+            text = sequence.pending.decode("utf-8", errors="replace")
+        sequence.pending = b""
+        sequence.state.append(text)
+
+    def retire(self, sequence: Sequence) -> None:
+        if sequence in self.active:
+            self.active.remove(sequence)
+        if sequence.seq_id is not None:
+            self.backend.release(sequence.seq_id)
+            self.free_ids.append(sequence.seq_id)
+        sequence.done.set()
+
+    def stop(self) -> None:
+        """
+        Stop the decoding loop when the model is unloaded, no sequence is running then.
+        """
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+
+    def get_stats(self) -> dict:
+        with self.cond:
+            waiting = len(self.waiting)
+        return {
+            "active": len(self.active),
+            "waiting": waiting,
+            "steps": self.steps,
+            "decoded_tokens": self.decoded_tokens,
+            "mean_batch_size": self.decoded_tokens / self.steps if self.steps else 0,
+        }
@@ -1,36 +1,129 @@
 import os
 import json
+import atexit
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
 class Cache:
-    def __init__(self, cache_dir='.cache', cache_file='messages.json'):
+    """
+    Prompt cache of the server: answers indexed by the hash of the model and the full message history.
+    Least recently used answers are evicted over max_entries or max_bytes, and the cache is saved atomically to a json file.
+    Saves are debounced: a put schedules a save in the background, so a burst of puts writes the file once.
+    """
+    def __init__(self, cache_dir='.cache', cache_file='messages.json', max_entries: int = 1000, max_bytes: int = 50 * 1024 * 1024,
+                 save_delay: float = 2.0):
+        """
+        Args:
+            cache_dir (str): Folder of the cache file.
+            cache_file (str): Name of the cache file.
+            max_entries (int): Maximum number of answers kept.
+            max_bytes (int): Maximum total size of the answers kept.
+            save_delay (float): Seconds between a put and the save of the cache file.
+        """
         self.cache_dir = Path(cache_dir)
         self.cache_file = self.cache_dir / cache_file
         self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # key -> answer, least recently used first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.save_delay = save_delay
+        self.save_timer = None # pending save, None if the file is up to date
+        self.save_lock = threading.Lock() # one write of the file at a time
+        self.load()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def make_key(model: str, history: list) -> str:
+        """
+        Hash the model and the role and content of each message.
+        """
+        messages = [[message.get('role', ''), message.get('content', '')] for message in history]
+        return hashlib.sha256(json.dumps([model, messages], ensure_ascii=False).encode()).hexdigest()
+
+    def load(self) -> None:
         if not self.cache_file.exists():
-            with open(self.cache_file, 'w') as f:
-                json.dump([], f)
-
-        with open(self.cache_file, 'r') as f:
-            self.cache = set(json.load(f))
-
-    def add_message_pair(self, user_message: str, assistant_message: str):
-        """Add a user/assistant pair to the cache if not present."""
-        if not any(entry["user"] == user_message for entry in self.cache):
-            self.cache.append({"user": user_message, "assistant": assistant_message})
-            self._save()
-
-    def is_cached(self, user_message: str) -> bool:
-        """Check if a user msg is cached."""
-        return any(entry["user"] == user_message for entry in self.cache)
-
-    def get_cached_response(self, user_message: str) -> str | None:
-        """Return the assistant response to a user message if cached."""
-        for entry in self.cache:
-            if entry["user"] == user_message:
-                return entry["assistant"]
-        return None
-
-    def _save(self):
-        with open(self.cache_file, 'w') as f:
-            json.dump(self.cache, f, indent=2)
+            return
+        try:
+            with open(self.cache_file, 'r') as f:
+                entries = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        if not isinstance(entries, dict): # cache file of an older version
+            return
+        for key, answer in entries.items():
+            self.entries[key] = answer
+            self.total_bytes += len(answer.encode())
+        self.evict()
+
+    def get(self, model: str, history: list) -> str | None:
+        """Return the cached answer to a conversation, None if not cached."""
+        key = self.make_key(model, history)
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+
+    def put(self, model: str, history: list, answer: str) -> None:
+        """Cache the answer to a conversation, the file is saved save_delay seconds later."""
+        key = self.make_key(model, history)
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= len(self.entries.pop(key).encode())
+            self.entries[key] = answer
+            self.total_bytes += len(answer.encode())
+            self.evict()
+            if self.save_timer is None:
+                self.save_timer = threading.Timer(self.save_delay, self.flush)
+                self.save_timer.daemon = True
+                self.save_timer.start()
+
+    def evict(self) -> None:
+        while self.entries and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            _, answer = self.entries.popitem(last=False)
+            self.total_bytes -= len(answer.encode())
+
+    def flush(self) -> None:
+        """
+        Save the cache now if a save is pending. Called by the save timer and at exit.
+        """
+        with self.save_lock:
+            with self.lock:
+                if self.save_timer is None:
+                    return
+                self.save_timer.cancel()
+                self.save_timer = None
+                entries = dict(self.entries)
+            self.save(entries)
+
+    def save(self, entries: dict | None = None) -> None:
+        """
+        Write the cache to a temporary file and rename it over the cache file, so a crash never leaves a partial file.
+        Args:
+            entries (dict): Snapshot of the entries to write, taken with the lock held, the current entries if None.
+        """
+        if entries is None:
+            with self.lock:
+                entries = dict(self.entries)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=self.cache_file.name, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.cache_file)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.total_bytes, "hits": self.hits, "misses": self.misses}
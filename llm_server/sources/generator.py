@@ -1,28 +1,96 @@
-
+import asyncio
 import threading
 import logging
+import time
+import uuid
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from .cache import Cache
+from .model_registry import ModelRegistry
+from .metrics import ServerMetrics
 
 class GenerationState:
-    def __init__(self):
+    def __init__(self, request_id: str = "", model: str | None = None):
+        self.request_id = request_id
+        self.model = model
         self.lock = threading.Lock()
+        self.updated = threading.Condition(self.lock)
         self.last_complete_sentence = ""
         self.current_buffer = ""
         self.is_generating = False
-    
+        self.finished_at = None
+        self.created_at = time.perf_counter()
+        self.started_at = None
+        self.first_token_at = None
+        self.n_tokens = 0 # chunks appended, one token each when streaming
+        self.cached = False
+        self.waiters = [] # (event loop, asyncio.Event) of the async clients waiting for new text
+
     def status(self) -> dict:
         return {
+            "request_id": self.request_id,
+            "model": self.model,
             "sentence": self.current_buffer,
             "is_complete": not self.is_generating,
             "last_complete_sentence": self.last_complete_sentence,
             "is_generating": self.is_generating,
         }
 
+    def status_since(self, offset: int) -> dict:
+        """
+        Status with only the text generated after offset.
+        """
+        return {
+            "request_id": self.request_id,
+            "sentence": self.current_buffer[offset:],
+            "offset": len(self.current_buffer),
+            "is_complete": not self.is_generating,
+            "is_generating": self.is_generating,
+        }
+
+    def notify(self) -> None:
+        """
+        Wake up the threads and async clients waiting for an update. Called with the lock held.
+        """
+        self.updated.notify_all()
+        for loop, event in self.waiters:
+            loop.call_soon_threadsafe(event.set)
+        self.waiters.clear()
+
+    def append(self, text: str) -> None:
+        with self.updated:
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+            self.current_buffer += text
+            self.n_tokens += 1
+            self.notify()
+
+    def finish(self) -> None:
+        with self.updated:
+            self.is_generating = False
+            self.finished_at = time.time()
+            self.notify()
+
 class GeneratorLLM():
-    def __init__(self):
+    def __init__(self, max_workers: int = 2, max_queue: int = 16, session_ttl: float = 600, use_cache: bool = False,
+                 max_memory: int | None = None, max_models: int | None = None):
+        """
+        args:
+            max_workers: number of generations running at the same time
+            max_queue: number of generations waiting for a worker before new requests are refused
+            session_ttl: seconds a finished generation is kept for its client to read it
+            use_cache: answer repeated conversations from the prompt cache, off by default so a retry gets a new answer
+            max_memory: memory budget of the loaded models in bytes, None for no limit
+            max_models: maximum number of models loaded at the same time, None for no limit
+        """
         self.model = None
-        self.state = GenerationState()
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+        self.last_request_id = None
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.session_ttl = session_ttl
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="generation")
         self.logger = logging.getLogger(__name__)
         handler = logging.StreamHandler()
         handler.setLevel(logging.INFO)
@@ -30,33 +98,229 @@ class GeneratorLLM():
         handler.setFormatter(formatter)
         self.logger.addHandler(handler)
         self.logger.setLevel(logging.INFO)
-        cache = Cache()
-    
+        self.cache = Cache() if use_cache else None
+        self.metrics = ServerMetrics()
+        self.models = ModelRegistry(self.load_model, self.unload_model, max_bytes=max_memory, max_models=max_models,
+                                    on_load=lambda model, seconds: self.metrics.model_load.observe(seconds, model=model))
+
     def set_model(self, model: str) -> None:
-        self.logger.info(f"Model set to {model}")
+        """
+        Set the default model of the requests that don't name one, and load it.
+        """
+        if model != self.model:
+            self.logger.info(f"Model set to {model}")
         self.model = model
-    
-    def start(self, history: list) -> bool:
-        if self.model is None:
-            raise Exception("Model not set")
-        with self.state.lock:
-            if self.state.is_generating:
-                return False
-            self.state.is_generating = True
-            self.logger.info("Starting generation")
-            threading.Thread(target=self.generate, args=(history,)).start()
+        with self.models.use(model):
+            pass
+
+    def load_model(self, model: str) -> tuple:
+        """
+        Load a model, called by the model registry.
+        returns:
+            the loaded model and its size in bytes
+        """
+        return model, 0
+
+    def unload_model(self, model: str, handle) -> None:
+        """
+        Free a model unloaded by the model registry.
+        """
+        pass
+
+    @property
+    def state(self) -> GenerationState:
+        """
+        State of the last generation started, for clients that don't give a request id.
+        """
+        with self.sessions_lock:
+            return self.sessions.get(self.last_request_id) or GenerationState()
+
+    def start(self, history: list, request_id: str | None = None, model: str | None = None) -> str | None:
+        """
+        Queue a generation.
+        args:
+            history: list of messages
+            request_id: id of the generation, a new one is made if None
+            model: model of the generation, the model set with set_model if None
+        returns:
+            the request id, None if the queue is full or the request id is already generating
+        raises:
+            ValueError: no model given and none set with set_model
+        """
+        model = model or self.model
+        if model is None:
+            raise ValueError("Model not set, call set_model or give the model of the request")
+        request_id = request_id or str(uuid.uuid4())
+        with self.sessions_lock:
+            self.prune_sessions()
+            if request_id in self.sessions and self.sessions[request_id].is_generating:
+                self.metrics.requests.inc(status="rejected")
+                return None
+            pending = sum(1 for state in self.sessions.values() if state.is_generating)
+            if pending >= self.max_workers + self.max_queue:
+                self.logger.warning(f"Generation queue full ({pending} pending), refusing {request_id}")
+                self.metrics.requests.inc(status="rejected")
+                return None
+            state = GenerationState(request_id, model)
+            state.is_generating = True
+            self.sessions[request_id] = state
+            self.last_request_id = request_id
+        self.metrics.requests.inc(status="accepted")
+        self.logger.info(f"Queued generation {request_id}")
+        self.executor.submit(self.run, history, state)
+        return request_id
+
+    def run(self, history: list, state: GenerationState) -> None:
+        state.started_at = time.perf_counter()
+        self.metrics.queue_wait.observe(state.started_at - state.created_at)
+        outcome = "completed"
+        try:
+            self.generate(history, state)
+        except Exception as e:
+            self.logger.error(f"Generation {state.request_id} failed: {e}")
+            outcome = "failed"
+        finally:
+            self.record_generation(state, outcome)
+            state.finish()
+
+    def record_generation(self, state: GenerationState, outcome: str) -> None:
+        """
+        Add a finished generation to the metrics, cached answers don't count as generated tokens.
+        """
+        if state.cached:
+            outcome = "cached"
+        self.metrics.generations.inc(model=state.model, outcome=outcome)
+        self.metrics.duration.observe(time.perf_counter() - state.created_at, model=state.model)
+        if state.cached:
+            return
+        self.metrics.tokens.inc(state.n_tokens, model=state.model)
+        if state.first_token_at is not None:
+            self.metrics.ttft.observe(state.first_token_at - state.created_at, model=state.model)
+
+    def render_metrics(self) -> str:
+        """
+        Metrics in the Prometheus text format, the gauges are read from the sessions, registry and cache when scraped.
+        """
+        with self.sessions_lock:
+            generating = [state for state in self.sessions.values() if state.is_generating]
+        self.metrics.active.set(sum(1 for state in generating if state.started_at is not None))
+        self.metrics.queue_depth.set(sum(1 for state in generating if state.started_at is None))
+        registry = self.models.get_metrics()
+        self.metrics.models_resident.set(len(registry["resident"]))
+        self.metrics.model_bytes.set(registry["bytes"])
+        self.metrics.model_evictions.set(registry["evictions"])
+        if self.cache is not None:
+            stats = self.cache.get_stats()
+            self.metrics.cache_lookups.set(stats["hits"], result="hit")
+            self.metrics.cache_lookups.set(stats["misses"], result="miss")
+        return self.metrics.render()
+
+    def use_cached_answer(self, history: list, state: GenerationState) -> bool:
+        """
+        Answer from the prompt cache if this model already answered the same conversation.
+        returns:
+            True if the answer was cached, the generation can be skipped
+        """
+        if self.cache is None:
+            return False
+        answer = self.cache.get(state.model, history)
+        if answer is None:
+            return False
+        self.logger.info(f"Generation {state.request_id} answered from cache")
+        state.cached = True
+        state.append(answer)
         return True
-    
-    def get_status(self) -> dict:
-        with self.state.lock:
-            return self.state.status()
+
+    def cache_answer(self, history: list, state: GenerationState) -> None:
+        if self.cache is not None and state.current_buffer:
+            self.cache.put(state.model, history, state.current_buffer)
+
+    def prune_sessions(self) -> None:
+        """
+        Forget the generations finished for longer than session_ttl. Called with sessions_lock held.
+        """
+        now = time.time()
+        expired = [request_id for request_id, state in self.sessions.items()
+                   if state.finished_at is not None and now - state.finished_at > self.session_ttl]
+        for request_id in expired:
+            del self.sessions[request_id]
+
+    def get_session(self, request_id: str | None = None) -> GenerationState | None:
+        """
+        Get the state of a generation, the last one started if request_id is None.
+        Returns None for an unknown or expired request id, or if no generation was started.
+        """
+        with self.sessions_lock:
+            request_id = request_id or self.last_request_id
+            if request_id is None:
+                return None
+            return self.sessions.get(request_id)
+
+    def get_context_length(self, model: str | None = None) -> int | None:
+        """
+        Context length of a model, None if unknown.
+        """
+        return None
+
+    def get_status(self, request_id: str | None = None, offset: int | None = None) -> dict | None:
+        """
+        Status of a generation, with only the text generated after offset if given.
+        """
+        state = self.get_session(request_id)
+        if state is None:
+            return None
+        with state.lock:
+            return state.status() if offset is None else state.status_since(offset)
+
+    def wait_for_update(self, offset: int, timeout: float = 30.0, request_id: str | None = None) -> dict | None:
+        """
+        Long-poll: block until text past offset is generated or the generation ends.
+        args:
+            offset: number of characters the client already received
+            timeout: maximum time to wait in seconds
+            request_id: id of the generation, the last one started if None
+        returns:
+            status with only the new text, None for an unknown request id
+        """
+        state = self.get_session(request_id)
+        if state is None:
+            return None
+        with state.updated:
+            state.updated.wait_for(
+                lambda: len(state.current_buffer) > offset or not state.is_generating,
+                timeout=timeout
+            )
+            return state.status_since(offset)
+
+    async def async_wait_for_update(self, offset: int, timeout: float = 30.0, request_id: str | None = None) -> dict | None:
+        """
+        Same as wait_for_update without blocking a thread, so many clients can wait at once.
+        """
+        state = self.get_session(request_id)
+        if state is None:
+            return None
+        event = asyncio.Event()
+        with state.lock:
+            if len(state.current_buffer) > offset or not state.is_generating:
+                return state.status_since(offset)
+            waiter = (asyncio.get_running_loop(), event)
+            state.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        with state.lock:
+            if waiter in state.waiters:
+                state.waiters.remove(waiter)
+            return state.status_since(offset)
 
     @abstractmethod
-    def generate(self, history: list) -> None:
+    def generate(self, history: list, state: GenerationState) -> None:
         """
         Generate text using the model.
         args:
             history: list of strings
+            state: state of the generation, the text is added with state.append and state.model is the model to use
         returns:
             None
         """
@@ -64,4 +328,4 @@ class GeneratorLLM():
 
 if __name__ == "__main__":
     generator = GeneratorLLM()
-    generator.get_status()
\ No newline at end of file
+    generator.get_status()
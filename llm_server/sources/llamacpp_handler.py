@@ -1,40 +1,234 @@
 
-from .generator import GeneratorLLM
+import threading
+import numpy as np
+import llama_cpp
+from .generator import GeneratorLLM, GenerationState
 from llama_cpp import Llama
+from llama_cpp._internals import LlamaContext, LlamaBatch
+from llama_cpp.llama_chat_format import Jinja2ChatFormatter
 from .decorator import timer_decorator
+from .state_cache import PrefixStateCache
+from .batching import BatchScheduler
+
+class LlamaBatchBackend:
+    """
+    Decode several sequences at once on a llama.cpp context, each sequence has its own seq_id in the KV cache.
+    """
+    def __init__(self, llm: Llama, max_sequences: int, n_ctx: int, temperature: float = 0.7, top_k: int = 40):
+        """
+        args:
+            llm: loaded model, its weights are shared with the batch context
+            max_sequences: number of sequences decoded together
+            n_ctx: context size of each sequence
+            temperature: sampling temperature, 0 for greedy decoding
+            top_k: number of most likely tokens sampled from
+        """
+        self.llm = llm
+        params = llama_cpp.llama_context_params.from_buffer_copy(llm.context_params)
+        params.n_seq_max = max_sequences
+        params.n_ctx = n_ctx * max_sequences
+        self.ctx = LlamaContext(model=llm._model, params=params, verbose=llm.verbose)
+        self.n_batch = params.n_batch
+        self.batch = LlamaBatch(n_tokens=max(params.n_batch, max_sequences), embd=0, n_seq_max=1)
+        self.n_vocab = llm.n_vocab()
+        self.eos = llm.token_eos()
+        self.temperature = temperature
+        self.top_k = top_k
+        self.rng = np.random.default_rng()
+        eos_token = llm.detokenize([self.eos], special=True).decode("utf-8", errors="ignore")
+        bos_token = llm.detokenize([llm.token_bos()], special=True).decode("utf-8", errors="ignore")
+        self.formatter = Jinja2ChatFormatter(template=llm.metadata.get("tokenizer.chat_template", ""),
+                                             eos_token=eos_token, bos_token=bos_token)
+
+    def tokenize_chat(self, history: list) -> list:
+        prompt = self.formatter(messages=history).prompt
+        return self.llm.tokenize(prompt.encode("utf-8"), add_bos=False, special=True)
+
+    def run_batch(self, entries: list) -> None:
+        """
+        Decode a batch of (token, pos, seq_id, logits) entries.
+        """
+        batch = self.batch.batch
+        batch.n_tokens = len(entries)
+        for i, (token, pos, seq_id, logits) in enumerate(entries):
+            batch.token[i] = token
+            batch.pos[i] = pos
+            batch.seq_id[i][0] = seq_id
+            batch.n_seq_id[i] = 1
+            batch.logits[i] = logits
+        self.ctx.decode(self.batch)
+
+    def sample(self, index: int) -> int:
+        logits = np.ctypeslib.as_array(llama_cpp.llama_get_logits_ith(self.ctx.ctx, index), shape=(self.n_vocab,))
+        if self.temperature <= 0:
+            return int(np.argmax(logits))
+        candidates = np.argpartition(logits, -self.top_k)[-self.top_k:]
+        scaled = logits[candidates] / self.temperature
+        probs = np.exp(scaled - scaled.max())
+        return int(self.rng.choice(candidates, p=probs / probs.sum()))
+
+    def prefill(self, seq_id: int, tokens: list) -> int:
+        """
+        Evaluate the prompt of a sequence by chunks of n_batch tokens, returns its first generated token.
+        """
+        for start in range(0, len(tokens), self.n_batch):
+            chunk = tokens[start:start + self.n_batch]
+            is_last = start + self.n_batch >= len(tokens)
+            self.run_batch([(token, start + i, seq_id, is_last and i == len(chunk) - 1) for i, token in enumerate(chunk)])
+        return self.sample(len(chunk) - 1)
+
+    def decode(self, entries: list) -> list:
+        self.run_batch([(token, pos, seq_id, True) for seq_id, token, pos in entries])
+        return [self.sample(i) for i in range(len(entries))]
+
+    def is_eos(self, token: int) -> bool:
+        return token == self.eos
+
+    def detokenize(self, token: int) -> bytes:
+        return self.llm.detokenize([token])
+
+    def release(self, seq_id: int) -> None:
+        """
+        Free the KV cache of a finished sequence, the name of the function depends on the llama.cpp version.
+        """
+        if hasattr(llama_cpp, "llama_memory_seq_rm"):
+            llama_cpp.llama_memory_seq_rm(llama_cpp.llama_get_memory(self.ctx.ctx), seq_id, -1, -1)
+        elif hasattr(llama_cpp, "llama_kv_self_seq_rm"):
+            llama_cpp.llama_kv_self_seq_rm(self.ctx.ctx, seq_id, -1, -1)
+        else:
+            llama_cpp.llama_kv_cache_seq_rm(self.ctx.ctx, seq_id, -1, -1)
+
+def kv_cache_bytes(llm: Llama, n_ctx: int) -> int:
+    """
+    Memory of a f16 KV cache of n_ctx tokens, estimated from the model metadata.
+    """
+    arch = llm.metadata.get("general.architecture", "")
+    n_head = int(llm.metadata.get(f"{arch}.attention.head_count", 1))
+    n_head_kv = int(llm.metadata.get(f"{arch}.attention.head_count_kv", n_head))
+    # keys and values, 2 bytes per value
+    return 2 * 2 * llm._model.n_layer() * n_ctx * llm._model.n_embd() * n_head_kv // n_head
+
+class LlamaModel:
+    """
+    A loaded llama.cpp model with the KV states of its conversations and its batch scheduler.
+    """
+    def __init__(self, llm: Llama, batcher: BatchScheduler | None = None, state_cache_bytes: int = 1024**3):
+        self.llm = llm
+        self.batcher = batcher
+        # KV state per conversation, so agents taking turns don't re-evaluate their whole prompt
+        self.states = PrefixStateCache(max_bytes=state_cache_bytes)
+        self.loaded_state = None
+        self.lock = threading.Lock() # a llama.cpp context runs one generation at a time
 
 class LlamacppLLM(GeneratorLLM):
 
-    def __init__(self):
+    def __init__(self, n_ctx: int = 4096, n_threads: int | None = None, n_batch: int = 512,
+                 use_mmap: bool = True, use_mlock: bool = False, gguf_file: str = "*Q8_0.gguf",
+                 batch_size: int = 1, state_cache_bytes: int = 1024**3, **kwargs):
         """
         Handle generation using llama.cpp
+        args:
+            n_ctx: context size of the model in tokens
+            n_threads: number of CPU threads, None for llama.cpp default
+            n_batch: number of prompt tokens evaluated at once
+            use_mmap: map the model file in memory instead of reading it
+            use_mlock: lock the model in RAM so it is never swapped out
+            gguf_file: pattern of the GGUF file to download from the model repository
+            batch_size: number of generations decoded together with continuous batching, 1 to run them one at a time
+            state_cache_bytes: memory of the conversation KV states kept per model
+        The memory counted in the model registry budget is the weights, the KV caches and the state cache of each model.
         """
-        super().__init__()
-        self.llm = None
-    
+        super().__init__(**kwargs)
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads
+        self.n_batch = n_batch
+        self.use_mmap = use_mmap
+        self.use_mlock = use_mlock
+        self.gguf_file = gguf_file
+        self.batch_size = batch_size
+        self.state_cache_bytes = state_cache_bytes
+
+    @timer_decorator
+    def load_model(self, model: str) -> tuple:
+        llm = Llama.from_pretrained(
+            repo_id=model,
+            filename=self.gguf_file,
+            n_ctx=self.n_ctx,
+            n_threads=self.n_threads,
+            n_batch=self.n_batch,
+            use_mmap=self.use_mmap,
+            use_mlock=self.use_mlock,
+            verbose=True
+        )
+        batcher = None
+        size = llm._model.size() + kv_cache_bytes(llm, self.n_ctx) + self.state_cache_bytes
+        if self.batch_size > 1:
+            batcher = BatchScheduler(LlamaBatchBackend(llm, self.batch_size, self.n_ctx), max_sequences=self.batch_size)
+            size += kv_cache_bytes(llm, self.n_ctx * self.batch_size)
+        return LlamaModel(llm, batcher, self.state_cache_bytes), size
+
+    def unload_model(self, model: str, handle: LlamaModel) -> None:
+        if handle.batcher is not None:
+            handle.batcher.stop()
+        handle.states.clear()
+        handle.llm.close()
+
+    def get_context_length(self, model: str | None = None) -> int | None:
+        return self.n_ctx
+
+    def restore_state(self, model: LlamaModel, history: list) -> None:
+        """
+        Load the KV state of the longest cached prefix of the conversation.
+        llama.cpp then only evaluates the tokens after the prefix.
+        """
+        matched, state = model.states.lookup(history)
+        if state is None:
+            self.logger.info("No cached state for this conversation")
+            return
+        if state is not model.loaded_state:
+            model.llm.load_state(state)
+            model.loaded_state = state
+        self.logger.info(f"Restored state of {matched}/{len(history)} messages")
+
+    def save_state(self, model: LlamaModel, history: list) -> None:
+        state = model.llm.save_state()
+        model.states.put(history, state, state.llama_state_size)
+        model.loaded_state = state
+
+    def generate_batched(self, model: LlamaModel, history: list, state: GenerationState) -> None:
+        """
+        Generate with the batch scheduler, interleaved with the other generations running.
+        """
+        tokens = model.batcher.backend.tokenize_chat(history)
+        max_new_tokens = self.n_ctx - len(tokens)
+        if max_new_tokens <= 0:
+            raise Exception(f"Prompt of {len(tokens)} tokens doesn't fit in the context of {self.n_ctx} tokens")
+        self.logger.info(f"Batching generation {state.request_id} ({len(tokens)} prompt tokens)")
+        model.batcher.generate(tokens, state, max_new_tokens)
+        self.cache_answer(history, state)
+
     @timer_decorator
-    def generate(self, history):
-        if self.llm is None:
-            self.logger.info(f"Loading {self.model}...")
-            self.llm = Llama.from_pretrained(
-                repo_id=self.model,
-                filename="*Q8_0.gguf",
-                n_ctx=4096,
-                verbose=True
-            )
-        self.logger.info(f"Using {self.model} for generation with Llama.cpp")
-        try:
-            with self.state.lock:
-                self.state.is_generating = True
-                self.state.last_complete_sentence = ""
-                self.state.current_buffer = ""
-            output = self.llm.create_chat_completion(
-                  messages = history
-            )
-            with self.state.lock:
-                self.state.current_buffer = output['choices'][0]['message']['content']
-        except Exception as e:
-            self.logger.error(f"Error: {e}")
-        finally:
-            with self.state.lock:
-                self.state.is_generating = False
\ No newline at end of file
+    def generate(self, history: list, state: GenerationState) -> None:
+        if self.use_cached_answer(history, state):
+            return
+        with self.models.use(state.model) as model:
+            if model.batcher is not None:
+                return self.generate_batched(model, history, state)
+            with model.lock:
+                self.logger.info(f"Using {state.model} for generation {state.request_id} with Llama.cpp")
+                try:
+                    self.restore_state(model, history)
+                    stream = model.llm.create_chat_completion(
+                          messages = history,
+                          stream = True
+                    )
+                    for chunk in stream:
+                        content = chunk['choices'][0]['delta'].get('content')
+                        if content:
+                            state.append(content)
+                    self.save_state(model, history)
+                    self.cache_answer(history, state)
+                except Exception as e:
+                    self.logger.error(f"Error: {e}")
+                    model.loaded_state = None # the KV cache is left in an unknown state
+                    raise
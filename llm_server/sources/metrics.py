@@ -0,0 +1,111 @@
+import bisect
+import threading
+
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0]
+LOAD_BUCKETS = [0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0]
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = [f'{key}="{escape_label(value)}"' for key, value in labels + extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Metric:
+    """
+    A metric in the Prometheus text exposition format, with one value per set of labels.
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(labels)} {format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, value: float, **labels) -> None:
+        """Set the total of a counter counted elsewhere, like the evictions of the model registry."""
+        with self.lock:
+            self.values[tuple(sorted(labels.items()))] = value
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self.lock:
+            self.values[tuple(sorted(labels.items()))] = value
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: list):
+        super().__init__(name, help)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            if key not in self.values:
+                self.values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series = self.values[key]
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self.lock:
+            for labels, series in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + [float("inf")], series["counts"]):
+                    cumulative += count
+                    le = (("le", format_value(bound)),)
+                    lines.append(f"{self.name}_bucket{format_labels(labels, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{format_labels(labels)} {format_value(series['sum'])}")
+                lines.append(f"{self.name}_count{format_labels(labels)} {series['count']}")
+        return lines
+
+class ServerMetrics:
+    """
+    Metrics of llm_server, exposed on /metrics for Prometheus.
+    """
+    def __init__(self):
+        self.requests = Counter("llm_server_requests_total", "Generation requests, by status (accepted or rejected).")
+        self.generations = Counter("llm_server_generations_total", "Finished generations, by model and outcome (completed, cached or failed).")
+        self.tokens = Counter("llm_server_generated_tokens_total", "Tokens generated, by model.")
+        self.queue_depth = Gauge("llm_server_queue_depth", "Generations waiting for a worker.")
+        self.active = Gauge("llm_server_active_generations", "Generations running.")
+        self.queue_wait = Histogram("llm_server_queue_wait_seconds", "Time from request to the start of the generation.", LATENCY_BUCKETS)
+        self.ttft = Histogram("llm_server_time_to_first_token_seconds", "Time from request to the first token, by model.", LATENCY_BUCKETS)
+        self.duration = Histogram("llm_server_generation_seconds", "Time from request to the end of the generation, by model.", LATENCY_BUCKETS)
+        self.model_load = Histogram("llm_server_model_load_seconds", "Model load time, by model.", LOAD_BUCKETS)
+        self.models_resident = Gauge("llm_server_models_resident", "Models loaded.")
+        self.model_bytes = Gauge("llm_server_model_memory_bytes", "Memory used by the loaded models.")
+        self.model_evictions = Counter("llm_server_model_evictions_total", "Models unloaded to stay in the memory budget.")
+        self.cache_lookups = Counter("llm_server_cache_lookups_total", "Prompt cache lookups, by result (hit or miss).")
+
+    def render(self) -> str:
+        lines = []
+        for metric in vars(self).values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,181 @@
+import time
+import threading
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable
+
+class ResidentModel:
+    """
+    A model loaded by the registry.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.handle = None
+        self.size = 0
+        self.in_use = 0
+        self.uses = 0
+        self.load_time = None
+        self.last_used = time.time()
+        self.error = None
+        self.loaded = threading.Event()
+
+class ModelRegistry:
+    """
+    ModelRegistry keeps several models loaded side by side, loading each on first use.
+    When the memory budget or the model count is exceeded, the least recently used models are unloaded.
+    Models used by a running generation are never unloaded.
+    """
+    def __init__(self, load_fn: Callable, unload_fn: Callable, max_bytes: int | None = None, max_models: int | None = None,
+                 on_load: Callable | None = None):
+        """
+        Args:
+            load_fn (Callable): Load a model by name, returns (handle, size in bytes).
+            unload_fn (Callable): Unload a model given its name and handle.
+            max_bytes (int): Memory budget of the loaded models, None for no limit.
+            max_models (int): Maximum number of loaded models, None for no limit.
+            on_load (Callable): Called with the name and load time in seconds of each model loaded.
+        """
+        self.load_fn = load_fn
+        self.unload_fn = unload_fn
+        self.max_bytes = max_bytes
+        self.max_models = max_models
+        self.on_load = on_load
+        self.models = OrderedDict() # name -> ResidentModel, least recently used first
+        self.known_sizes = {} # size of the models loaded before, to make room before loading them again
+        self.total_bytes = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def acquire(self, name: str):
+        """
+        Get a model, loading it if it isn't resident. It can't be evicted until release is called.
+        """
+        with self.lock:
+            entry = self.models.get(name)
+            must_load = entry is None
+            if must_load:
+                entry = ResidentModel(name)
+                self.models[name] = entry
+                evicted = self.make_room(self.known_sizes.get(name, 0), keep=name)
+            entry.in_use += 1
+            self.models.move_to_end(name)
+        if must_load:
+            self.unload(evicted)
+            self.load(entry)
+        else:
+            entry.loaded.wait()
+        if entry.error is not None:
+            # the entry of the failed load, another one may be loading under the same name already
+            self.release(name, entry)
+            raise entry.error
+        entry.uses += 1
+        return entry.handle
+
+    def load(self, entry: ResidentModel) -> None:
+        self.logger.info(f"Loading model {entry.name}")
+        start = time.perf_counter()
+        try:
+            handle, size = self.load_fn(entry.name)
+        except Exception as e:
+            entry.error = e
+            with self.lock:
+                if self.models.get(entry.name) is entry:
+                    del self.models[entry.name]
+            entry.loaded.set()
+            return
+        load_time = time.perf_counter() - start
+        with self.lock:
+            entry.handle = handle
+            entry.size = size
+            entry.load_time = load_time
+            self.known_sizes[entry.name] = size
+            self.total_bytes += size
+            self.loads += 1
+            self.load_seconds += load_time
+            evicted = self.make_room(0, keep=entry.name)
+        self.unload(evicted)
+        self.logger.info(f"Model {entry.name} loaded in {load_time:.2f}s ({size / 1024**3:.2f} GB)")
+        if self.on_load is not None:
+            self.on_load(entry.name, load_time)
+        entry.loaded.set()
+
+    def release(self, name: str, entry: ResidentModel | None = None) -> None:
+        """
+        Release a model acquired with acquire.
+        Args:
+            name (str): Name of the model.
+            entry (ResidentModel): Entry acquired, the resident model of that name if None.
+        """
+        with self.lock:
+            entry = entry or self.models.get(name)
+            if entry is None:
+                return
+            entry.in_use -= 1
+            entry.last_used = time.time()
+            evicted = self.make_room(0)
+        self.unload(evicted)
+
+    @contextmanager
+    def use(self, name: str):
+        handle = self.acquire(name)
+        try:
+            yield handle
+        finally:
+            self.release(name)
+
+    def over_budget(self, needed_bytes: int) -> bool:
+        if self.max_bytes is not None and self.total_bytes + needed_bytes > self.max_bytes:
+            return True
+        return self.max_models is not None and len(self.models) > self.max_models
+
+    def make_room(self, needed_bytes: int, keep: str | None = None) -> list:
+        """
+        Evict the least recently used idle models until the budget is met. Called with the lock held.
+        Returns:
+            The evicted models, to give to unload once the lock is released.
+        """
+        evicted = []
+        while self.over_budget(needed_bytes):
+            idle = [e for e in self.models.values() if e.name != keep and e.in_use == 0 and e.loaded.is_set()]
+            if not idle:
+                self.logger.warning(f"Models over the memory budget ({self.total_bytes / 1024**3:.2f} GB), none can be unloaded")
+                break
+            entry = idle[0]
+            del self.models[entry.name]
+            self.total_bytes -= entry.size
+            self.evictions += 1
+            evicted.append(entry)
+        return evicted
+
+    def unload(self, evicted: list) -> None:
+        """
+        Free evicted models, called without the lock so other models can be used while they are unloaded.
+        """
+        for entry in evicted:
+            self.logger.info(f"Unloading model {entry.name} ({entry.size / 1024**3:.2f} GB)")
+            try:
+                self.unload_fn(entry.name, entry.handle)
+            except Exception as e:
+                self.logger.error(f"Failed to unload {entry.name}: {e}")
+
+    def get_metrics(self) -> dict:
+        with self.lock:
+            return {
+                "resident": [{
+                    "model": e.name,
+                    "size": e.size,
+                    "in_use": e.in_use,
+                    "uses": e.uses,
+                    "load_time": e.load_time,
+                    "last_used": e.last_used,
+                } for e in self.models.values()],
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "load_seconds": self.load_seconds,
+            }
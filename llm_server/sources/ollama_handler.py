@@ -1,50 +1,68 @@
 
 import time
-from .generator import GeneratorLLM
-from .cache import Cache
+from .generator import GeneratorLLM, GenerationState
 import ollama
 
 class OllamaLLM(GeneratorLLM):
 
-    def __init__(self):
+    def __init__(self, **kwargs):
         """
         Handle generation using Ollama.
         """
-        super().__init__()
-        self.cache = Cache()
+        super().__init__(**kwargs)
 
-    def generate(self, history):
-        self.logger.info(f"Using {self.model} for generation with Ollama")
+    def load_model(self, model: str) -> tuple:
+        """
+        Load the model in Ollama and keep it loaded until the registry unloads it.
+        """
+        try:
+            ollama.show(model)
+        except ollama.ResponseError as e:
+            if e.status_code != 404:
+                raise
+            self.logger.info(f"Downloading {model}...")
+            ollama.pull(model)
+        ollama.generate(model=model, prompt="", keep_alive=-1)
+        size = next((m.size for m in ollama.ps().models if m.model in [model, f"{model}:latest"]), 0)
+        return model, size
+
+    def unload_model(self, model: str, handle) -> None:
+        ollama.generate(model=model, prompt="", keep_alive=0)
+
+    def get_context_length(self, model: str | None = None) -> int | None:
+        info = ollama.show(model or self.model)
+        for line in (info.get("parameters") or "").splitlines():
+            fields = line.split()
+            if len(fields) == 2 and fields[0] == "num_ctx":
+                return int(fields[1])
+        for key, value in (info.get("modelinfo") or {}).items():
+            if key.endswith(".context_length"):
+                return int(value)
+        return None
+
+    def generate(self, history: list, state: GenerationState) -> None:
+        if self.use_cached_answer(history, state):
+            return
+        self.logger.info(f"Using {state.model} for generation with Ollama")
         try:
-            with self.state.lock:
-                self.state.is_generating = True
-                self.state.last_complete_sentence = ""
-                self.state.current_buffer = ""
-
-            stream = ollama.chat(
-                model=self.model,
-                messages=history,
-                stream=True,
-            )
-            for chunk in stream:
-                content = chunk['message']['content']
-
-                with self.state.lock:
-                    if '.' in content:
-                        self.logger.info(self.state.current_buffer)
-                    self.state.current_buffer += content
+            with self.models.use(state.model):
+                stream = ollama.chat(
+                    model=state.model,
+                    messages=history,
+                    stream=True,
+                    keep_alive=-1,
+                )
+                for chunk in stream:
+                    content = chunk['message']['content']
+                    state.append(content)
+            self.cache_answer(history, state)
 
         except Exception as e:
-            if "404" in str(e):
-                self.logger.info(f"Downloading {self.model}...")
-                ollama.pull(self.model)
             if "refused" in str(e).lower():
                 raise Exception("Ollama connection failed. is the server running ?") from e
             raise e
         finally:
-            self.logger.info("Generation complete")
-            with self.state.lock:
-                self.state.is_generating = False
+            self.logger.info(f"Generation {state.request_id} complete")
 
 if __name__ == "__main__":
     generator = OllamaLLM()
@@ -55,7 +73,7 @@ if __name__ == "__main__":
         }
     ]
     generator.set_model("deepseek-r1:1.5b")
-    generator.start(history)
+    request_id = generator.start(history)
     while True:
-        print(generator.get_status())
+        print(generator.get_status(request_id))
         time.sleep(1)
\ No newline at end of file
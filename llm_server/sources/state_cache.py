@@ -0,0 +1,83 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+def prefix_hashes(messages: list) -> list:
+    """
+    Chained hash of every prefix of a conversation, hashes[k] identifies messages[:k+1].
+    Only the role and content are hashed so extra fields don't change the key.
+    """
+    hashes = []
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(f"{message.get('role', '')}\0{message.get('content', '')}\0".encode())
+        hashes.append(digest.copy().hexdigest())
+    return hashes
+
+class PrefixStateCache:
+    """
+    LRU cache of model states (KV cache) keyed by the hash of the conversation prefix they were computed on.
+    Restoring the state of the longest cached prefix of a conversation leaves only the new messages to evaluate.
+    """
+    def __init__(self, max_states: int = 8, max_bytes: int = 4 * 1024**3):
+        """
+        Args:
+            max_states (int): Maximum number of states kept.
+            max_bytes (int): Maximum total size of the states kept.
+        """
+        self.max_states = max_states
+        self.max_bytes = max_bytes
+        self.states = OrderedDict() # prefix hash -> (state, size)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, messages: list) -> tuple:
+        """
+        Find the state of the longest cached prefix of the conversation.
+        Returns the number of messages matched and the state, (0, None) on a miss.
+        """
+        hashes = prefix_hashes(messages)
+        with self.lock:
+            for length in range(len(hashes), 0, -1):
+                key = hashes[length - 1]
+                if key in self.states:
+                    self.states.move_to_end(key)
+                    self.hits += 1
+                    return length, self.states[key][0]
+            self.misses += 1
+            return 0, None
+
+    def put(self, messages: list, state, size: int = 0) -> None:
+        """
+        Store the state computed on a conversation, evicting the least recently used states over the limits.
+        """
+        if not messages or size > self.max_bytes:
+            return
+        key = prefix_hashes(messages)[-1]
+        with self.lock:
+            if key in self.states:
+                self.total_bytes -= self.states.pop(key)[1]
+            self.states[key] = (state, size)
+            self.total_bytes += size
+            while len(self.states) > self.max_states or self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.states.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.states.clear()
+            self.total_bytes = 0
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "states": len(self.states),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
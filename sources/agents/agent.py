@@ -12,6 +12,7 @@ from sources.memory import Memory
 from sources.utility import pretty_print
 from sources.schemas import executorResult
 from sources.conversation_logger import get_conversation_logger
+from sources.request_scheduler import PRIORITY_INTERACTIVE
 
 random.seed(time.time())
 
@@ -49,6 +50,7 @@ class Agent():
         self.status_message = "Haven't started yet"
         self.stop = False
         self.verbose = verbose
+        self.stream_callback = None
         self.executor = ThreadPoolExecutor(max_workers=1)
     
     @property
@@ -90,6 +92,12 @@ class Agent():
     def get_blocks_result(self) -> list:
         return self.blocks_result
 
+    def set_stream_callback(self, callback: Callable[[str], None]) -> None:
+        """
+        Set a function called with each chunk of text as the LLM produces it.
+        """
+        self.stream_callback = callback
+
     def add_tool(self, name: str, tool: Callable) -> None:
         if tool is not Callable:
             raise TypeError("Tool must be a callable object (a method)")
@@ -170,21 +178,36 @@ class Agent():
         end_idx = text.rfind(end_tag)+8
         return text[start_idx:end_idx]
     
-    async def llm_request(self) -> Tuple[str, str]:
+    async def llm_request(self, priority: int = PRIORITY_INTERACTIVE) -> Tuple[str, str]:
         """
         Asynchronously ask the LLM to process the prompt.
+        Background work should use PRIORITY_BACKGROUND so user turns are served first by the provider.
         """
         self.status_message = "Thinking..."
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self.executor, self.sync_llm_request)
+        memory = self.memory.get()
+        thought = ""
+        async for chunk in self.llm.astream_respond(memory, self.verbose, agent_name=self.agent_name, priority=priority):
+            thought += chunk
+            if self.stream_callback is not None:
+                self.stream_callback(chunk)
+        return self.process_llm_answer(memory, thought)
     
-    def sync_llm_request(self) -> Tuple[str, str]:
+    def sync_llm_request(self, priority: int = PRIORITY_INTERACTIVE) -> Tuple[str, str]:
         """
         Ask the LLM to process the prompt and return the answer and the reasoning.
         """
         memory = self.memory.get()
-        thought = self.llm.respond(memory, self.verbose, agent_name=self.agent_name)
+        thought = ""
+        for chunk in self.llm.stream_respond(memory, self.verbose, agent_name=self.agent_name, priority=priority):
+            thought += chunk
+            if self.stream_callback is not None:
+                self.stream_callback(chunk)
+        return self.process_llm_answer(memory, thought)
 
+    def process_llm_answer(self, memory: list, thought: str) -> Tuple[str, str]:
+        """
+        Split the LLM output into answer and reasoning, save the answer in memory and log the interaction.
+        """
         reasoning = self.extract_reasoning_text(thought)
         answer = self.remove_reasoning_text(thought)
         self.memory.push('assistant', answer)
@@ -11,6 +11,7 @@ from sources.tools.tools import Tools
 from sources.logger import Logger
 from sources.memory import Memory
 from sources.conversation_logger import get_conversation_logger
+from sources.request_scheduler import PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
 
 class PlannerAgent(Agent):
     def __init__(self, name, prompt_path, provider, verbose=False, browser=None):
@@ -35,9 +36,18 @@ class PlannerAgent(Agent):
         self.memory = Memory(self.load_prompt(prompt_path),
                                 recover_last_session=False, # session recovery in handled by the interaction class
                                 memory_compression=False,
-                                model_provider=provider.get_model_name())
+                                model_provider=provider.get_model_name(),
+                                context_length=provider.get_context_length)
         self.logger = Logger("planner_agent.log")
     
+    def set_stream_callback(self, callback) -> None:
+        """
+        Set the stream callback for the planner and all the agents it delegates to.
+        """
+        super().set_stream_callback(callback)
+        for agent in self.agents.values():
+            agent.set_stream_callback(callback)
+
     def get_task_names(self, text: str) -> List[str]:
         """
         Extracts task names from the given text.
@@ -202,7 +212,7 @@ class PlannerAgent(Agent):
         while not ok:
             animate_thinking("Thinking...", color="status")
             self.memory.push('user', prompt)
-            answer, reasoning = await self.llm_request()
+            answer, reasoning = await self.llm_request(PRIORITY_BACKGROUND if is_update else PRIORITY_INTERACTIVE)
             if "NO_UPDATE" in answer:
                 return []
             self.logger.info(f"LLM response for plan update:\n{answer}")
@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import importlib.util
+from typing import Callable, Any
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from ollama import Client as OllamaClient, AsyncClient as AsyncOllamaClient
+from openai import OpenAI, AsyncOpenAI
+
+from sources.logger import Logger
+
+class ClientRegistry:
+    """
+    ClientRegistry keeps one client per backend for a provider.
+    Clients are created on first use and reused on every call so TCP/TLS connections stay alive between agent turns.
+    Async clients are bound to the event loop they were created in, so they are stored per loop.
+    """
+    def __init__(self, max_connections: int = 20,
+                       max_keepalive_connections: int = 10,
+                       keepalive_expiry: float = 30.0,
+                       timeout: float = 600.0,
+                       http2: bool = False,
+                       request_headers: Callable[[], dict] | None = None):
+        """
+        Args:
+            max_connections (int): Maximum number of connections opened to a backend.
+            max_keepalive_connections (int): Maximum number of idle connections kept in the pool.
+            keepalive_expiry (float): Seconds an idle connection is kept alive.
+            timeout (float): Timeout in seconds for a request.
+            http2 (bool): Use HTTP/2 when the h2 package is installed.
+            request_headers (Callable): Headers added to each request of the httpx based clients (Ollama, OpenAI),
+                computed when the request is sent, e.g. from a context variable.
+        """
+        self.logger = Logger("provider.log")
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.http2 = http2
+        self.request_headers = request_headers
+        if http2 and importlib.util.find_spec("h2") is None:
+            self.logger.warning("HTTP/2 requested but the h2 package is not installed. Using HTTP/1.1.")
+            self.http2 = False
+        self.clients = {}
+        self.async_clients = {}
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple, factory: Callable[[], Any]) -> Any:
+        """
+        Get the client stored under key, create it with factory if it doesn't exist yet.
+        """
+        with self.lock:
+            if key not in self.clients:
+                self.logger.info(f"Creating client for {key[0]}")
+                self.clients[key] = factory()
+            return self.clients[key]
+
+    def get_async(self, key: tuple, factory: Callable[[], Any]) -> Any:
+        """
+        Get the async client stored under key for the running event loop, create it with factory if needed.
+        """
+        key = (asyncio.get_running_loop(),) + key
+        with self.lock:
+            if key not in self.async_clients:
+                self.logger.info(f"Creating async client for {key[1]}")
+                self.async_clients[key] = factory()
+            return self.async_clients[key]
+
+    def get_limits(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_keepalive_connections,
+                            keepalive_expiry=self.keepalive_expiry)
+
+    def add_request_headers(self, request: httpx.Request) -> None:
+        if self.request_headers is not None:
+            request.headers.update(self.request_headers())
+
+    async def aadd_request_headers(self, request: httpx.Request) -> None:
+        self.add_request_headers(request)
+
+    def http_client(self) -> httpx.Client:
+        """
+        Create a httpx client using the pool settings of the registry.
+        """
+        return httpx.Client(limits=self.get_limits(), timeout=self.timeout, http2=self.http2,
+                            event_hooks={"request": [self.add_request_headers]})
+
+    def async_http_client(self) -> httpx.AsyncClient:
+        """
+        Create a httpx async client using the pool settings of the registry.
+        """
+        return httpx.AsyncClient(limits=self.get_limits(), timeout=self.timeout, http2=self.http2,
+                                 event_hooks={"request": [self.aadd_request_headers]})
+
+    def openai(self, api_key: str | None, base_url: str | None = None) -> OpenAI:
+        """
+        Get the OpenAI (or OpenAI compatible) client for a base url.
+        """
+        return self.get(("openai", api_key, base_url),
+                        lambda: OpenAI(api_key=api_key, base_url=base_url, http_client=self.http_client()))
+
+    def ollama(self, host: str) -> OllamaClient:
+        """
+        Get the Ollama client for a host.
+        """
+        return self.get(("ollama", host),
+                        lambda: OllamaClient(host=host, limits=self.get_limits(), http2=self.http2,
+                                             event_hooks={"request": [self.add_request_headers]}))
+
+    def async_openai(self, api_key: str | None, base_url: str | None = None) -> AsyncOpenAI:
+        """
+        Get the async OpenAI (or OpenAI compatible) client for a base url.
+        """
+        return self.get_async(("openai", api_key, base_url),
+                              lambda: AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=self.async_http_client()))
+
+    def async_ollama(self, host: str) -> AsyncOllamaClient:
+        """
+        Get the async Ollama client for a host.
+        """
+        return self.get_async(("ollama", host),
+                              lambda: AsyncOllamaClient(host=host, limits=self.get_limits(), http2=self.http2,
+                                                        event_hooks={"request": [self.aadd_request_headers]}))
+
+    def async_http(self, base_url: str) -> httpx.AsyncClient:
+        """
+        Get a httpx async client for a base url (lm-studio, llm_server).
+        """
+        return self.get_async(("http", base_url), self.async_http_client)
+
+    def session(self, base_url: str) -> requests.Session:
+        """
+        Get a requests session for a base url (lm-studio, llm_server).
+        """
+        def make_session():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.max_keepalive_connections,
+                                  pool_maxsize=self.max_connections)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            return session
+        return self.get(("session", base_url), make_session)
+
+    def close(self) -> None:
+        """
+        Close all the clients and their connections.
+        """
+        with self.lock:
+            for client in self.clients.values():
+                close = getattr(client, "close", None)
+                if close is None and hasattr(client, "_client"):
+                    close = client._client.close
+                if close is not None:
+                    close()
+            self.clients = {}
+
+    async def aclose(self) -> None:
+        """
+        Close the async clients created in the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            keys = [key for key in self.async_clients if key[0] is loop]
+            clients = [self.async_clients.pop(key) for key in keys]
+        for client in clients:
+            if hasattr(client, "aclose"):
+                await client.aclose()
+            else:
+                await client.close()
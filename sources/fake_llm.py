@@ -0,0 +1,328 @@
+import re
+import json
+import time
+import random
+import itertools
+import asyncio
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from sources.logger import Logger
+from sources.telemetry import estimate_tokens
+
+DEFAULT_ANSWER = """
+\n\n```json\n{\n  \"plan\": [\n    {\n      \"agent\": \"Web\",\n      \"id\": \"1\",\n      \"need\": null,\n      \"task\": \"Conduct a comprehensive web search to identify at least five AI startups located in Osaka. Use reliable sources and websites such as Crunchbase, TechCrunch, or local Japanese business directories. Capture the company names, their websites, areas of expertise, and any other relevant details.\"\n    },\n    {\n      \"agent\": \"Web\",\n      \"id\": \"2\",\n      \"need\": null,\n      \"task\": \"Perform a similar search to find at least five AI startups in Tokyo. Again, use trusted sources like Crunchbase, TechCrunch, or Japanese business news websites. Gather the same details as for Osaka: company names, websites, areas of focus, and additional information.\"\n    },\n    {\n      \"agent\": \"File\",\n      \"id\": \"3\",\n      \"need\": [\"1\", \"2\"],\n      \"task\": \"Create a new text file named research_japan.txt in the user's home directory. Organize the data collected from both searches into this file, ensuring it is well-structured and formatted for readability. Include headers for Osaka and Tokyo sections, followed by the details of each startup found.\"\n    }\n  ]\n}\n```
+        """
+
+class FakeLLMError(Exception):
+    """
+    Error injected by the fake LLM.
+    """
+    pass
+
+class FakeLLM:
+    """
+    FakeLLM replays scripted answers with a simulated latency, to test and benchmark the framework without a real model.
+    Answers are picked per agent from the script, in order, and loop when the script is exhausted.
+    The timing and the injected errors only depend on the parameters and the seed, so two runs behave the same.
+    """
+    def __init__(self, script: dict | None = None,
+                       ttft: float = 0.0,
+                       tokens_per_sec: float = 0.0,
+                       error_rate: float = 0.0,
+                       error_message: str = "Fake LLM injected error",
+                       seed: int = 0,
+                       load_time: float = 0.0,
+                       context_length: int = 8192):
+        """
+        Args:
+            script (dict | None): Answers per agent name, the "default" answers are used for other agents.
+            ttft (float): Simulated time to first token in seconds.
+            tokens_per_sec (float): Simulated generation speed, 0 for no delay between tokens.
+            error_rate (float): Probability that a call fails with FakeLLMError.
+            error_message (str): Message of the injected errors.
+            seed (int): Seed of the error injection.
+            load_time (float): Simulated time to load the model on the first request, in seconds.
+            context_length (int): Context length reported by the model information endpoints.
+        """
+        self.logger = Logger("fake_llm.log")
+        self.script = script if script is not None else {"default": [DEFAULT_ANSWER]}
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.error_message = error_message
+        self.rng = random.Random(seed)
+        self.turns = {}
+        self.lock = threading.Lock()
+        self.load_time = load_time
+        self.context_length = context_length
+        self.loaded = False
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "FakeLLM":
+        """
+        Create a fake LLM from a JSON script file: {"agent name": ["first answer", "second answer"], "default": [...]}.
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            script = json.load(f)
+        return cls(script=script, **kwargs)
+
+    def save(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.script, f, indent=2, ensure_ascii=False)
+
+    def record(self, agent_name: str, answer: str) -> None:
+        """
+        Add the answer of a real LLM to the script, to replay it later.
+        """
+        with self.lock:
+            self.script.setdefault(agent_name, []).append(answer)
+
+    def next_answer(self, agent_name: str) -> str:
+        """
+        Get the next scripted answer for an agent, or raise an injected error.
+        """
+        with self.lock:
+            if self.error_rate > 0 and self.rng.random() < self.error_rate:
+                self.logger.warning(f"Injecting error for {agent_name}")
+                raise FakeLLMError(self.error_message)
+            key = agent_name if agent_name in self.script else "default"
+            answers = self.script.get(key) or [""]
+            turn = self.turns.get(key, 0)
+            self.turns[key] = turn + 1
+            return answers[turn % len(answers)]
+
+    def load_model(self) -> float:
+        """
+        Simulate loading the model, only the first call waits. Returns the time spent loading.
+        """
+        with self.lock:
+            if self.loaded:
+                return 0.0
+            time.sleep(self.load_time)
+            self.loaded = True
+            return self.load_time
+
+    @staticmethod
+    def tokenize(text: str) -> list:
+        """
+        Split a text in word-like tokens, joining the tokens gives back the text.
+        """
+        return re.findall(r"\s*\S+|\s+$", text)
+
+    def token_delay(self) -> float:
+        return 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+
+    def stream(self, history: list, agent_name: str = "default"):
+        """
+        Yield the next answer token by token with the simulated latency.
+        """
+        answer = self.next_answer(agent_name)
+        self.load_model()
+        time.sleep(self.ttft)
+        delay = self.token_delay()
+        for i, token in enumerate(self.tokenize(answer)):
+            if i > 0 and delay:
+                time.sleep(delay)
+            yield token
+
+    async def astream(self, history: list, agent_name: str = "default"):
+        """
+        Asynchronous version of stream.
+        """
+        answer = self.next_answer(agent_name)
+        if not self.loaded:
+            await asyncio.to_thread(self.load_model)
+        await asyncio.sleep(self.ttft)
+        delay = self.token_delay()
+        for i, token in enumerate(self.tokenize(answer)):
+            if i > 0:
+                await asyncio.sleep(delay)
+            yield token
+
+    def respond(self, history: list, agent_name: str = "default") -> str:
+        return "".join(self.stream(history, agent_name))
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    """
+    Serve the fake LLM with the Ollama (/api/chat) and OpenAI (/v1/chat/completions) wire formats.
+    The agent is read from the X-Agent-Name header, "default" if missing.
+    """
+    protocol_version = "HTTP/1.1" # allow keep-alive
+    disable_nagle_algorithm = True
+    fake_llm = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body: bytes, content_type: str = "application/json", status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_chunked(self, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def write_chunk(self, data: str):
+        body = data.encode()
+        self.wfile.write(f"{len(body):x}\r\n".encode() + body + b"\r\n")
+        self.wfile.flush()
+
+    def end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        model = {"name": "fake", "model": "fake", "size": 0, "digest": "fake"}
+        if self.path.endswith("/api/tags"):
+            self.send_body(json.dumps({"models": [model]}).encode())
+        elif self.path.endswith("/api/version"):
+            self.send_body(json.dumps({"version": "fake"}).encode())
+        elif self.path.endswith("/models"):
+            self.send_body(json.dumps({"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "fake",
+                                                                      "max_model_len": self.fake_llm.context_length}]}).encode())
+        else:
+            self.send_body(b'{"error": "not found"}', status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        agent_name = self.headers.get("X-Agent-Name", "default")
+        if self.path.endswith("/api/chat"):
+            self.stream_safely(self.ollama_chat, request, agent_name)
+        elif self.path.endswith("/api/generate") and not request.get("prompt"):
+            load_duration = self.fake_llm.load_model()
+            self.send_body(json.dumps({"model": request.get("model", "fake"), "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                                       "response": "", "done": True, "done_reason": "load",
+                                       "load_duration": int(load_duration * 1e9)}).encode())
+        elif self.path.endswith("/api/show"):
+            self.send_body(json.dumps({"modelfile": "", "parameters": "", "template": "",
+                                       "details": {"family": "fake", "format": "gguf"},
+                                       "model_info": {"general.architecture": "fake",
+                                                      "fake.context_length": self.fake_llm.context_length}}).encode())
+        elif self.path.endswith("/api/pull"):
+            self.send_body(json.dumps({"status": "success"}).encode())
+        elif self.path.endswith("/chat/completions"):
+            self.stream_safely(self.openai_chat, request, agent_name)
+        else:
+            self.send_body(b'{"error": "not found"}', status=404)
+
+    def stream_safely(self, handler, request: dict, agent_name: str):
+        """
+        Run a chat handler, stopping it when the client goes away in the middle of a stream (cancelled or timed out request).
+        """
+        try:
+            handler(request, agent_name)
+        except (BrokenPipeError, ConnectionResetError):
+            self.fake_llm.logger.info(f"Client of {agent_name} disconnected during the answer")
+            self.close_connection = True
+
+    def ollama_chat(self, request: dict, agent_name: str):
+        model = request.get("model", "fake")
+        try:
+            tokens = self.fake_llm.stream(request.get("messages", []), agent_name)
+            first = next(tokens, "")
+        except FakeLLMError as e:
+            self.send_body(json.dumps({"error": str(e)}).encode(), status=500)
+            return
+        def message(content: str, done: bool, **extra) -> dict:
+            return {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "message": {"role": "assistant", "content": content}, "done": done, **extra}
+        if not request.get("stream", True):
+            text = first + "".join(tokens)
+            self.send_body(json.dumps(message(text, True, done_reason="stop")).encode())
+            return
+        self.start_chunked("application/x-ndjson")
+        count = 0
+        for token in itertools.chain([first], tokens):
+            if not token:
+                continue
+            self.write_chunk(json.dumps(message(token, False)) + "\n")
+            count += 1
+        prompt_eval_count = estimate_tokens("".join(str(m.get("content", "")) for m in request.get("messages", [])))
+        self.write_chunk(json.dumps(message("", True, done_reason="stop", eval_count=count, prompt_eval_count=prompt_eval_count)) + "\n")
+        self.end_chunked()
+
+    def openai_chat(self, request: dict, agent_name: str):
+        model = request.get("model", "fake")
+        try:
+            tokens = self.fake_llm.stream(request.get("messages", []), agent_name)
+            first = next(tokens, "")
+        except FakeLLMError as e:
+            self.send_body(json.dumps({"error": {"message": str(e), "type": "server_error"}}).encode(), status=500)
+            return
+        created = int(time.time())
+        if not request.get("stream"):
+            text = first + "".join(tokens)
+            self.send_body(json.dumps({
+                "id": "fake", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}]
+            }).encode())
+            return
+        def event(delta: dict, finish_reason=None) -> str:
+            chunk = {"id": "fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            return f"data: {json.dumps(chunk)}\n\n"
+        self.start_chunked("text/event-stream")
+        text = first
+        self.write_chunk(event({"role": "assistant", "content": first}))
+        for token in tokens:
+            text += token
+            self.write_chunk(event({"content": token}))
+        self.write_chunk(event({}, "stop"))
+        if request.get("stream_options", {}).get("include_usage"):
+            prompt_tokens = estimate_tokens("".join(str(m.get("content", "")) for m in request.get("messages", [])))
+            completion_tokens = len(FakeLLM.tokenize(text))
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+            chunk = {"id": "fake", "object": "chat.completion.chunk", "created": created, "model": model, "choices": [], "usage": usage}
+            self.write_chunk(f"data: {json.dumps(chunk)}\n\n")
+        self.write_chunk("data: [DONE]\n\n")
+        self.end_chunked()
+
+class FakeLLMServer:
+    """
+    Run a fake LLM as a local HTTP server, so the ollama, openai and lm-studio providers can be pointed at it.
+    """
+    def __init__(self, fake_llm: FakeLLM, host: str = "127.0.0.1", port: int = 0):
+        handler = type("BoundFakeLLMHandler", (FakeLLMHandler,), {"fake_llm": fake_llm})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.thread = None
+
+    @property
+    def address(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self) -> "FakeLLMServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Fake LLM server speaking the Ollama and OpenAI APIs')
+    parser.add_argument('--host', type=str, default="127.0.0.1", help='Host to listen on')
+    parser.add_argument('--port', type=int, default=11434, help='Port to listen on')
+    parser.add_argument('--script', type=str, default=None, help='JSON file of answers per agent')
+    parser.add_argument('--ttft', type=float, default=0.0, help='Time to first token in seconds')
+    parser.add_argument('--tps', type=float, default=0.0, help='Tokens per second, 0 for no delay')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Probability of an injected error')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the error injection')
+    parser.add_argument('--load-time', type=float, default=0.0, help='Time to load the model on the first request in seconds')
+    args = parser.parse_args()
+
+    options = {"ttft": args.ttft, "tokens_per_sec": args.tps, "error_rate": args.error_rate, "seed": args.seed,
+               "load_time": args.load_time}
+    fake_llm = FakeLLM.load(args.script, **options) if args.script else FakeLLM(**options)
+    server = FakeLLMServer(fake_llm, args.host, args.port)
+    print(f"Fake LLM listening on {server.address}")
+    server.httpd.serve_forever()
@@ -0,0 +1,169 @@
+import time
+import socket
+import threading
+from urllib.parse import urlparse
+
+from sources.logger import Logger
+
+class EndpointHealth:
+    """
+    Cached health state and circuit breaker of one endpoint.
+    """
+    def __init__(self, address: str):
+        self.address = address
+        self.is_online = True # optimistic until the first probe
+        self.last_checked = 0.0
+        self.consecutive_failures = 0
+        self.circuit = "closed" # closed: requests allowed, open: requests rejected, half_open: trial requests allowed
+        self.opened_at = 0.0
+
+    def status(self) -> dict:
+        return {
+            "address": self.address,
+            "is_online": self.is_online,
+            "last_checked": self.last_checked,
+            "consecutive_failures": self.consecutive_failures,
+            "circuit": self.circuit,
+        }
+
+class HealthMonitor:
+    """
+    HealthMonitor probes the configured endpoints in a background thread and caches the result.
+    The request path only reads the cached state, so no probe is done while the user waits for an answer.
+    A circuit breaker stops sending requests to an endpoint after repeated failures, and lets a trial request through after reset_timeout.
+    """
+    def __init__(self, interval: float = 15.0,
+                       ttl: float = 30.0,
+                       probe_timeout: float = 2.0,
+                       failure_threshold: int = 3,
+                       reset_timeout: float = 30.0,
+                       background: bool = True):
+        """
+        Args:
+            interval (float): Seconds between two background probes of an endpoint.
+            ttl (float): Seconds a probe result is considered fresh.
+            probe_timeout (float): Timeout in seconds of a probe.
+            failure_threshold (int): Consecutive failures before the circuit opens.
+            reset_timeout (float): Seconds the circuit stays open before a trial request is allowed.
+            background (bool): Probe the endpoints in a background thread.
+        """
+        self.logger = Logger("health_monitor.log")
+        self.interval = interval
+        self.ttl = ttl
+        self.probe_timeout = probe_timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.background = background
+        self.endpoints = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def register(self, address: str) -> EndpointHealth:
+        """
+        Add an endpoint to monitor and start the background probing if needed.
+        """
+        with self.lock:
+            if address in self.endpoints:
+                return self.endpoints[address]
+            self.endpoints[address] = EndpointHealth(address)
+            if self.background and self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+        return self.endpoints[address]
+
+    def run(self) -> None:
+        while True:
+            self.wakeup.clear()
+            with self.lock:
+                stale = [e.address for e in self.endpoints.values() if time.time() - e.last_checked >= self.interval]
+            for address in stale:
+                self.update(address, self.probe(address))
+            self.wakeup.wait(timeout=self.interval)
+
+    def probe(self, address: str) -> bool:
+        """
+        Check if a TCP connection can be opened to the endpoint.
+        """
+        parsed = urlparse(address if address.startswith(('http://', 'https://')) else f'http://{address}')
+        hostname = parsed.hostname or address
+        try:
+            port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        except ValueError:
+            self.logger.error(f"Invalid address: {address}")
+            return False
+        try:
+            with socket.create_connection((hostname, port), timeout=self.probe_timeout):
+                return True
+        except OSError as e:
+            self.logger.warning(f"Probe of {address} failed: {str(e)}")
+            return False
+
+    def update(self, address: str, success: bool) -> None:
+        """
+        Record the result of a probe.
+        """
+        with self.lock:
+            endpoint = self.endpoints[address]
+            endpoint.last_checked = time.time()
+            if endpoint.is_online != success:
+                self.logger.info(f"Endpoint {address} is now {'online' if success else 'offline'}.")
+            endpoint.is_online = success
+            if success and endpoint.circuit == "open":
+                endpoint.circuit = "half_open"
+            if not success:
+                self.record_failure(endpoint)
+
+    def record_failure(self, endpoint: EndpointHealth) -> None:
+        endpoint.consecutive_failures += 1
+        if endpoint.circuit == "half_open" or endpoint.consecutive_failures >= self.failure_threshold:
+            if endpoint.circuit != "open":
+                self.logger.warning(f"Circuit opened for {endpoint.address} after {endpoint.consecutive_failures} failures.")
+            endpoint.circuit = "open"
+            endpoint.opened_at = time.time()
+
+    def is_online(self, address: str) -> bool:
+        """
+        Get the cached state of an endpoint. A stale state triggers a background probe.
+        """
+        endpoint = self.register(address)
+        if time.time() - endpoint.last_checked > self.ttl:
+            self.wakeup.set()
+        return endpoint.is_online
+
+    def allow_request(self, address: str) -> bool:
+        """
+        Check the circuit breaker of an endpoint before sending it a request.
+        """
+        endpoint = self.register(address)
+        with self.lock:
+            if endpoint.circuit == "open" and time.time() - endpoint.opened_at >= self.reset_timeout:
+                endpoint.circuit = "half_open"
+            return endpoint.circuit != "open"
+
+    def report_success(self, address: str) -> None:
+        """
+        Record a successful request to an endpoint.
+        """
+        endpoint = self.register(address)
+        with self.lock:
+            if endpoint.circuit != "closed":
+                self.logger.info(f"Circuit closed for {address}.")
+            endpoint.consecutive_failures = 0
+            endpoint.circuit = "closed"
+            endpoint.is_online = True
+
+    def report_failure(self, address: str) -> None:
+        """
+        Record a failed request to an endpoint.
+        """
+        endpoint = self.register(address)
+        with self.lock:
+            self.record_failure(endpoint)
+            endpoint.last_checked = 0.0 # probe again as soon as possible
+        self.wakeup.set()
+
+    def get_status(self) -> list:
+        with self.lock:
+            return [endpoint.status() for endpoint in self.endpoints.values()]
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+from sources.logger import Logger
+
+class LLMCache:
+    """
+    LLMCache stores LLM answers under a hash of everything that determines them (provider, model, messages, sampling parameters).
+    Answers are kept in a bounded in-memory LRU and in a SQLite file that is evicted by size, least recently used first.
+    """
+    def __init__(self, max_entries: int = 256,
+                       db_path: str | None = ".cache/llm_responses.sqlite",
+                       max_disk_bytes: int = 100 * 1024 * 1024):
+        """
+        Args:
+            max_entries (int): Maximum number of answers kept in memory.
+            db_path (str | None): Path of the SQLite file, None to only cache in memory.
+            max_disk_bytes (int): Maximum total size of the answers stored on disk.
+        """
+        self.logger = Logger("llm_cache.log")
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self.db = None
+        if db_path is not None:
+            self.db = self.open_db(db_path)
+
+    def open_db(self, db_path: str) -> sqlite3.Connection:
+        folder = os.path.dirname(db_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+        db = sqlite3.connect(db_path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("""CREATE TABLE IF NOT EXISTS responses (
+                        key TEXT PRIMARY KEY,
+                        response TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        last_access REAL NOT NULL)""")
+        db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)")
+        db.commit()
+        return db
+
+    @staticmethod
+    def make_key(provider: str, model: str, messages: list, params: dict | None = None) -> str:
+        """
+        Hash a request. Only the role and content of messages are used, metadata like timestamps is ignored.
+        """
+        payload = {
+            "provider": provider,
+            "model": model,
+            "messages": [{"role": m["role"], "content": m["content"]} for m in messages],
+            "params": params or {},
+        }
+        data = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """
+        Get a cached answer, None if the request was never answered.
+        """
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return self.memory[key]
+            if self.db is not None:
+                row = self.db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self.db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+                    self.db.commit()
+                    self.stats["disk_hits"] += 1
+                    self.store_in_memory(key, row[0])
+                    return row[0]
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, response: str) -> None:
+        """
+        Cache an answer in memory and on disk.
+        """
+        with self.lock:
+            self.stats["writes"] += 1
+            self.store_in_memory(key, response)
+            if self.db is None:
+                return
+            size = len(response.encode("utf-8"))
+            self.db.execute("INSERT OR REPLACE INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+                            (key, response, size, time.time()))
+            self.evict_disk()
+            self.db.commit()
+
+    def store_in_memory(self, key: str, response: str) -> None:
+        self.memory[key] = response
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def evict_disk(self) -> None:
+        """
+        Delete the least recently used answers until the disk tier fits in max_disk_bytes.
+        """
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        rows = self.db.execute("SELECT key, size FROM responses ORDER BY last_access ASC, rowid ASC").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_disk_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self.db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self.stats["evictions"] += len(evicted)
+        self.logger.info(f"Evicted {len(evicted)} cached answers from disk.")
+
+    def clear(self) -> None:
+        with self.lock:
+            self.memory.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM responses")
+                self.db.commit()
+
+    def get_stats(self) -> dict:
+        """
+        Hit/miss statistics of the cache.
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self.memory)
+            if self.db is not None:
+                stats["disk_entries"] = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -1,27 +1,66 @@
 import os
-import platform
-import socket
-import subprocess
+import asyncio
+import contextvars
+import threading
 import time
-from urllib.parse import urlparse
 
 import httpx
 import requests
 from dotenv import load_dotenv
-from ollama import Client as OllamaClient
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 
 from sources.logger import Logger
+from sources.client_registry import ClientRegistry
+from sources.health_monitor import HealthMonitor
+from sources.llm_cache import LLMCache
+from sources.fake_llm import FakeLLM
+from sources.request_scheduler import RequestScheduler, PRIORITY_INTERACTIVE
+from sources.load_balancer import LoadBalancer
+from sources.telemetry import Telemetry
 from sources.utility import pretty_print, animate_thinking
 from sources.conversation_logger import get_conversation_logger
 
+# name of the agent making the current call, per thread/asyncio task so concurrent calls don't mix up their logs
+current_agent_name = contextvars.ContextVar("current_agent_name", default="unknown")
+
+def agent_headers() -> dict:
+    return {"X-Agent-Name": current_agent_name.get()}
+
+# token counts reported by the backend for the current call, filled with Provider.report_usage
+call_usage = contextvars.ContextVar("call_usage", default=None)
+
 class Provider:
-    def __init__(self, provider_name, model, server_address="127.0.0.1:5000", is_local=False):
+    def __init__(self, provider_name, model, server_address="127.0.0.1:5000", is_local=False, client_registry=None, health_monitor=None, response_cache=None, fake_llm=None, scheduler=None,
+                 load_balancing="least_outstanding", hedge_after=None, telemetry=None, keep_alive=None,
+                 max_context_length=None):
         self.provider_name = provider_name.lower()
         self.model = model
         self.is_local = is_local
-        self.server_ip = server_address
-        self.server_address = server_address
+        self.endpoints = self.parse_endpoints(server_address)
+        self.balancer = LoadBalancer(self.endpoints, load_balancing)
+        self.hedge_after = hedge_after # seconds without answer before a request is also sent to another endpoint, None to disable
+        # endpoint used by the current call, per thread/asyncio task like current_agent_name
+        self.current_endpoint = contextvars.ContextVar(f"current_endpoint_{id(self)}", default=None)
+        # the agent name goes with each request, the fake LLM server replays the answers of each agent with it
+        self.clients = client_registry if client_registry is not None else ClientRegistry(request_headers=agent_headers)
+        self.health = health_monitor if health_monitor is not None else HealthMonitor()
+        self.response_cache = response_cache # opt-in LLMCache, None to always call the provider
+        self.fake_llm = fake_llm if fake_llm is not None else FakeLLM() # answers of the "test" provider
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
+        # how long ollama keeps the model loaded after a request ("30m", -1 for ever), None for the server default
+        self.keep_alive = int(keep_alive) if isinstance(keep_alive, str) and keep_alive.lstrip("-").isdigit() else keep_alive
+        self.max_context_length = max_context_length # cap of the context length given by the backend, None for no cap
+        self.context_lengths = {} # context length per model, queried once from the backend
+        self.context_length_failures = {} # time of the last failed query per model, so a down backend isn't asked on every turn
+        self.context_length_retry = 60.0 # seconds before asking again after a failure
+        self.context_length_thread = None # lookup started from an event loop, which must not wait for the backend
+        self.context_length_lock = threading.Lock()
+        self.ready = threading.Event() # cleared while the model is warming up
+        self.ready.set()
+        self.warm_status = {}
+        # sampling parameters sent with each request, part of the response cache key
+        self.sampling_params = {"temperature": 0.7, "max_tokens": 4096} if self.provider_name == "lm-studio" else {}
         self.available_providers = {
             "ollama": self.ollama_fn,
             "server": self.server_fn,
@@ -35,9 +74,36 @@ class Provider:
             "openrouter": self.openrouter_fn,
             "test": self.test_fn
         }
+        self.available_stream_providers = {
+            "ollama": self.ollama_stream_fn,
+            "server": self.server_stream_fn,
+            "openai": self.openai_stream_fn,
+            "lm-studio": self.lm_studio_stream_fn,
+            "google": self.google_stream_fn,
+            "deepseek": self.deepseek_stream_fn,
+            "together": self.together_stream_fn,
+            "openrouter": self.openrouter_stream_fn,
+            "test": self.test_stream_fn
+        }
+        self.available_async_stream_providers = {
+            "ollama": self.ollama_astream_fn,
+            "server": self.server_astream_fn,
+            "openai": self.openai_astream_fn,
+            "lm-studio": self.lm_studio_astream_fn,
+            "google": self.google_astream_fn,
+            "deepseek": self.deepseek_astream_fn,
+            "together": self.together_astream_fn,
+            "openrouter": self.openrouter_astream_fn,
+            "test": self.test_astream_fn
+        }
         self.logger = Logger("provider.log")
         self.api_key = None
         self.internal_url, self.in_docker = self.get_internal_url()
+        self.api_base_urls = {
+            "google": "https://generativelanguage.googleapis.com/v1beta/openai/",
+            "deepseek": "https://api.deepseek.com",
+            "openrouter": "https://openrouter.ai/api/v1"
+        }
         self.unsafe_providers = ["openai", "deepseek", "dsk_deepseek", "together", "google", "openrouter"]
         if self.provider_name not in self.available_providers:
             raise ValueError(f"Unknown provider: {provider_name}")
@@ -45,7 +111,28 @@ class Provider:
             pretty_print("Warning: you are using an API provider. You data will be sent to the cloud.", color="warning")
             self.api_key = self.get_api_key(self.provider_name)
         elif self.provider_name != "ollama":
-            pretty_print(f"Provider: {provider_name} initialized at {self.server_ip}", color="success")
+            pretty_print(f"Provider: {provider_name} initialized at {', '.join(self.endpoints)}", color="success")
+
+    @property
+    def server_address(self) -> str:
+        """
+        Address of the endpoint used by the current call, the first endpoint outside of a call.
+        """
+        return self.current_endpoint.get() or self.endpoints[0]
+
+    @property
+    def server_ip(self) -> str:
+        return self.server_address
+
+    @staticmethod
+    def parse_endpoints(server_address) -> list:
+        """
+        Get the list of endpoints from a list or a comma separated string of addresses.
+        """
+        if isinstance(server_address, str):
+            server_address = server_address.split(",")
+        endpoints = [address.strip() for address in server_address if address.strip()]
+        return endpoints or [""] # cloud providers don't need an address
 
     def get_model_name(self) -> str:
         return self.model
@@ -66,132 +153,754 @@ class Provider:
             return "http://localhost", False
         return url, True
 
-    def respond(self, history, verbose=True, agent_name="unknown"):
+    def respond(self, history, verbose=True, agent_name="unknown", priority=PRIORITY_INTERACTIVE):
         """
         Use the choosen provider to generate text.
+        With several endpoints, a failed request is sent again to another endpoint.
         """
         # Store agent name for API logging
-        self._current_agent_name = agent_name
+        current_agent_name.set(agent_name)
         
+        cache_key = self.response_cache_key(history)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
         llm = self.available_providers[self.provider_name]
         self.logger.info(f"Using provider: {self.provider_name} at {self.server_ip}")
+        self.wait_until_warm()
+        tracker = self.track_call(agent_name, history)
+        tried = []
+        last_error = None
+        with self.scheduler.slot(priority):
+            while True:
+                address = self.acquire_endpoint(tried)
+                if address is None:
+                    tracker.finish(None, success=False)
+                    if last_error is None:
+                        return f"Server {self.server_ip} seem offline. Unable to answer."
+                    return self.handle_provider_error(last_error)
+                tried.append(address)
+                endpoint = self.health_endpoint()
+                try:
+                    thought = llm(history, verbose)
+                    break
+                except KeyboardInterrupt:
+                    self.logger.warning("User interrupted the operation with Ctrl+C")
+                    tracker.finish(None, success=False)
+                    return "Operation interrupted by user. REQUEST_EXIT"
+                except Exception as e:
+                    self.report_health(endpoint, success=False)
+                    last_error = e
+                finally:
+                    self.balancer.release(address)
+        self.report_health(endpoint, success=True)
+        tracker.finish(thought)
+        if cache_key is not None:
+            self.response_cache.put(cache_key, thought)
+        return thought
+
+    def stream_respond(self, history, verbose=True, agent_name="unknown", priority=PRIORITY_INTERACTIVE):
+        """
+        Use the choosen provider to generate text, yielding chunks of text as soon as they are produced.
+        Providers without a streaming implementation yield their whole answer as a single chunk.
+        With several endpoints, a request that fails before its first chunk is sent again to another endpoint.
+        """
+        if self.provider_name not in self.available_stream_providers:
+            yield self.respond(history, verbose, agent_name, priority)
+            return
+        # Store agent name for API logging
+        current_agent_name.set(agent_name)
+
+        cache_key = self.response_cache_key(history)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        llm = self.available_stream_providers[self.provider_name]
+        self.logger.info(f"Streaming with provider: {self.provider_name} at {self.server_ip}")
+        self.wait_until_warm()
+        tracker = self.track_call(agent_name, history)
+        chunks = []
+        tried = []
+        last_error = None
+        with self.scheduler.slot(priority):
+            while True:
+                address = self.acquire_endpoint(tried)
+                if address is None:
+                    tracker.finish(None, success=False)
+                    if last_error is None:
+                        yield f"Server {self.server_ip} seem offline. Unable to answer."
+                        return
+                    yield self.handle_provider_error(last_error)
+                    return
+                tried.append(address)
+                try:
+                    for chunk in self.stream_endpoint(llm, history, verbose, address):
+                        tracker.chunk()
+                        chunks.append(chunk)
+                        yield chunk
+                    break
+                except KeyboardInterrupt:
+                    self.logger.warning("User interrupted the operation with Ctrl+C")
+                    tracker.finish("".join(chunks), success=False)
+                    yield "Operation interrupted by user. REQUEST_EXIT"
+                    return
+                except Exception as e:
+                    if chunks:
+                        # raised, not yielded: an error message would be appended to the partial answer
+                        tracker.finish("".join(chunks), success=False)
+                        raise Exception(f"Provider {self.provider_name} failed during the answer: {str(e)}") from e
+                    last_error = e
+        tracker.finish("".join(chunks))
+        if cache_key is not None:
+            self.response_cache.put(cache_key, "".join(chunks))
+
+    async def astream_respond(self, history, verbose=True, agent_name="unknown", priority=PRIORITY_INTERACTIVE):
+        """
+        Asynchronous version of stream_respond, many calls can be in flight on the same event loop.
+        Providers without an async implementation run their streaming function in a worker thread.
+        With several endpoints, slow requests can be hedged on a second endpoint (see hedge_after).
+        """
+        if self.provider_name not in self.available_async_stream_providers:
+            async for chunk in self.iterate_in_thread(self.stream_respond(history, verbose, agent_name, priority)):
+                yield chunk
+            return
+        # Store agent name for API logging
+        current_agent_name.set(agent_name)
+
+        cache_key = self.response_cache_key(history)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        llm = self.available_async_stream_providers[self.provider_name]
+        self.logger.info(f"Async streaming with provider: {self.provider_name} at {self.server_ip}")
+        if not self.ready.is_set():
+            await asyncio.to_thread(self.wait_until_warm)
+        tracker = self.track_call(agent_name, history)
+        chunks = []
+        tried = []
+        last_error = None
+        async with self.scheduler.aslot(priority):
+            while True:
+                address = self.acquire_endpoint(tried)
+                if address is None:
+                    tracker.finish(None, success=False)
+                    if last_error is None:
+                        yield f"Server {self.server_ip} seem offline. Unable to answer."
+                        return
+                    yield self.handle_provider_error(last_error)
+                    return
+                tried.append(address)
+                try:
+                    async for chunk in self.ahedged_stream(llm, history, verbose, address, tried):
+                        tracker.chunk()
+                        chunks.append(chunk)
+                        yield chunk
+                    break
+                except Exception as e:
+                    if chunks:
+                        # raised, not yielded: an error message would be appended to the partial answer
+                        tracker.finish("".join(chunks), success=False)
+                        raise Exception(f"Provider {self.provider_name} failed during the answer: {str(e)}") from e
+                    last_error = e
+        tracker.finish("".join(chunks))
+        if cache_key is not None:
+            self.response_cache.put(cache_key, "".join(chunks))
+
+    def warm_up(self) -> dict:
+        """
+        Load the model on every Ollama endpoint before the first request, pulling it if it is missing.
+        The context length of the model is also read, for every provider.
+        Returns the warm-up status per host.
+        """
+        if self.provider_name != "ollama":
+            self.get_context_length()
+            return self.warm_status
+        for address in self.endpoints:
+            token = self.current_endpoint.set(address)
+            try:
+                host = self.ollama_host()
+            finally:
+                self.current_endpoint.reset(token)
+            if host not in self.warm_status:
+                self.warm_status[host] = self.warm_up_host(host)
+        return self.warm_status
+
+    def warm_up_host(self, host: str) -> dict:
+        """
+        Load the model on one Ollama host with an empty generation and report the load time.
+        """
+        client = self.clients.ollama(host)
+        start_time = time.time()
         try:
-            thought = llm(history, verbose)
-        except KeyboardInterrupt:
-            self.logger.warning("User interrupted the operation with Ctrl+C")
-            return "Operation interrupted by user. REQUEST_EXIT"
-        except ConnectionError as e:
-            raise ConnectionError(f"{str(e)}\nConnection to {self.server_ip} failed.")
-        except AttributeError as e:
-            raise NotImplementedError(f"{str(e)}\nIs {self.provider_name} implemented ?")
-        except ModuleNotFoundError as e:
-            raise ModuleNotFoundError(
-                f"{str(e)}\nA import related to provider {self.provider_name} was not found. Is it installed ?")
+            try:
+                info = client.show(self.model)
+            except Exception as e:
+                if getattr(e, 'status_code', None) != 404:
+                    raise
+                pretty_print(f"Downloading {self.model} on {host}...", color="status")
+                client.pull(self.model)
+                info = client.show(self.model)
+            if self.model not in self.context_lengths:
+                self.set_context_length(self.parse_ollama_context_length(info))
+            response = client.generate(model=self.model, prompt="", keep_alive=self.keep_alive)
         except Exception as e:
-            if "try again later" in str(e).lower():
-                return f"{self.provider_name} server is overloaded. Please try again later."
-            if "refused" in str(e):
-                return f"Server {self.server_ip} seem offline. Unable to answer."
-            raise Exception(f"Provider {self.provider_name} failed: {str(e)}") from e
-        return thought
+            self.logger.error(f"Warm-up of {self.model} failed on {host}: {str(e)}")
+            pretty_print(f"Failed to load {self.model} on {host}: {str(e)}", color="failure")
+            self.health.report_failure(host)
+            return {"loaded": False, "error": str(e)}
+        load_time = time.time() - start_time
+        self.logger.info(f"Model {self.model} loaded on {host} in {load_time:.2f}s")
+        pretty_print(f"Model {self.model} loaded on {host} in {load_time:.1f}s", color="success")
+        return {"loaded": True, "load_time": load_time, "load_duration": (response.get("load_duration") or 0) / 1e9}
 
-    def is_ip_online(self, address: str, timeout: int = 10) -> bool:
+    def start_warm_up(self) -> threading.Thread:
         """
-        Check if an address is online by sending a ping request.
+        Warm up the model in a background thread, requests wait until it is done.
         """
-        if not address:
-            return False
-        parsed = urlparse(address if address.startswith(('http://', 'https://')) else f'http://{address}')
+        self.ready.clear()
+        def run():
+            try:
+                self.warm_up()
+            finally:
+                self.ready.set()
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def is_warm(self) -> bool:
+        return self.ready.is_set()
+
+    def wait_until_warm(self, timeout: float | None = None) -> bool:
+        if not self.ready.is_set():
+            self.logger.info("Waiting for the model warm-up to finish.")
+        return self.ready.wait(timeout)
 
-        hostname = parsed.hostname or address
-        if "127.0.0.1" in address or "localhost" in address:
-            return True
+    def get_context_length(self) -> int | None:
+        """
+        Get the context length of the model from the backend metadata, queried once per model (at warm-up).
+        Called from an event loop, the query runs in a background thread and None is returned until it is done.
+        Returns None if the backend doesn't report it.
+        """
+        if self.model in self.context_lengths:
+            return self.context_lengths[self.model]
+        failed_at = self.context_length_failures.get(self.model)
+        if failed_at is not None and time.monotonic() - failed_at < self.context_length_retry:
+            return None
         try:
-            ip_address = socket.gethostbyname(hostname)
-        except socket.gaierror:
-            self.logger.error(f"Cannot resolve: {hostname}")
-            return False
-        param = '-n' if platform.system().lower() == 'windows' else '-c'
-        command = ['ping', param, '1', ip_address]
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return self.lookup_context_length()
+        with self.context_length_lock:
+            if self.context_length_thread is None or not self.context_length_thread.is_alive():
+                self.context_length_thread = threading.Thread(target=self.lookup_context_length, daemon=True)
+                self.context_length_thread.start()
+        return None
+
+    def lookup_context_length(self) -> int | None:
         try:
-            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
-            return result.returncode == 0
-        except (subprocess.TimeoutExpired, subprocess.SubprocessError) as e:
-            return False
+            context_length = self.fetch_context_length()
+        except Exception as e:
+            # not cached, asked again once context_length_retry is over
+            self.context_length_failures[self.model] = time.monotonic()
+            self.logger.warning(f"Could not get the context length of {self.model}: {str(e)}")
+            return None
+        self.context_length_failures.pop(self.model, None)
+        return self.set_context_length(context_length)
+
+    def set_context_length(self, context_length: int | None) -> int | None:
+        if context_length is not None and self.max_context_length:
+            context_length = min(context_length, self.max_context_length)
+        self.context_lengths[self.model] = context_length
+        self.logger.info(f"Context length of {self.model}: {context_length}")
+        return context_length
+
+    def fetch_context_length(self) -> int | None:
+        """
+        Ask the backend for the context length of the model.
+        """
+        if self.provider_name == "test":
+            return self.fake_llm.context_length
+        if self.provider_name == "ollama":
+            return self.parse_ollama_context_length(self.clients.ollama(self.ollama_host()).show(self.model))
+        if self.provider_name == "server":
+            response = self.clients.session(self.server_ip).get(f"{self.server_ip}/model_info", params={"model": self.model}, timeout=10)
+            return response.json().get("context_length") if response.status_code == 200 else None
+        if self.provider_name == "lm-studio":
+            response = self.clients.session(self.lm_studio_url()).get(f"{self.lm_studio_url()}/api/v0/models/{self.model}", timeout=10)
+            return response.json().get("max_context_length") if response.status_code == 200 else None
+        clients = {
+            "openai": self.openai_client,
+            "deepseek": self.deepseek_client,
+            "google": self.google_client,
+            "openrouter": self.openrouter_client,
+        }
+        if self.provider_name in clients:
+            return self.parse_openai_context_length(clients[self.provider_name]().models.list())
+        return None
+
+    @staticmethod
+    def parse_ollama_context_length(info) -> int | None:
+        """
+        Read the context length from an Ollama /api/show answer.
+        A num_ctx parameter of the modelfile takes precedence over the context the model was trained with.
+        """
+        for line in (info.get("parameters") or "").splitlines():
+            fields = line.split()
+            if len(fields) == 2 and fields[0] == "num_ctx":
+                return int(fields[1])
+        for key, value in (info.get("modelinfo") or info.get("model_info") or {}).items():
+            if key.endswith(".context_length"):
+                return int(value)
+        return None
+
+    def parse_openai_context_length(self, models) -> int | None:
+        """
+        Read the context length of the model from an OpenAI compatible /models list.
+        The field depends on the server: context_length (OpenRouter), max_model_len (vLLM), context_window.
+        """
+        for model in models:
+            if model.id != self.model:
+                continue
+            fields = model.model_dump()
+            for key in ["context_length", "max_model_len", "context_window", "max_context_length"]:
+                if fields.get(key):
+                    return int(fields[key])
+        return None
+
+    def ollama_options(self) -> dict | None:
+        """
+        Options of the Ollama requests, num_ctx is set to the context length of the model.
+        """
+        context_length = self.get_context_length()
+        return {"num_ctx": context_length} if context_length else None
+
+    def track_call(self, agent_name: str, history: list):
+        """
+        Start measuring a call for telemetry, the backend reports its token counts with report_usage.
+        """
+        tracker = self.telemetry.track(agent_name, self.provider_name, self.model, history)
+        call_usage.set(tracker.usage)
+        return tracker
+
+    def report_usage(self, prompt_tokens: int | None = None, completion_tokens: int | None = None) -> None:
+        """
+        Report the token counts of the current call given by the backend.
+        """
+        usage = call_usage.get()
+        if usage is None:
+            return
+        if prompt_tokens is not None:
+            usage["prompt_tokens"] = prompt_tokens
+        if completion_tokens is not None:
+            usage["completion_tokens"] = completion_tokens
+
+    def acquire_endpoint(self, exclude: list) -> str | None:
+        """
+        Pick the endpoint for the current call with the load balancer, None if no endpoint can take it.
+        """
+        address = self.balancer.acquire(self.endpoint_allowed, self.endpoint_online, exclude)
+        if address is not None:
+            self.current_endpoint.set(address)
+        return address
+
+    def endpoint_health_address(self, address: str) -> str | None:
+        token = self.current_endpoint.set(address)
+        try:
+            return self.health_endpoint()
+        finally:
+            self.current_endpoint.reset(token)
+
+    def endpoint_allowed(self, address: str) -> bool:
+        health_address = self.endpoint_health_address(address)
+        return health_address is None or self.health.allow_request(health_address)
+
+    def endpoint_online(self, address: str) -> bool:
+        health_address = self.endpoint_health_address(address)
+        return health_address is None or self.health.is_online(health_address)
+
+    def stream_endpoint(self, llm, history, verbose, address):
+        """
+        Stream the answer of one endpoint acquired from the load balancer, and release it at the end.
+        """
+        self.current_endpoint.set(address)
+        endpoint = self.health_endpoint()
+        try:
+            for chunk in llm(history, verbose):
+                if chunk:
+                    yield chunk
+        except Exception:
+            self.report_health(endpoint, success=False)
+            raise
+        finally:
+            self.balancer.release(address)
+        self.report_health(endpoint, success=True)
+
+    async def astream_endpoint(self, llm, history, verbose, address):
+        """
+        Asynchronous version of stream_endpoint, the endpoint is released by ahedged_stream.
+        The endpoint is set in the context of the stream, a task when the request is hedged.
+        """
+        self.current_endpoint.set(address)
+        endpoint = self.health_endpoint()
+        try:
+            async for chunk in llm(history, verbose):
+                if chunk:
+                    yield chunk
+        except Exception:
+            self.report_health(endpoint, success=False)
+            raise
+        self.report_health(endpoint, success=True)
+
+    @staticmethod
+    async def first_chunk(stream):
+        try:
+            return await stream.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    async def ahedged_stream(self, llm, history, verbose, address, tried):
+        """
+        Stream the answer of an endpoint. If it gives no chunk within hedge_after seconds, the same request is sent to another endpoint.
+        The first endpoint to answer is kept and the other request is cancelled.
+        Every endpoint acquired for the call is released here, even if the stream is closed before its first chunk.
+        """
+        held = [address]
+        try:
+            if self.hedge_after is None or len(self.endpoints) < 2:
+                stream = self.astream_endpoint(llm, history, verbose, address)
+                try:
+                    async for chunk in stream:
+                        yield chunk
+                finally:
+                    await stream.aclose()
+                return
+            stream = self.astream_endpoint(llm, history, verbose, address)
+            streams = {asyncio.create_task(self.first_chunk(stream)): (stream, address)}
+            winner, winner_address, first, error = None, None, None, None
+            try:
+                done, pending = await asyncio.wait(streams, timeout=self.hedge_after)
+                if not done:
+                    # not acquire_endpoint: the endpoint of the caller is only changed once the winner is known
+                    backup = self.balancer.acquire(self.endpoint_allowed, self.endpoint_online, tried)
+                    if backup is not None:
+                        held.append(backup)
+                        tried.append(backup)
+                        self.logger.info(f"No answer from {address} after {self.hedge_after}s, hedging request on {backup}")
+                        hedge = self.astream_endpoint(llm, history, verbose, backup)
+                        streams[asyncio.create_task(self.first_chunk(hedge))] = (hedge, backup)
+                pending = set(streams)
+                while pending and winner is None:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is not None:
+                            error = task.exception()
+                        elif winner is None:
+                            (winner, winner_address), first = streams[task], task.result()
+            finally:
+                for task, (other, other_address) in streams.items():
+                    if other is not winner:
+                        task.cancel()
+                        await asyncio.gather(task, return_exceptions=True)
+                        await other.aclose()
+                        held.remove(other_address)
+                        self.balancer.release(other_address)
+            if winner is None:
+                raise error
+            self.current_endpoint.set(winner_address)
+            if first is None:
+                return
+            try:
+                yield first
+                async for chunk in winner:
+                    yield chunk
+            finally:
+                await winner.aclose()
+        finally:
+            for held_address in held:
+                self.balancer.release(held_address)
+
+    async def arespond(self, history, verbose=True, agent_name="unknown", priority=PRIORITY_INTERACTIVE) -> str:
+        """
+        Asynchronous version of respond.
+        """
+        thought = ""
+        async for chunk in self.astream_respond(history, verbose, agent_name, priority):
+            thought += chunk
+        return thought
+
+    async def iterate_in_thread(self, iterator):
+        """
+        Iterate a blocking iterator from a worker thread so the event loop is not blocked.
+        """
+        done = object()
+        while True:
+            chunk = await asyncio.to_thread(next, iterator, done)
+            if chunk is done:
+                break
+            yield chunk
+
+    def response_cache_key(self, history) -> str | None:
+        """
+        Get the key of a request in the response cache, None if caching is disabled.
+        """
+        if self.response_cache is None:
+            return None
+        return LLMCache.make_key(self.provider_name, self.model, history, self.sampling_params)
+
+    def health_endpoint(self) -> str | None:
+        """
+        Get the address of the self-hosted endpoint used by the provider, None for cloud APIs.
+        """
+        if self.provider_name == "server":
+            return self.server_ip
+        if self.provider_name == "ollama":
+            return self.ollama_host()
+        if self.provider_name == "lm-studio":
+            return self.lm_studio_url()
+        if self.provider_name == "openai" and self.is_local:
+            return self.openai_base_url()
+        return None
+
+    def report_health(self, endpoint: str | None, success: bool) -> None:
+        """
+        Feed the result of a request to the health monitor circuit breaker.
+        """
+        if endpoint is None:
+            return
+        if success:
+            self.health.report_success(endpoint)
+        else:
+            self.health.report_failure(endpoint)
+
+    def handle_provider_error(self, e: Exception) -> str:
+        """
+        Turn a provider failure into a message for the user or re-raise it with more context.
+        """
+        if isinstance(e, ConnectionError):
+            raise ConnectionError(f"{str(e)}\nConnection to {self.server_ip} failed.")
+        if isinstance(e, AttributeError):
+            raise NotImplementedError(f"{str(e)}\nIs {self.provider_name} implemented ?")
+        if isinstance(e, ModuleNotFoundError):
+            raise ModuleNotFoundError(
+                f"{str(e)}\nA import related to provider {self.provider_name} was not found. Is it installed ?")
+        if "try again later" in str(e).lower():
+            return f"{self.provider_name} server is overloaded. Please try again later."
+        if "refused" in str(e):
+            return f"Server {self.server_ip} seem offline. Unable to answer."
+        raise Exception(f"Provider {self.provider_name} failed: {str(e)}") from e
 
     def server_fn(self, history, verbose=False):
         """
         Use a remote server with LLM to generate text.
         """
-        thought = ""
+        return "".join(self.server_stream_fn(history, verbose))
+
+    def parse_server_event(self, line: str) -> str | None:
+        """
+        Parse a server-sent event line of the llm_server /stream route.
+        Returns the text, "" for lines without text, None at the end of the stream.
+        """
+        import json
+
+        if line == "event: done":
+            return None
+        if not line or not line.startswith("data:"):
+            return ""
+        return json.loads(line[len("data:"):]).get("text", "")
+
+    def server_stream_fn(self, history, verbose=False):
+        """
+        Use a remote server with LLM to generate text, yielding the text as the server streams it.
+        """
         route_setup = f"{self.server_ip}/setup"
         route_gen = f"{self.server_ip}/generate"
+        route_stream = f"{self.server_ip}/stream"
 
-        if not self.is_ip_online(self.server_ip):
+        if not self.health.is_online(self.server_ip):
             pretty_print(f"Server is offline at {self.server_ip}", color="failure")
 
+        session = self.clients.session(self.server_ip)
         try:
-            requests.post(route_setup, json={"model": self.model})
-            requests.post(route_gen, json={"messages": history})
-            is_complete = False
-            while not is_complete:
-                try:
-                    response = requests.get(f"{self.server_ip}/get_updated_sentence")
-                    if "error" in response.json():
-                        pretty_print(response.json()["error"], color="failure")
+            session.post(route_setup, json={"model": self.model})
+            response = session.post(route_gen, json={"messages": history, "model": self.model})
+            request_id = self.server_request_id(response.status_code, response.json())
+            params = {"request_id": request_id} if request_id else None
+            with session.get(route_stream, params=params, stream=True) as response:
+                if response.status_code == 404: # server without streaming support
+                    yield from self.server_poll_fn(session, verbose, request_id)
+                    return
+                for line in response.iter_lines(decode_unicode=True):
+                    text = self.parse_server_event(line)
+                    if text is None:
                         break
-                    thought = response.json()["sentence"]
-                    is_complete = bool(response.json()["is_complete"])
-                    time.sleep(2)
-                except requests.exceptions.RequestException as e:
-                    pretty_print(f"HTTP request failed: {str(e)}", color="failure")
-                    break
-                except ValueError as e:
-                    pretty_print(f"Failed to parse JSON response: {str(e)}", color="failure")
-                    break
-                except Exception as e:
-                    pretty_print(f"An error occurred: {str(e)}", color="failure")
+                    if verbose:
+                        print(text, end="", flush=True)
+                    yield text
+        except requests.exceptions.ConnectionError as e:
+            raise Exception(f"Connection refused at {self.server_ip}") from e
+        except requests.exceptions.RequestException as e:
+            pretty_print(f"HTTP request failed: {str(e)}", color="failure")
+        except ValueError as e:
+            pretty_print(f"Failed to parse server event: {str(e)}", color="failure")
+
+    async def server_astream_fn(self, history, verbose=False):
+        """
+        Use a remote server with LLM to generate text asynchronously, yielding the text as the server streams it.
+        """
+        route_setup = f"{self.server_ip}/setup"
+        route_gen = f"{self.server_ip}/generate"
+        route_stream = f"{self.server_ip}/stream"
+
+        if not self.health.is_online(self.server_ip):
+            pretty_print(f"Server is offline at {self.server_ip}", color="failure")
+
+        client = self.clients.async_http(self.server_ip)
+        try:
+            await client.post(route_setup, json={"model": self.model})
+            response = await client.post(route_gen, json={"messages": history, "model": self.model})
+            request_id = self.server_request_id(response.status_code, response.json())
+            params = {"request_id": request_id} if request_id else None
+            async with client.stream("GET", route_stream, params=params) as response:
+                if response.status_code == 404: # server without streaming support
+                    session = self.clients.session(self.server_ip)
+                    async for chunk in self.iterate_in_thread(self.server_poll_fn(session, verbose, request_id)):
+                        yield chunk
+                    return
+                async for line in response.aiter_lines():
+                    text = self.parse_server_event(line)
+                    if text is None:
+                        break
+                    if verbose:
+                        print(text, end="", flush=True)
+                    yield text
+        except httpx.ConnectError as e:
+            raise Exception(f"Connection refused at {self.server_ip}") from e
+        except httpx.HTTPError as e:
+            pretty_print(f"HTTP request failed: {str(e)}", color="failure")
+        except ValueError as e:
+            pretty_print(f"Failed to parse server event: {str(e)}", color="failure")
+
+    def server_request_id(self, status_code: int, body: dict) -> str | None:
+        """
+        Get the id of a generation started on llm_server, None for servers without generation sessions.
+        Raise if the server refused the generation, so another endpoint can take it.
+        """
+        if status_code >= 400:
+            raise Exception(f"Server {self.server_ip} refused the generation: {body.get('error', status_code)}")
+        return body.get("request_id")
+
+    def server_poll_fn(self, session, verbose=False, request_id=None):
+        """
+        Poll a remote server that doesn't support streaming, yielding the new text of each poll.
+        """
+        thought = ""
+        is_complete = False
+        params = {"request_id": request_id} if request_id else None
+        while not is_complete:
+            try:
+                response = session.get(f"{self.server_ip}/get_updated_sentence", params=params)
+                if "error" in response.json():
+                    pretty_print(response.json()["error"], color="failure")
                     break
-        except KeyError as e:
-            raise Exception(
-                f"{str(e)}\nError occured with server route. Are you using the correct address for the config.ini provider?") from e
-        except Exception as e:
-            raise e
-        return thought
+                sentence = response.json()["sentence"]
+                is_complete = bool(response.json()["is_complete"])
+                if sentence.startswith(thought) and len(sentence) > len(thought):
+                    chunk = sentence[len(thought):]
+                    if verbose:
+                        print(chunk, end="", flush=True)
+                    yield chunk
+                thought = sentence
+                if not is_complete:
+                    time.sleep(2)
+            except requests.exceptions.RequestException as e:
+                pretty_print(f"HTTP request failed: {str(e)}", color="failure")
+                break
+            except ValueError as e:
+                pretty_print(f"Failed to parse JSON response: {str(e)}", color="failure")
+                break
+            except Exception as e:
+                pretty_print(f"An error occurred: {str(e)}", color="failure")
+                break
 
     def ollama_fn(self, history, verbose=False):
         """
         Use local or remote Ollama server to generate text.
         """
-        import time
-        import json
-        
-        thought = ""
-        host = f"{self.internal_url}:11434" if self.is_local else f"http://{self.server_address}"
-        client = OllamaClient(host=host)
-        
-        # Get conversation logger and agent name from context
-        conv_logger = get_conversation_logger()
-        agent_name = getattr(self, '_current_agent_name', 'unknown')
-        
-        # Prepare request data
-        url = f"{host}/api/chat"
-        request_body = {
+        return "".join(self.ollama_stream_fn(history, verbose))
+
+    def ollama_host(self) -> str:
+        return f"{self.internal_url}:11434" if self.is_local else f"http://{self.server_address}"
+
+    def log_ollama_request(self, history) -> None:
+        """
+        Log an Ollama chat request with the conversation logger.
+        """
+        host = self.ollama_host()
+        get_conversation_logger().log_api_request(
+            agent_name=current_agent_name.get(),
+            provider="ollama",
+            url=f"{host}/api/chat",
+            headers={"Content-Type": "application/json"},
+            body={
+                "model": self.model,
+                "messages": history,
+                "stream": True
+            }
+        )
+
+    def log_ollama_response(self, response_chunks: list, thought: str, start_time: float) -> None:
+        """
+        Log a completed Ollama chat response with the conversation logger.
+        """
+        response_body = {
             "model": self.model,
-            "messages": history,
-            "stream": True
+            "created_at": response_chunks[0].get("created_at") if response_chunks else None,
+            "message": {
+                "role": "assistant",
+                "content": thought
+            },
+            "done": True,
+            "total_duration": response_chunks[-1].get("total_duration") if response_chunks else None,
+            "eval_count": response_chunks[-1].get("eval_count") if response_chunks else None,
+            "prompt_eval_count": response_chunks[-1].get("prompt_eval_count") if response_chunks else None
         }
-        
-        # Log the request
-        start_time = time.time()
-        conv_logger.log_api_request(
-            agent_name=agent_name,
+        get_conversation_logger().log_api_response(
+            agent_name=current_agent_name.get(),
             provider="ollama",
-            url=url,
+            status_code=200,
             headers={"Content-Type": "application/json"},
-            body=request_body
+            body=response_body,
+            duration_ms=(time.time() - start_time) * 1000
         )
 
+    def log_ollama_error(self, e: Exception, status_code: int, start_time: float) -> None:
+        """
+        Log a failed Ollama chat request with the conversation logger.
+        """
+        get_conversation_logger().log_api_response(
+            agent_name=current_agent_name.get(),
+            provider="ollama",
+            status_code=status_code,
+            headers={},
+            body={"error": str(e)},
+            duration_ms=(time.time() - start_time) * 1000
+        )
+
+    def ollama_stream_fn(self, history, verbose=False):
+        """
+        Use local or remote Ollama server to generate text, yielding chunks as they arrive.
+        """
+        thought = ""
+        host = self.ollama_host()
+        client = self.clients.ollama(host)
+        start_time = time.time()
+        self.log_ollama_request(history)
+
         try:
             # Collect response chunks
             response_chunks = []
@@ -200,81 +909,91 @@ class Provider:
                 model=self.model,
                 messages=history,
                 stream=True,
+                keep_alive=self.keep_alive,
+                options=self.ollama_options(),
             )
             for chunk in stream:
                 response_chunks.append(chunk)
                 if verbose:
                     print(chunk["message"]["content"], end="", flush=True)
                 thought += chunk["message"]["content"]
-                
-            # Log the response
-            duration_ms = (time.time() - start_time) * 1000
-            response_body = {
-                "model": self.model,
-                "created_at": response_chunks[0].get("created_at") if response_chunks else None,
-                "message": {
-                    "role": "assistant",
-                    "content": thought
-                },
-                "done": True,
-                "total_duration": response_chunks[-1].get("total_duration") if response_chunks else None,
-                "eval_count": response_chunks[-1].get("eval_count") if response_chunks else None,
-                "prompt_eval_count": response_chunks[-1].get("prompt_eval_count") if response_chunks else None
-            }
-            
-            conv_logger.log_api_response(
-                agent_name=agent_name,
-                provider="ollama",
-                status_code=200,
-                headers={"Content-Type": "application/json"},
-                body=response_body,
-                duration_ms=duration_ms
-            )
-            
+                yield chunk["message"]["content"]
+            self.log_ollama_response(response_chunks, thought, start_time)
+            if response_chunks:
+                self.report_usage(response_chunks[-1].get("prompt_eval_count"), response_chunks[-1].get("eval_count"))
         except httpx.ConnectError as e:
-            # Log error response
-            conv_logger.log_api_response(
-                agent_name=agent_name,
-                provider="ollama",
-                status_code=0,
-                headers={},
-                body={"error": str(e)},
-                duration_ms=(time.time() - start_time) * 1000
-            )
+            self.log_ollama_error(e, 0, start_time)
             raise Exception(
                 f"\nOllama connection failed at {host}. Check if the server is running."
             ) from e
         except Exception as e:
-            # Log error response
-            conv_logger.log_api_response(
-                agent_name=agent_name,
-                provider="ollama",
-                status_code=500,
-                headers={},
-                body={"error": str(e)},
-                duration_ms=(time.time() - start_time) * 1000
-            )
-            
+            self.log_ollama_error(e, 500, start_time)
             if hasattr(e, 'status_code') and e.status_code == 404:
                 animate_thinking(f"Downloading {self.model}...")
                 client.pull(self.model)
-                return self.ollama_fn(history, verbose)
+                yield from self.ollama_stream_fn(history, verbose)
+                return
             if "refused" in str(e).lower():
                 raise Exception(
                     f"Ollama connection refused at {host}. Is the server running?"
                 ) from e
             raise e
 
-        return thought
+    async def ollama_astream_fn(self, history, verbose=False):
+        """
+        Use local or remote Ollama server to generate text asynchronously, yielding chunks as they arrive.
+        """
+        thought = ""
+        host = self.ollama_host()
+        client = self.clients.async_ollama(host)
+        start_time = time.time()
+        self.log_ollama_request(history)
+
+        try:
+            response_chunks = []
+            options = self.ollama_options() if self.model in self.context_lengths else await asyncio.to_thread(self.ollama_options)
+            stream = await client.chat(
+                model=self.model,
+                messages=history,
+                stream=True,
+                keep_alive=self.keep_alive,
+                options=options,
+            )
+            async for chunk in stream:
+                response_chunks.append(chunk)
+                if verbose:
+                    print(chunk["message"]["content"], end="", flush=True)
+                thought += chunk["message"]["content"]
+                yield chunk["message"]["content"]
+            self.log_ollama_response(response_chunks, thought, start_time)
+            if response_chunks:
+                self.report_usage(response_chunks[-1].get("prompt_eval_count"), response_chunks[-1].get("eval_count"))
+        except httpx.ConnectError as e:
+            self.log_ollama_error(e, 0, start_time)
+            raise Exception(
+                f"\nOllama connection failed at {host}. Check if the server is running."
+            ) from e
+        except Exception as e:
+            self.log_ollama_error(e, 500, start_time)
+            if hasattr(e, 'status_code') and e.status_code == 404:
+                animate_thinking(f"Downloading {self.model}...")
+                await client.pull(self.model)
+                async for chunk in self.ollama_astream_fn(history, verbose):
+                    yield chunk
+                return
+            if "refused" in str(e).lower():
+                raise Exception(
+                    f"Ollama connection refused at {host}. Is the server running?"
+                ) from e
+            raise e
 
     def huggingface_fn(self, history, verbose=False):
         """
         Use huggingface to generate text.
         """
         from huggingface_hub import InferenceClient
-        client = InferenceClient(
-            api_key=self.get_api_key("huggingface")
-        )
+        client = self.clients.get(("huggingface",),
+                                  lambda: InferenceClient(api_key=self.get_api_key("huggingface")))
         completion = client.chat.completions.create(
             model=self.model,
             messages=history,
@@ -283,9 +1002,9 @@ class Provider:
         thought = completion.choices[0].message
         return thought.content
 
-    def openai_fn(self, history, verbose=False):
+    def openai_base_url(self) -> str | None:
         """
-        Use openai to generate text.
+        Get the base url of the OpenAI server, None for the OpenAI api.
         """
         base_url = self.server_ip
         if self.is_local and self.in_docker:
@@ -293,12 +1012,72 @@ class Provider:
                 host, port = base_url.split(':')
             except Exception as e:
                 port = "8000"
-            client = OpenAI(api_key=self.api_key, base_url=f"{self.internal_url}:{port}")
+            return f"{self.internal_url}:{port}"
         elif self.is_local:
-            client = OpenAI(api_key=self.api_key, base_url=f"http://{base_url}")
-        else:
-            client = OpenAI(api_key=self.api_key)
+            return f"http://{base_url}"
+        return None
+
+    def openai_client(self) -> OpenAI:
+        """
+        Get the OpenAI client for the configured server.
+        """
+        return self.clients.openai(self.api_key, self.openai_base_url())
+
+    def openai_async_client(self) -> AsyncOpenAI:
+        """
+        Get the async OpenAI client for the configured server.
+        """
+        return self.clients.async_openai(self.api_key, self.openai_base_url())
 
+    async def astream_chat_completion(self, client, model, history, verbose=False):
+        """
+        Stream a chat completion from an async OpenAI compatible client, yielding the text deltas.
+        """
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=history,
+            stream=True,
+            stream_options={"include_usage": True} # the last chunk has the token counts and no choices
+        )
+        async for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                self.report_usage(chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if not content:
+                continue
+            if verbose:
+                print(content, end="", flush=True)
+            yield content
+
+    def stream_chat_completion(self, client, model, history, verbose=False):
+        """
+        Stream a chat completion from an OpenAI compatible client, yielding the text deltas.
+        """
+        stream = client.chat.completions.create(
+            model=model,
+            messages=history,
+            stream=True,
+            stream_options={"include_usage": True} # the last chunk has the token counts and no choices
+        )
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                self.report_usage(chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if not content:
+                continue
+            if verbose:
+                print(content, end="", flush=True)
+            yield content
+
+    def openai_fn(self, history, verbose=False):
+        """
+        Use openai to generate text.
+        """
+        client = self.openai_client()
         try:
             response = client.chat.completions.create(
                 model=self.model,
@@ -313,13 +1092,34 @@ class Provider:
         except Exception as e:
             raise Exception(f"OpenAI API error: {str(e)}") from e
 
+    def openai_stream_fn(self, history, verbose=False):
+        """
+        Use openai to generate text, yielding chunks as they arrive.
+        """
+        client = self.openai_client()
+        try:
+            yield from self.stream_chat_completion(client, self.model, history, verbose)
+        except Exception as e:
+            raise Exception(f"OpenAI API error: {str(e)}") from e
+
+    async def openai_astream_fn(self, history, verbose=False):
+        """
+        Use openai to generate text asynchronously, yielding chunks as they arrive.
+        """
+        client = self.openai_async_client()
+        try:
+            async for chunk in self.astream_chat_completion(client, self.model, history, verbose):
+                yield chunk
+        except Exception as e:
+            raise Exception(f"OpenAI API error: {str(e)}") from e
+
     def anthropic_fn(self, history, verbose=False):
         """
         Use Anthropic to generate text.
         """
         from anthropic import Anthropic
 
-        client = Anthropic(api_key=self.api_key)
+        client = self.clients.get(("anthropic", self.api_key), lambda: Anthropic(api_key=self.api_key))
         system_message = None
         messages = []
         for message in history:
@@ -353,7 +1153,7 @@ class Provider:
         if self.is_local:
             raise Exception("Google Gemini is not available for local use. Change config.ini")
 
-        client = OpenAI(api_key=self.api_key, base_url="https://generativelanguage.googleapis.com/v1beta/openai/")
+        client = self.google_client()
         try:
             response = client.chat.completions.create(
                 model=self.model,
@@ -368,12 +1168,42 @@ class Provider:
         except Exception as e:
             raise Exception(f"GOOGLE API error: {str(e)}") from e
 
+    def google_client(self) -> OpenAI:
+        """
+        Get the OpenAI compatible client for google gemini.
+        """
+        return self.clients.openai(self.api_key, self.api_base_urls["google"])
+
+    def google_stream_fn(self, history, verbose=False):
+        """
+        Use google gemini to generate text, yielding chunks as they arrive.
+        """
+        if self.is_local:
+            raise Exception("Google Gemini is not available for local use. Change config.ini")
+        client = self.google_client()
+        try:
+            yield from self.stream_chat_completion(client, self.model, history, verbose)
+        except Exception as e:
+            raise Exception(f"GOOGLE API error: {str(e)}") from e
+
+    async def google_astream_fn(self, history, verbose=False):
+        """
+        Use google gemini to generate text asynchronously, yielding chunks as they arrive.
+        """
+        if self.is_local:
+            raise Exception("Google Gemini is not available for local use. Change config.ini")
+        client = self.clients.async_openai(self.api_key, self.api_base_urls["google"])
+        try:
+            async for chunk in self.astream_chat_completion(client, self.model, history, verbose):
+                yield chunk
+        except Exception as e:
+            raise Exception(f"GOOGLE API error: {str(e)}") from e
+
     def together_fn(self, history, verbose=False):
         """
         Use together AI for completion
         """
-        from together import Together
-        client = Together(api_key=self.api_key)
+        client = self.together_client()
         if self.is_local:
             raise Exception("Together AI is not available for local use. Change config.ini")
 
@@ -391,11 +1221,44 @@ class Provider:
         except Exception as e:
             raise Exception(f"Together AI API error: {str(e)}") from e
 
+    def together_client(self):
+        """
+        Get the together AI client.
+        """
+        from together import Together
+        return self.clients.get(("together", self.api_key), lambda: Together(api_key=self.api_key))
+
+    def together_stream_fn(self, history, verbose=False):
+        """
+        Use together AI for completion, yielding chunks as they arrive.
+        """
+        if self.is_local:
+            raise Exception("Together AI is not available for local use. Change config.ini")
+        client = self.together_client()
+        try:
+            yield from self.stream_chat_completion(client, self.model, history, verbose)
+        except Exception as e:
+            raise Exception(f"Together AI API error: {str(e)}") from e
+
+    async def together_astream_fn(self, history, verbose=False):
+        """
+        Use together AI for completion asynchronously, yielding chunks as they arrive.
+        """
+        from together import AsyncTogether
+        if self.is_local:
+            raise Exception("Together AI is not available for local use. Change config.ini")
+        client = self.clients.get_async(("together", self.api_key), lambda: AsyncTogether(api_key=self.api_key))
+        try:
+            async for chunk in self.astream_chat_completion(client, self.model, history, verbose):
+                yield chunk
+        except Exception as e:
+            raise Exception(f"Together AI API error: {str(e)}") from e
+
     def deepseek_fn(self, history, verbose=False):
         """
         Use deepseek api to generate text.
         """
-        client = OpenAI(api_key=self.api_key, base_url="https://api.deepseek.com")
+        client = self.deepseek_client()
         if self.is_local:
             raise Exception("Deepseek (API) is not available for local use. Change config.ini")
         try:
@@ -411,28 +1274,62 @@ class Provider:
         except Exception as e:
             raise Exception(f"Deepseek API error: {str(e)}") from e
 
-    def lm_studio_fn(self, history, verbose=False):
+    def deepseek_client(self) -> OpenAI:
         """
-        Use local lm-studio server to generate text.
+        Get the OpenAI compatible client for the deepseek api.
+        """
+        return self.clients.openai(self.api_key, self.api_base_urls["deepseek"])
+
+    def deepseek_stream_fn(self, history, verbose=False):
+        """
+        Use deepseek api to generate text, yielding chunks as they arrive.
+        """
+        if self.is_local:
+            raise Exception("Deepseek (API) is not available for local use. Change config.ini")
+        client = self.deepseek_client()
+        try:
+            yield from self.stream_chat_completion(client, "deepseek-chat", history, verbose)
+        except Exception as e:
+            raise Exception(f"Deepseek API error: {str(e)}") from e
+
+    async def deepseek_astream_fn(self, history, verbose=False):
+        """
+        Use deepseek api to generate text asynchronously, yielding chunks as they arrive.
+        """
+        if self.is_local:
+            raise Exception("Deepseek (API) is not available for local use. Change config.ini")
+        client = self.clients.async_openai(self.api_key, self.api_base_urls["deepseek"])
+        try:
+            async for chunk in self.astream_chat_completion(client, "deepseek-chat", history, verbose):
+                yield chunk
+        except Exception as e:
+            raise Exception(f"Deepseek API error: {str(e)}") from e
+
+    def lm_studio_url(self) -> str:
+        """
+        Get the base url of the lm-studio server.
         """
         if self.in_docker:
             # Extract port from server_address if present
             port = "1234"  # default
             if ":" in self.server_address:
                 port = self.server_address.split(":")[1]
-            url = f"{self.internal_url}:{port}"
-        else:
-            url = f"http://{self.server_ip}"
-        route_start = f"{url}/v1/chat/completions"
+            return f"{self.internal_url}:{port}"
+        return f"http://{self.server_ip}"
+
+    def lm_studio_fn(self, history, verbose=False):
+        """
+        Use local lm-studio server to generate text.
+        """
+        route_start = f"{self.lm_studio_url()}/v1/chat/completions"
         payload = {
             "messages": history,
-            "temperature": 0.7,
-            "max_tokens": 4096,
+            **self.sampling_params,
             "model": self.model
         }
 
         try:
-            response = requests.post(route_start, json=payload, timeout=30)
+            response = self.clients.session(self.lm_studio_url()).post(route_start, json=payload, timeout=30)
             if response.status_code != 200:
                 raise Exception(f"LM Studio returned status {response.status_code}: {response.text}")
             if not response.text.strip():
@@ -466,11 +1363,99 @@ class Provider:
             raise Exception(f"Unexpected error: {str(e)}") from e
         return thought
 
+    def lm_studio_stream_payload(self, history) -> dict:
+        return {
+            "messages": history,
+            **self.sampling_params,
+            "model": self.model,
+            "stream": True
+        }
+
+    def parse_lm_studio_event(self, line: str) -> str | None:
+        """
+        Parse a server-sent event line of a LM Studio stream.
+        Returns the text delta, "" for lines without text, None at the end of the stream.
+        """
+        import json
+
+        if not line or not line.startswith("data:"):
+            return ""
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return None
+        try:
+            choices = json.loads(data).get("choices", [])
+        except ValueError as json_err:
+            raise Exception(f"Invalid JSON from LM Studio: {data[:200]}") from json_err
+        if not choices:
+            return ""
+        return choices[0].get("delta", {}).get("content") or ""
+
+    def lm_studio_stream_fn(self, history, verbose=False):
+        """
+        Use local lm-studio server to generate text, yielding chunks as they arrive.
+        """
+        route_start = f"{self.lm_studio_url()}/v1/chat/completions"
+        payload = self.lm_studio_stream_payload(history)
+
+        try:
+            with self.clients.session(self.lm_studio_url()).post(route_start, json=payload, timeout=30, stream=True) as response:
+                if response.status_code != 200:
+                    raise Exception(f"LM Studio returned status {response.status_code}: {response.text}")
+                for line in response.iter_lines(decode_unicode=True):
+                    content = self.parse_lm_studio_event(line)
+                    if content is None:
+                        break
+                    if verbose:
+                        print(content, end="", flush=True)
+                    yield content
+        except requests.exceptions.Timeout:
+            raise Exception("LM Studio request timed out - check if server is responsive")
+        except requests.exceptions.ConnectionError:
+            raise Exception(f"Cannot connect to LM Studio at {route_start} - check if server is running")
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"HTTP request failed: {str(e)}") from e
+        except Exception as e:
+            if "LM Studio" in str(e):
+                raise  # Re-raise our custom exceptions
+            raise Exception(f"Unexpected error: {str(e)}") from e
+
+    async def lm_studio_astream_fn(self, history, verbose=False):
+        """
+        Use local lm-studio server to generate text asynchronously, yielding chunks as they arrive.
+        """
+        route_start = f"{self.lm_studio_url()}/v1/chat/completions"
+        payload = self.lm_studio_stream_payload(history)
+        client = self.clients.async_http(self.lm_studio_url())
+
+        try:
+            async with client.stream("POST", route_start, json=payload, timeout=30) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    raise Exception(f"LM Studio returned status {response.status_code}: {response.text}")
+                async for line in response.aiter_lines():
+                    content = self.parse_lm_studio_event(line)
+                    if content is None:
+                        break
+                    if verbose:
+                        print(content, end="", flush=True)
+                    yield content
+        except httpx.TimeoutException:
+            raise Exception("LM Studio request timed out - check if server is responsive")
+        except httpx.ConnectError:
+            raise Exception(f"Cannot connect to LM Studio at {route_start} - check if server is running")
+        except httpx.HTTPError as e:
+            raise Exception(f"HTTP request failed: {str(e)}") from e
+        except Exception as e:
+            if "LM Studio" in str(e):
+                raise  # Re-raise our custom exceptions
+            raise Exception(f"Unexpected error: {str(e)}") from e
+
     def openrouter_fn(self, history, verbose=False):
         """
         Use OpenRouter API to generate text.
         """
-        client = OpenAI(api_key=self.api_key, base_url="https://openrouter.ai/api/v1")
+        client = self.openrouter_client()
         if self.is_local:
             # This case should ideally not be reached if unsafe_providers is set correctly
             # and is_local is False in config for openrouter
@@ -489,6 +1474,37 @@ class Provider:
         except Exception as e:
             raise Exception(f"OpenRouter API error: {str(e)}") from e
 
+    def openrouter_client(self) -> OpenAI:
+        """
+        Get the OpenAI compatible client for OpenRouter.
+        """
+        return self.clients.openai(self.api_key, self.api_base_urls["openrouter"])
+
+    def openrouter_stream_fn(self, history, verbose=False):
+        """
+        Use OpenRouter API to generate text, yielding chunks as they arrive.
+        """
+        if self.is_local:
+            raise Exception("OpenRouter is not available for local use. Change config.ini")
+        client = self.openrouter_client()
+        try:
+            yield from self.stream_chat_completion(client, self.model, history, verbose)
+        except Exception as e:
+            raise Exception(f"OpenRouter API error: {str(e)}") from e
+
+    async def openrouter_astream_fn(self, history, verbose=False):
+        """
+        Use OpenRouter API to generate text asynchronously, yielding chunks as they arrive.
+        """
+        if self.is_local:
+            raise Exception("OpenRouter is not available for local use. Change config.ini")
+        client = self.clients.async_openai(self.api_key, self.api_base_urls["openrouter"])
+        try:
+            async for chunk in self.astream_chat_completion(client, self.model, history, verbose):
+                yield chunk
+        except Exception as e:
+            raise Exception(f"OpenRouter API error: {str(e)}") from e
+
     def dsk_deepseek(self, history, verbose=False):
         """
         Use: xtekky/deepseek4free
@@ -527,12 +1543,22 @@ class Provider:
 
     def test_fn(self, history, verbose=True):
         """
-        This function is used to conduct tests.
+        This function is used to conduct tests, it replays the answers of the fake LLM.
         """
-        thought = """
-\n\n```json\n{\n  \"plan\": [\n    {\n      \"agent\": \"Web\",\n      \"id\": \"1\",\n      \"need\": null,\n      \"task\": \"Conduct a comprehensive web search to identify at least five AI startups located in Osaka. Use reliable sources and websites such as Crunchbase, TechCrunch, or local Japanese business directories. Capture the company names, their websites, areas of expertise, and any other relevant details.\"\n    },\n    {\n      \"agent\": \"Web\",\n      \"id\": \"2\",\n      \"need\": null,\n      \"task\": \"Perform a similar search to find at least five AI startups in Tokyo. Again, use trusted sources like Crunchbase, TechCrunch, or Japanese business news websites. Gather the same details as for Osaka: company names, websites, areas of focus, and additional information.\"\n    },\n    {\n      \"agent\": \"File\",\n      \"id\": \"3\",\n      \"need\": [\"1\", \"2\"],\n      \"task\": \"Create a new text file named research_japan.txt in the user's home directory. Organize the data collected from both searches into this file, ensuring it is well-structured and formatted for readability. Include headers for Osaka and Tokyo sections, followed by the details of each startup found.\"\n    }\n  ]\n}\n```
+        return self.fake_llm.respond(history, current_agent_name.get())
+
+    def test_stream_fn(self, history, verbose=True):
         """
-        return thought
+        This function is used to conduct tests, it yields the answer of the fake LLM token by token.
+        """
+        yield from self.fake_llm.stream(history, current_agent_name.get())
+
+    async def test_astream_fn(self, history, verbose=True):
+        """
+        This function is used to conduct tests, it yields the answer of the fake LLM token by token asynchronously.
+        """
+        async for token in self.fake_llm.astream(history, current_agent_name.get()):
+            yield token
 
 
 if __name__ == "__main__":
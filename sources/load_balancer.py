@@ -0,0 +1,72 @@
+import threading
+from typing import Callable
+
+from sources.logger import Logger
+
+class LoadBalancer:
+    """
+    LoadBalancer spreads the requests of a provider over several endpoints of the same model.
+    Endpoints refused by is_allowed (open circuit) are ejected, endpoints reported offline are only used when no other endpoint is left.
+    Strategies:
+        least_outstanding: the endpoint with the fewest requests in flight.
+        round_robin: each endpoint in turn.
+    """
+    strategies = ["least_outstanding", "round_robin"]
+
+    def __init__(self, endpoints: list, strategy: str = "least_outstanding"):
+        """
+        Args:
+            endpoints (list): Addresses of the endpoints.
+            strategy (str): least_outstanding or round_robin.
+        """
+        if not endpoints:
+            raise ValueError("At least one endpoint is required.")
+        if strategy not in self.strategies:
+            raise ValueError(f"Unknown load balancing strategy: {strategy}. Available: {', '.join(self.strategies)}")
+        self.logger = Logger("provider.log")
+        self.endpoints = list(endpoints)
+        self.strategy = strategy
+        self.outstanding = {endpoint: 0 for endpoint in self.endpoints}
+        self.requests = {endpoint: 0 for endpoint in self.endpoints}
+        self.next_index = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, is_allowed: Callable[[str], bool] | None = None,
+                      is_online: Callable[[str], bool] | None = None,
+                      exclude: list = ()) -> str | None:
+        """
+        Pick an endpoint for a request and count it as outstanding until release is called.
+        Returns None if no endpoint can take the request.
+        """
+        with self.lock:
+            candidates = [e for e in self.endpoints if e not in exclude and (is_allowed is None or is_allowed(e))]
+            online = [e for e in candidates if is_online is None or is_online(e)]
+            candidates = online or candidates
+            if not candidates:
+                return None
+            if self.strategy == "round_robin":
+                endpoint = self.next_round_robin(candidates)
+            else:
+                endpoint = min(candidates, key=lambda e: (self.outstanding[e], self.requests[e]))
+            self.outstanding[endpoint] += 1
+            self.requests[endpoint] += 1
+            return endpoint
+
+    def next_round_robin(self, candidates: list) -> str:
+        for offset in range(len(self.endpoints)):
+            index = (self.next_index + offset) % len(self.endpoints)
+            if self.endpoints[index] in candidates:
+                self.next_index = index + 1
+                return self.endpoints[index]
+        return candidates[0]
+
+    def release(self, endpoint: str) -> None:
+        """
+        Mark a request to an endpoint as finished.
+        """
+        with self.lock:
+            self.outstanding[endpoint] -= 1
+
+    def get_status(self) -> list:
+        with self.lock:
+            return [{"address": e, "outstanding": self.outstanding[e], "requests": self.requests[e]} for e in self.endpoints]
@@ -3,18 +3,87 @@ import datetime
 import uuid
 import os
 import sys
+import re
 import json
-from typing import List, Tuple, Type, Dict
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Tuple, Type, Dict, Callable
+import numpy as np
 import torch
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 import configparser
 
 from sources.utility import timer_decorator, pretty_print, animate_thinking
 from sources.logger import Logger
+from sources.token_counter import get_token_counter, ContextBudget
+from sources.model_registry import get_model_registry
 
 config = configparser.ConfigParser()
 config.read('config.ini')
 
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode()).hexdigest()
+
+class SummaryCache():
+    """
+    Summaries indexed by the hash of the summarized text, shared by the memories of all agents.
+    """
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict() # hash -> summary, least recently used first
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key: str, summary: str) -> None:
+        with self.lock:
+            self.entries[key] = summary
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+summary_cache = SummaryCache()
+
+def extractive_summary(text: str, max_length: int) -> str:
+    """
+    Summarize a text by keeping its most central sentences, in their original order, within max_length characters.
+    Each sentence is a tf-idf vector, scored by its cosine similarity to the mean of all sentences.
+    """
+    sentences = [sentence.strip() for sentence in re.split(r'(?<=[.!?])\s+|\n+', text) if sentence.strip()]
+    words = [re.findall(r'\w+', sentence.lower()) for sentence in sentences]
+    if len(sentences) < 2 or not any(words):
+        return text[:max_length]
+    vocab, ids = np.unique([word for sentence in words for word in sentence], return_inverse=True)
+    rows = np.repeat(np.arange(len(sentences)), [len(sentence) for sentence in words])
+    counts = np.zeros((len(sentences), len(vocab)))
+    np.add.at(counts, (rows, ids), 1)
+    tf = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    idf = np.log(len(sentences) / (1 + (counts > 0).sum(axis=0))) + 1
+    vectors = tf * idf
+    centroid = vectors.mean(axis=0)
+    scores = vectors @ centroid / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(centroid) + 1e-9)
+    order = np.argsort(-scores, kind='stable')
+    lengths = np.array([len(sentence) + 1 for sentence in sentences])
+    keep = order[np.cumsum(lengths[order]) <= max_length]
+    if len(keep) == 0:
+        return sentences[order[0]][:max_length]
+    return " ".join(sentences[i] for i in np.sort(keep))
+
+# one summarization at a time for the whole process, the summarization model would compete for the same cores
+compression_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-compression")
+SUMMARY_MODEL = "pszemraj/led-base-book-summary"
+
+def load_summary_model() -> tuple:
+    animate_thinking("Loading memory compression model...", color="status")
+    return AutoTokenizer.from_pretrained(SUMMARY_MODEL), AutoModelForSeq2SeqLM.from_pretrained(SUMMARY_MODEL)
+
 class Memory():
     """
     Memory is a class for managing the conversation memory
@@ -23,25 +92,45 @@ class Memory():
     def __init__(self, system_prompt: str,
                  recover_last_session: bool = False,
                  memory_compression: bool = True,
-                 model_provider: str = "deepseek-r1:14b"):
+                 model_provider: str = "deepseek-r1:14b",
+                 context_length: int | Callable[[], int | None] | None = None):
+        """
+        Args:
+            system_prompt (str): The system prompt of the agent.
+            recover_last_session (bool): Load the memory of the last session.
+            memory_compression (bool): Summarize long messages.
+            model_provider (str): Name of the model used by the agent.
+            context_length (int | Callable): Context length of the model, or a function returning it (e.g. Provider.get_context_length).
+        """
         self.memory = [{'role': 'system', 'content': system_prompt}]
+        self.compressed_count = 0 # messages at the start of the memory already processed by compress
+        # the memory list is replaced, never modified in place, so a get() during a compression reads a consistent list
+        self.version = 0
+        self.lock = threading.RLock()
+        self.compression_future = None
+        self.compression_requested = False
         
         self.logger = Logger("memory.log")
         self.session_time = datetime.datetime.now()
         self.session_id = str(uuid.uuid4())
         self.conversation_folder = f"conversations/"
         self.session_recovered = False
-        if recover_last_session:
-            self.load_memory()
-            self.session_recovered = True
-        # memory compression system
-        self.model = None
+        # memory compression system, the summarization model is loaded on first use and shared by the memories of all agents
+        self.model = None # set with the tokenizer to use another summarization model than the shared one
         self.tokenizer = None
+        self.summary_mode = config.get("MAIN", "summary_mode", fallback="abstractive")
+        self.summary_beams = config.getint("MAIN", "summary_beams", fallback=4)
+        self.summary_max_input = config.getint("MAIN", "summary_max_input", fallback=4096)
+        self.summary_batch_size = config.getint("MAIN", "summary_batch_size", fallback=8)
         self.device = self.get_cuda_device()
         self.memory_compression = memory_compression
         self.model_provider = model_provider
-        if self.memory_compression:
-            self.download_model()
+        self.context_length = context_length
+        self.estimated_ctx = self.get_ideal_ctx(model_provider) if model_provider else None
+        self.token_counter = get_token_counter(model_provider, config.get("MAIN", "tokenizer", fallback=None))
+        if recover_last_session:
+            self.load_memory()
+            self.session_recovered = True
 
     def get_ideal_ctx(self, model_name: str) -> int | None:
         """
@@ -65,13 +154,44 @@ class Memory():
         context_size = 2 ** round(math.log2(context_size))
         self.logger.info(f"Estimated context size for {model_name}: {context_size} tokens.")
         return context_size
+
+    def get_context_length(self) -> int | None:
+        """
+        Get the context size of the model, as given by the backend metadata.
+        Fall back to the estimate from the model name if the backend doesn't report it.
+        """
+        context_length = self.context_length() if callable(self.context_length) else self.context_length
+        return context_length if context_length is not None else self.estimated_ctx
+
+    def get_budget(self) -> ContextBudget | None:
+        """
+        Token budget of the prompt, 1024 tokens (a quarter of smaller contexts) are left for the answer.
+        """
+        context_length = self.get_context_length()
+        if context_length is None:
+            return None
+        return ContextBudget(self.token_counter, context_length, reserve=min(1024, context_length // 4))
+
+    def count_tokens(self, messages: list | None = None) -> int:
+        """Number of tokens of the messages, of the whole memory if None."""
+        return self.token_counter.count_messages(self.memory if messages is None else messages)
     
     def download_model(self):
         """Download the model if not already downloaded."""
-        animate_thinking("Loading memory compression model...", color="status")
-        self.tokenizer = AutoTokenizer.from_pretrained("pszemraj/led-base-book-summary")
-        self.model = AutoModelForSeq2SeqLM.from_pretrained("pszemraj/led-base-book-summary")
+        self.get_summary_model()
         self.logger.info("Memory compression system initialized.")
+
+    def get_summary_model(self) -> tuple:
+        """
+        Tokenizer and model of the summarization, from the model registry unless set on this memory.
+        """
+        if self.tokenizer is not None and self.model is not None:
+            return self.tokenizer, self.model
+        return get_model_registry().get(SUMMARY_MODEL, load_summary_model)
+
+    def can_summarize(self) -> bool:
+        """Summarize only with compression enabled, the summarization model is then loaded on first use (not needed for the extractive summary)."""
+        return self.memory_compression
     
     def get_filename(self) -> str:
         """Get the filename for the save file."""
@@ -145,37 +265,53 @@ class Memory():
             pretty_print("Last session memory not found.", color="warning")
             return
         path = os.path.join(save_path, filename)
-        self.memory = self.load_json_file(path) 
-        if self.memory[-1]['role'] == 'user':
-            self.memory.pop()
-        self.compress()
+        memory = self.load_json_file(path) 
+        if memory and memory[-1]['role'] == 'user':
+            memory = memory[:-1]
+        with self.lock:
+            self.set_memory(memory)
+            self.compressed_count = 0
+        self.compress_in_background()
         pretty_print("Session recovered successfully", color="success")
     
+    def set_memory(self, memory: list) -> None:
+        """Replace the memory list and bump its version. Called with the lock held."""
+        self.memory = memory
+        self.version += 1
+
     def reset(self, memory: list = []) -> None:
         self.logger.info("Memory reset performed.")
-        self.memory = memory
+        with self.lock:
+            self.set_memory(memory)
+            self.compressed_count = 0
     
     def push(self, role: str, content: str) -> int:
-        """Push a message to the memory."""
-        ideal_ctx = self.get_ideal_ctx(self.model_provider)
-        if ideal_ctx is not None:
-            if self.memory_compression and len(content) > ideal_ctx * 1.5:
-                self.logger.info(f"Compressing memory: Content {len(content)} > {ideal_ctx} model context.")
-                self.compress()
-        curr_idx = len(self.memory)
-        if self.memory[curr_idx-1]['content'] == content:
-            pretty_print("Warning: same message have been pushed twice to memory", color="error")
+        """
+        Push a message to the memory.
+        When the memory is over the context budget it is compressed in the background, the message is added right away.
+        """
+        budget = self.get_budget()
+        if budget is not None and self.memory_compression and self.token_counter.count(content) > budget.room_for(self.memory):
+            self.logger.info(f"Compressing memory: {self.count_tokens()} tokens in memory, no room for {self.token_counter.count(content)} more in {budget.budget}.")
+            self.compress_in_background()
         time_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         if config["MAIN"]["provider_name"] == "openrouter":
-            self.memory.append({'role': role, 'content': content})
+            message = {'role': role, 'content': content}
         else:
-            self.memory.append({'role': role, 'content': content, 'time': time_str, 'model_used': self.model_provider})
+            message = {'role': role, 'content': content, 'time': time_str, 'model_used': self.model_provider}
+        with self.lock:
+            curr_idx = len(self.memory)
+            if self.memory[curr_idx-1]['content'] == content:
+                pretty_print("Warning: same message have been pushed twice to memory", color="error")
+            self.set_memory(self.memory + [message])
         return curr_idx-1
     
     def clear(self) -> None:
         """Clear all memory except system prompt"""
         self.logger.info("Memory clear performed.")
-        self.memory = self.memory[:1]
+        with self.lock:
+            self.set_memory(self.memory[:1])
+            self.compressed_count = min(self.compressed_count, 1)
     
     def clear_section(self, start: int, end: int) -> None:
         """
@@ -185,12 +321,26 @@ class Memory():
             end (int): Ending bound of the section to clear.
         """
         self.logger.info(f"Clearing memory section {start} to {end}.")
-        start = max(0, start) + 1
-        end = min(end, len(self.memory)-1) + 2
-        self.memory = self.memory[:start] + self.memory[end:]
+        with self.lock:
+            start = max(0, start) + 1
+            end = min(end, len(self.memory)-1) + 2
+            self.set_memory(self.memory[:start] + self.memory[end:])
+            self.compressed_count = min(self.compressed_count, start)
     
     def get(self) -> list:
-        return self.memory
+        """
+        Get the messages to send to the LLM.
+        Only the role and content are kept: the time and model of each message stay in the saved memory,
+        so the prompt prefix is the same from one turn to the next and the backend can reuse its KV cache.
+        The oldest messages are left out when the conversation doesn't fit in the context of the model.
+        """
+        messages = [{'role': message['role'], 'content': message['content']} for message in self.memory]
+        budget = self.get_budget()
+        if budget is None or budget.fits(messages):
+            return messages
+        fitted = budget.fit(messages)
+        self.logger.warning(f"Memory over the context budget of {budget.budget} tokens, sending {len(fitted)}/{len(messages)} messages.")
+        return fitted
 
     def get_cuda_device(self) -> str:
         if torch.backends.mps.is_available():
@@ -209,64 +359,186 @@ class Memory():
         Returns:
             str: The summarized text
         """
-        if self.tokenizer is None or self.model is None:
+        return self.summarize_many([text], min_length)[0]
+
+    def summarize_many(self, texts: List[str], min_length: int = 64) -> List[str]:
+        """
+        Summarize several texts, padded together in batches of summary_batch_size for a single generate call each.
+        Decoding is set by the summary_mode, summary_beams (1 for greedy) and summary_max_input (tokens read from each text) options.
+        Args:
+            texts (List[str]): The texts to summarize
+            min_length (int, optional): The minimum length of the summaries. Defaults to 64.
+        Returns:
+            List[str]: The summarized texts, short texts are returned unchanged
+        """
+        if not self.can_summarize():
             self.logger.warning("No tokenizer or model to perform summarization.")
-            return text
-        if len(text) < min_length*1.5:
-            return text
-        max_length = len(text) // 2 if len(text) > min_length*2 else min_length*2
-        input_text = "summarize: " + text
-        inputs = self.tokenizer(input_text, return_tensors="pt", max_length=512, truncation=True)
-        summary_ids = self.model.generate(
-            inputs['input_ids'],
-            max_length=max_length,
-            min_length=min_length,
-            length_penalty=1.0,
-            num_beams=4,
-            early_stopping=True
-        )
-        summary = self.tokenizer.decode(summary_ids[0], skip_special_tokens=True)
-        summary.replace('summary:', '')
-        self.logger.info(f"Memory summarized from len {len(text)} to {len(summary)}.")
-        self.logger.info(f"Summarized text:\n{summary}")
-        return summary
+            return list(texts)
+        summaries = list(texts)
+        todo = [i for i, text in enumerate(texts) if len(text) >= min_length*1.5]
+        for start in range(0, len(todo), self.summary_batch_size):
+            batch = todo[start:start + self.summary_batch_size]
+            if self.summary_mode == "extractive":
+                results = [extractive_summary(texts[i], max(len(texts[i]) // 2, min_length)) for i in batch]
+            else:
+                results = self.generate_summaries([texts[i] for i in batch], min_length)
+            for i, summary in zip(batch, results):
+                summaries[i] = summary
+                self.logger.info(f"Memory summarized from len {len(texts[i])} to {len(summary)}.")
+        return summaries
+
+    def generate_summaries(self, texts: List[str], min_length: int) -> List[str]:
+        """
+        Summarize a batch of texts with one generate call of the summarization model.
+        """
+        tokenizer, model = self.get_summary_model()
+        max_length = max(len(text) // 2 if len(text) > min_length*2 else min_length*2 for text in texts)
+        inputs = tokenizer(["summarize: " + text for text in texts], return_tensors="pt", padding=True,
+                                max_length=self.summary_max_input, truncation=True)
+        global_attention_mask = torch.zeros_like(inputs['input_ids'])
+        global_attention_mask[:, 0] = 1 # LED attends globally from the first token
+        with torch.inference_mode():
+            summary_ids = model.generate(
+                inputs['input_ids'],
+                attention_mask=inputs['attention_mask'],
+                global_attention_mask=global_attention_mask,
+                max_length=max_length,
+                min_length=min_length,
+                length_penalty=1.0,
+                num_beams=self.summary_beams,
+                early_stopping=self.summary_beams > 1
+            )
+        summaries = tokenizer.batch_decode(summary_ids, skip_special_tokens=True)
+        return [summary.replace('summary:', '').strip() for summary in summaries]
     
     #@timer_decorator
     def compress(self) -> str:
         """
         Compress (summarize) the memory using the model.
+        Only the messages added since the last call are processed, and a message already compressed
+        (its hash matches its content) is skipped, so compressing a long session again costs O(new messages).
+        """
+        if not self.can_summarize():
+            self.logger.warning("No tokenizer or model to perform memory compression.")
+            return
+        pending = self.take_pending()
+        self.swap_compressed(pending, self.compress_messages(pending))
+
+    def take_pending(self) -> list:
+        """
+        Messages added since the last compression, they are then counted as processed.
         """
-        if self.tokenizer is None or self.model is None:
+        with self.lock:
+            pending = [message for message in self.memory[self.compressed_count:]
+                       if message['role'] != 'system' and not self.is_compressed(message)]
+            self.compressed_count = len(self.memory)
+        return pending
+
+    def swap_compressed(self, originals: list, compressed: list) -> None:
+        """
+        Replace the messages by their compressed version in a new memory list.
+        Messages removed from the memory during the compression are ignored.
+        """
+        replacements = {id(original): message for original, message in zip(originals, compressed)}
+        with self.lock:
+            memory = [replacements.get(id(message), message) for message in self.memory]
+            replaced = sum(1 for message in self.memory if id(message) in replacements)
+            if replaced:
+                self.set_memory(memory)
+        self.logger.info(f"Compressed {replaced} messages, memory version {self.version}.")
+
+    def compress_in_background(self) -> None:
+        """
+        Compress the messages of the memory on the compression thread, so the turn of the agent doesn't wait for the summarization.
+        A request made while a compression runs starts another one when it finishes.
+        """
+        if not self.can_summarize():
             self.logger.warning("No tokenizer or model to perform memory compression.")
             return
-        for i in range(len(self.memory)):
-            if self.memory[i]['role'] == 'system':
-                continue
-            if len(self.memory[i]['content']) > 1024:
-                self.memory[i]['content'] = self.summarize(self.memory[i]['content'])
+        with self.lock:
+            if self.compression_future is not None and not self.compression_future.done():
+                self.compression_requested = True
+                return
+            self.compression_requested = False
+            self.compression_future = compression_executor.submit(self.run_compression, self.take_pending())
+
+    def run_compression(self, pending: list) -> None:
+        try:
+            self.swap_compressed(pending, self.compress_messages(pending))
+        except Exception as e:
+            self.logger.error(f"Memory compression failed: {e}")
+        with self.lock:
+            if not self.compression_requested:
+                return
+            self.compression_requested = False
+            self.compression_future = compression_executor.submit(self.run_compression, self.take_pending())
+
+    def wait_for_compression(self, timeout: float | None = None) -> None:
+        """Wait until the background compressions are done."""
+        while True:
+            with self.lock:
+                future = self.compression_future
+            if future is None:
+                return
+            future.result(timeout=timeout)
+            with self.lock:
+                if self.compression_future is future:
+                    return
+
+    def is_compressed(self, message: dict) -> bool:
+        return message.get('compressed', False) and message.get('hash') == content_hash(message['content'])
+
+    def compress_messages(self, messages: list) -> list:
+        """
+        Summarize the long messages in one batch, using the summary cache for texts already summarized.
+        The messages are marked compressed with the hash of their new content.
+        """
+        contents = [message['content'] for message in messages]
+        keys = [content_hash(content) if len(content) > 1024 else None for content in contents]
+        for i, key in enumerate(keys):
+            if key is not None and (summary := summary_cache.get(key)) is not None:
+                contents[i], keys[i] = summary, None
+        todo = [i for i, key in enumerate(keys) if key is not None]
+        for i, summary in zip(todo, self.summarize_many([contents[i] for i in todo])):
+            summary_cache.put(keys[i], summary)
+            contents[i] = summary
+        return [{**message, 'content': content, 'compressed': True, 'hash': content_hash(content)}
+                for message, content in zip(messages, contents)]
     
     def trim_text_to_max_ctx(self, text: str) -> str:
         """
         Truncate a text to fit within the maximum context size of the model.
         """
-        ideal_ctx = self.get_ideal_ctx(self.model_provider)
-        return text[:ideal_ctx] if ideal_ctx is not None else text
+        max_tokens = self.get_text_budget()
+        return self.token_counter.truncate(text, max_tokens) if max_tokens is not None else text
+
+    def get_text_budget(self) -> int | None:
+        """
+        Tokens a new message can take after the memory, at least a quarter of the prompt budget (older messages are then left out by get).
+        """
+        budget = self.get_budget()
+        if budget is None:
+            return None
+        return max(budget.room_for(self.memory), budget.budget // 4)
     
     #@timer_decorator
     def compress_text_to_max_ctx(self, text) -> str:
         """
         Compress a text to fit within the maximum context size of the model.
         """
-        if self.tokenizer is None or self.model is None:
+        if not self.can_summarize():
             self.logger.warning("No tokenizer or model to perform memory compression.")
             return text
-        ideal_ctx = self.get_ideal_ctx(self.model_provider)
-        if ideal_ctx is None:
+        max_tokens = self.get_text_budget()
+        if max_tokens is None:
             self.logger.warning("No ideal context size found.")
             return text
-        while len(text) > ideal_ctx:
-            self.logger.info(f"Compressing text: {len(text)} > {ideal_ctx} model context.")
-            text = self.summarize(text)
+        while self.token_counter.count(text) > max_tokens:
+            self.logger.info(f"Compressing text: {self.token_counter.count(text)} > {max_tokens} tokens.")
+            summary = self.summarize(text)
+            if len(summary) >= len(text):
+                return self.token_counter.truncate(text, max_tokens)
+            text = summary
         return text
 
 if __name__ == "__main__":
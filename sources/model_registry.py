@@ -0,0 +1,158 @@
+import gc
+import time
+import threading
+import configparser
+from collections import OrderedDict
+from typing import Any, Callable
+
+from sources.logger import Logger
+
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+def model_size(model: Any) -> int:
+    """
+    Memory used by the weights of a model in bytes: torch modules, and the models of pipelines, tuples and dicts.
+    """
+    if hasattr(model, "parameters") and hasattr(model, "buffers"):
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+    if isinstance(model, (tuple, list)):
+        return sum(model_size(item) for item in model)
+    if isinstance(model, dict):
+        return sum(model_size(item) for item in model.values())
+    if hasattr(model, "model"):
+        return model_size(model.model)
+    return 0
+
+class ModelEntry():
+    def __init__(self, name: str, model: Any, size: int, load_time: float):
+        self.name = name
+        self.model = model
+        self.size = size
+        self.load_time = load_time
+        self.uses = 0
+
+class ModelRegistry():
+    """
+    Process-wide registry of the ML models run in the process (summarization, routing, translation, speech).
+    A model is loaded on its first use and shared by every agent and memory asking for the same name.
+    Over the memory budget, the least recently used models are unloaded, and loaded again when needed.
+    Users should get the model from the registry each time they use it, and not keep it, so an unloaded model is freed.
+    """
+    def __init__(self, max_bytes: int | None = None):
+        """
+        Args:
+            max_bytes (int): Memory budget of the loaded models, None for no limit.
+        """
+        self.max_bytes = max_bytes
+        self.models = OrderedDict() # name -> ModelEntry, least recently used first
+        self.load_locks = {} # name -> lock, so a model is loaded once when several threads need it
+        self.lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+        self.logger = Logger("model_registry.log")
+
+    def get(self, name: str, loader: Callable[[], Any]) -> Any:
+        """
+        Get a model, loading it with loader if it isn't loaded.
+        Args:
+            name (str): Name of the model, models with the same name are shared.
+            loader (Callable): Function loading the model.
+        Returns:
+            The loaded model
+        """
+        with self.lock:
+            entry = self.models.get(name)
+            if entry is not None:
+                return self.touch(entry)
+            load_lock = self.load_locks.setdefault(name, threading.Lock())
+        with load_lock:
+            with self.lock:
+                entry = self.models.get(name)
+                if entry is not None:
+                    return self.touch(entry)
+            start = time.perf_counter()
+            model = loader()
+            entry = ModelEntry(name, model, model_size(model), time.perf_counter() - start)
+            self.logger.info(f"Loaded {name} in {entry.load_time:.2f}s ({entry.size / 1024**2:.0f} MB)")
+            with self.lock:
+                self.models[name] = entry
+                self.loads += 1
+                evicted = self.make_room(keep=name)
+                model = self.touch(entry)
+            self.free(evicted)
+            return model
+
+    def touch(self, entry: ModelEntry) -> Any:
+        """Mark a model as used. Called with the lock held."""
+        entry.uses += 1
+        self.models.move_to_end(entry.name)
+        return entry.model
+
+    def is_loaded(self, name: str) -> bool:
+        with self.lock:
+            return name in self.models
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(entry.size for entry in self.models.values())
+
+    def make_room(self, keep: str | None = None) -> list:
+        """
+        Remove the least recently used models until the memory budget is met. Called with the lock held.
+        Returns:
+            The removed entries, to free once the lock is released.
+        """
+        evicted = []
+        if self.max_bytes is None:
+            return evicted
+        while self.total_bytes > self.max_bytes:
+            candidates = [name for name in self.models if name != keep]
+            if not candidates:
+                self.logger.warning(f"Model {keep} alone is over the memory budget of {self.max_bytes / 1024**3:.2f} GB")
+                break
+            evicted.append(self.models.pop(candidates[0]))
+            self.evictions += 1
+        return evicted
+
+    def free(self, evicted: list) -> None:
+        """
+        Drop the removed entries and collect their memory, called without the lock so other lookups don't wait for the collection.
+        """
+        if not evicted:
+            return
+        for entry in evicted:
+            self.logger.info(f"Unloaded {entry.name} ({entry.size / 1024**2:.0f} MB)")
+        evicted.clear()
+        gc.collect()
+
+    def unload(self, name: str) -> None:
+        """Unload a model, it is loaded again on its next use."""
+        with self.lock:
+            evicted = [self.models.pop(name)] if name in self.models else []
+        self.free(evicted)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "loaded": [{"name": e.name, "size": e.size, "load_time": e.load_time, "uses": e.uses} for e in self.models.values()],
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+model_registry = None
+model_registry_lock = threading.Lock()
+
+def get_model_registry() -> ModelRegistry:
+    """
+    Get the model registry of the process, its memory budget is the models_max_memory option in GB (0 for no limit).
+    """
+    global model_registry
+    with model_registry_lock:
+        if model_registry is None:
+            max_memory = config.getfloat("MAIN", "models_max_memory", fallback=0)
+            model_registry = ModelRegistry(int(max_memory * 1024**3) if max_memory > 0 else None)
+        return model_registry
@@ -0,0 +1,155 @@
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from contextlib import contextmanager, asynccontextmanager
+
+from sources.logger import Logger
+
+PRIORITY_INTERACTIVE = 0 # a user is waiting for the answer
+PRIORITY_BACKGROUND = 10 # plan updates and other work the user doesn't wait on directly
+
+class Waiter:
+    """
+    A request waiting for a slot, woken up through a threading event or an asyncio future.
+    """
+    def __init__(self, priority: int, future: asyncio.Future | None = None):
+        self.priority = priority
+        self.event = threading.Event() if future is None else None
+        self.future = future
+        self.loop = future.get_loop() if future is not None else None
+        self.granted = False
+        self.cancelled = False
+        self.enqueued_at = time.monotonic()
+
+    def wake(self) -> None:
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(True))
+
+class RequestScheduler:
+    """
+    RequestScheduler limits the number of LLM requests running at the same time on a provider.
+    Requests over the limit wait in a priority queue, lower priority values first, then in arrival order.
+    It works for threads and asyncio tasks alike and keeps queue-depth and wait-time metrics.
+    """
+    def __init__(self, max_concurrent: int = 4):
+        """
+        Args:
+            max_concurrent (int): Maximum number of requests running at the same time.
+        """
+        self.logger = Logger("provider.log")
+        self.max_concurrent = max(1, max_concurrent)
+        self.lock = threading.Lock()
+        self.queue = []
+        self.counter = itertools.count()
+        self.active = 0
+        self.waiting = 0
+        self.max_queue_depth = 0
+        self.wait_stats = {}
+
+    def try_admit(self) -> bool:
+        if self.active < self.max_concurrent and self.waiting == 0:
+            self.active += 1
+            return True
+        return False
+
+    def enqueue(self, waiter: Waiter) -> None:
+        heapq.heappush(self.queue, (waiter.priority, next(self.counter), waiter))
+        self.waiting += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.waiting)
+
+    def record_wait(self, priority: int, wait: float) -> None:
+        stats = self.wait_stats.setdefault(priority, {"requests": 0, "total_wait": 0.0, "max_wait": 0.0})
+        stats["requests"] += 1
+        stats["total_wait"] += wait
+        stats["max_wait"] = max(stats["max_wait"], wait)
+
+    def acquire(self, priority: int = PRIORITY_INTERACTIVE) -> None:
+        """
+        Block the calling thread until a slot is free.
+        """
+        with self.lock:
+            if self.try_admit():
+                self.record_wait(priority, 0.0)
+                return
+            waiter = Waiter(priority)
+            self.enqueue(waiter)
+        waiter.event.wait()
+
+    async def aacquire(self, priority: int = PRIORITY_INTERACTIVE) -> None:
+        """
+        Wait until a slot is free without blocking the event loop.
+        """
+        with self.lock:
+            if self.try_admit():
+                self.record_wait(priority, 0.0)
+                return
+            waiter = Waiter(priority, asyncio.get_running_loop().create_future())
+            self.enqueue(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self.lock:
+                granted = waiter.granted
+                if not granted:
+                    waiter.cancelled = True
+                    self.waiting -= 1
+            if granted:
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """
+        Free a slot, handing it to the first request in the queue if any.
+        """
+        with self.lock:
+            while self.queue:
+                _, _, waiter = heapq.heappop(self.queue)
+                if waiter.cancelled:
+                    continue
+                self.waiting -= 1
+                waiter.granted = True
+                self.record_wait(waiter.priority, time.monotonic() - waiter.enqueued_at)
+                waiter.wake()
+                return
+            self.active -= 1
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_INTERACTIVE):
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, priority: int = PRIORITY_INTERACTIVE):
+        await self.aacquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_metrics(self) -> dict:
+        """
+        Get the queue depth and the wait times per priority.
+        """
+        with self.lock:
+            wait_time = {
+                priority: {
+                    "requests": stats["requests"],
+                    "mean_wait": stats["total_wait"] / stats["requests"],
+                    "max_wait": stats["max_wait"],
+                }
+                for priority, stats in sorted(self.wait_stats.items())
+            }
+            return {
+                "max_concurrent": self.max_concurrent,
+                "active": self.active,
+                "queue_depth": self.waiting,
+                "max_queue_depth": self.max_queue_depth,
+                "wait_time": wait_time,
+            }
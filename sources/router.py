@@ -16,6 +16,7 @@ from sources.language import LanguageUtility
 from sources.utility import pretty_print, animate_thinking, timer_decorator
 from sources.logger import Logger
 from sources.conversation_logger import get_conversation_logger
+from sources.model_registry import get_model_registry
 
 class AgentRouter:
     """
@@ -25,14 +26,38 @@ class AgentRouter:
         self.agents = agents
         self.logger = Logger("router.log")
         self.lang_analysis = LanguageUtility(supported_language=supported_language)
-        self.pipelines = self.load_pipelines()
-        self.talk_classifier = self.load_llm_router()
-        self.complexity_classifier = self.load_llm_router()
-        self.learn_few_shots_tasks()
-        self.learn_few_shots_complexity()
         self.asked_clarify = False
         self.query_count = 0  # Track number of queries in session
     
+    @property
+    def pipelines(self) -> Dict[str, Type[pipeline]]:
+        """
+        Zero-shot pipelines, loaded on first use and shared through the model registry.
+        """
+        return get_model_registry().get("router:pipelines", self.load_pipelines)
+
+    @property
+    def talk_classifier(self) -> AdaptiveClassifier:
+        """
+        Task classifier, a router model of its own since few shot learning adds examples to it.
+        """
+        def load() -> AdaptiveClassifier:
+            classifier = self.load_llm_router()
+            self.learn_few_shots_tasks(classifier)
+            return classifier
+        return get_model_registry().get("router:talk_classifier", load)
+
+    @property
+    def complexity_classifier(self) -> AdaptiveClassifier:
+        """
+        Complexity classifier, a router model of its own since few shot learning adds examples to it.
+        """
+        def load() -> AdaptiveClassifier:
+            classifier = self.load_llm_router()
+            self.learn_few_shots_complexity(classifier)
+            return classifier
+        return get_model_registry().get("router:complexity_classifier", load)
+
     def load_pipelines(self) -> Dict[str, Type[pipeline]]:
         """
         Load the pipelines for the text classification used for routing.
@@ -68,7 +93,7 @@ class AgentRouter:
         else:
             return "cpu"
     
-    def learn_few_shots_complexity(self) -> None:
+    def learn_few_shots_complexity(self, classifier: AdaptiveClassifier) -> None:
         """
         Few shot learning for complexity estimation.
         Use the build in add_examples method of the Adaptive_classifier.
@@ -200,9 +225,9 @@ class AgentRouter:
         random.shuffle(few_shots)
         texts = [text for text, _ in few_shots]
         labels = [label for _, label in few_shots]
-        self.complexity_classifier.add_examples(texts, labels)
+        classifier.add_examples(texts, labels)
 
-    def learn_few_shots_tasks(self) -> None:
+    def learn_few_shots_tasks(self, classifier: AdaptiveClassifier) -> None:
         """
         Few shot learning for tasks classification.
         Use the build in add_examples method of the Adaptive_classifier.
@@ -356,7 +381,7 @@ class AgentRouter:
         random.shuffle(few_shots)
         texts = [text for text, _ in few_shots]
         labels = [label for _, label in few_shots]
-        self.talk_classifier.add_examples(texts, labels)
+        classifier.add_examples(texts, labels)
 
     def llm_router(self, text: str) -> tuple:
         """
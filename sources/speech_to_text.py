@@ -89,17 +89,26 @@ class Transcript:
             print(Fore.RED + "Transcript: Speech to Text is disabled." + Fore.RESET)
             return
         self.last_read = None
+        self.model_id = "distil-whisper/distil-medium.en"
+
+    @property
+    def pipe(self):
+        """
+        Speech recognition pipeline, loaded on the first transcription and shared through the model registry.
+        """
+        from sources.model_registry import get_model_registry # imported here so the module also runs as a script
         device = self.get_device()
+        return get_model_registry().get(f"{self.model_id}:{device}", lambda: self.load_pipeline(device))
+
+    def load_pipeline(self, device: str):
         torch_dtype = torch.float16 if device == "cuda" else torch.float32
-        model_id = "distil-whisper/distil-medium.en"
-        
         model = AutoModelForSpeechSeq2Seq.from_pretrained(
-            model_id, torch_dtype=torch_dtype, use_safetensors=True
+            self.model_id, torch_dtype=torch_dtype, use_safetensors=True
         )
         model.to(device)
-        processor = AutoProcessor.from_pretrained(model_id)
+        processor = AutoProcessor.from_pretrained(self.model_id)
         
-        self.pipe = pipeline(
+        return pipeline(
             "automatic-speech-recognition",
             model=model,
             tokenizer=processor.tokenizer,
@@ -225,6 +234,8 @@ class AudioTranscriber:
 
 
 if __name__ == "__main__":
+    import os, sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     recorder = AudioRecorder(verbose=True)
     transcriber = AudioTranscriber(verbose=True, ai_name="jarvis")
     recorder.start()
@@ -0,0 +1,213 @@
+import time
+import bisect
+import threading
+from collections import deque
+
+from sources.logger import Logger
+
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0]
+THROUGHPUT_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+class Histogram:
+    """
+    Histogram with fixed bucket upper bounds, the last bucket holds everything above the last bound.
+    """
+    def __init__(self, bounds: list):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "Histogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantile(self, q: float) -> float | None:
+        """
+        Estimate a quantile as the upper bound of the bucket it falls in (the max for the last bucket).
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count > 0:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else None,
+            "min": self.min,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": self.max,
+            "buckets": dict(zip([str(b) for b in self.bounds] + ["+Inf"], self.counts)),
+        }
+
+class CallStats:
+    """
+    Aggregated metrics of the calls of one agent with one model.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.busy_time = 0.0
+        self.ttft = Histogram(LATENCY_BUCKETS)
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.tokens_per_sec = Histogram(THROUGHPUT_BUCKETS)
+
+    def add(self, record: dict) -> None:
+        self.calls += 1
+        if not record["success"]:
+            self.errors += 1
+            return
+        self.prompt_tokens += record["prompt_tokens"]
+        self.completion_tokens += record["completion_tokens"]
+        self.busy_time += record["latency"]
+        self.latency.observe(record["latency"])
+        if record["ttft"] is not None:
+            self.ttft.observe(record["ttft"])
+        if record["tokens_per_sec"] is not None:
+            self.tokens_per_sec.observe(record["tokens_per_sec"])
+
+    def merge(self, other: "CallStats") -> None:
+        self.calls += other.calls
+        self.errors += other.errors
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.busy_time += other.busy_time
+        self.ttft.merge(other.ttft)
+        self.latency.merge(other.latency)
+        self.tokens_per_sec.merge(other.tokens_per_sec)
+
+    def summary(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "busy_time": self.busy_time,
+            "ttft": self.ttft.summary(),
+            "latency": self.latency.summary(),
+            "tokens_per_sec": self.tokens_per_sec.summary(),
+        }
+
+class CallTracker:
+    """
+    Measure one provider call. The backend can fill usage with the token counts it reports.
+    """
+    def __init__(self, telemetry: "Telemetry", agent_name: str, provider: str, model: str, history: list):
+        self.telemetry = telemetry
+        self.agent_name = agent_name
+        self.provider = provider
+        self.model = model
+        self.history = history
+        self.usage = {}
+        self.start = time.perf_counter()
+        self.first_chunk_at = None
+
+    def chunk(self) -> None:
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.perf_counter()
+
+    def finish(self, text: str | None, success: bool = True) -> dict:
+        end = time.perf_counter()
+        latency = end - self.start
+        ttft = self.first_chunk_at - self.start if self.first_chunk_at is not None else None
+        estimated = "prompt_tokens" not in self.usage or "completion_tokens" not in self.usage
+        prompt_tokens = self.usage.get("prompt_tokens")
+        if prompt_tokens is None:
+            prompt_tokens = estimate_tokens("".join(str(m.get("content", "")) for m in self.history))
+        completion_tokens = self.usage.get("completion_tokens")
+        if completion_tokens is None:
+            completion_tokens = estimate_tokens(text or "")
+        generation_time = end - self.first_chunk_at if self.first_chunk_at is not None else latency
+        record = {
+            "timestamp": time.time(),
+            "agent": self.agent_name,
+            "provider": self.provider,
+            "model": self.model,
+            "success": success,
+            "ttft": ttft,
+            "latency": latency,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens_per_sec": completion_tokens / generation_time if success and generation_time > 0 and completion_tokens else None,
+            "estimated_tokens": estimated,
+        }
+        self.telemetry.record(record)
+        return record
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (about 4 characters per token) for backends that don't report usage.
+    """
+    return (len(text) + 3) // 4
+
+class Telemetry:
+    """
+    Telemetry collects a metrics record for every provider call and aggregates them per agent and model.
+    Records hold the time to first token, the total latency, the prompt and completion tokens and the tokens per second.
+    """
+    def __init__(self, max_records: int = 1000):
+        """
+        Args:
+            max_records (int): Number of raw records kept for inspection.
+        """
+        self.logger = Logger("telemetry.log")
+        self.records = deque(maxlen=max_records)
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def track(self, agent_name: str, provider: str, model: str, history: list) -> CallTracker:
+        return CallTracker(self, agent_name, provider, model, history)
+
+    def record(self, record: dict) -> None:
+        with self.lock:
+            self.records.append(record)
+            key = (record["agent"], record["model"])
+            if key not in self.stats:
+                self.stats[key] = CallStats()
+            self.stats[key].add(record)
+        self.logger.info(f"{record['agent']} {record['model']} success={record['success']} "
+                         f"ttft={record['ttft']} latency={record['latency']:.3f}s "
+                         f"tokens={record['prompt_tokens']}/{record['completion_tokens']} tok/s={record['tokens_per_sec']}")
+
+    def get_summary(self, group_by: str = "agent") -> dict:
+        """
+        Get the aggregated metrics per agent, per model or per (agent, model).
+        Args:
+            group_by (str): agent, model or agent_model.
+        """
+        if group_by not in ["agent", "model", "agent_model"]:
+            raise ValueError(f"Unknown group: {group_by}")
+        with self.lock:
+            if group_by == "agent_model":
+                return {f"{agent}/{model}": stats.summary() for (agent, model), stats in self.stats.items()}
+            index = 0 if group_by == "agent" else 1
+            groups = {}
+            for key, stats in self.stats.items():
+                groups.setdefault(key[index], CallStats()).merge(stats)
+            return {name: stats.summary() for name, stats in groups.items()}
+
+    def get_records(self, limit: int = 100) -> list:
+        with self.lock:
+            return list(self.records)[-limit:]
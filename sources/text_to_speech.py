@@ -16,8 +16,10 @@ except ImportError:
 
 if __name__ == "__main__":
     from utility import pretty_print, animate_thinking
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 else:
     from sources.utility import pretty_print, animate_thinking
+from sources.model_registry import get_model_registry
 
 class Speech():
     """
@@ -36,15 +38,23 @@ class Speech():
             "ja": ['jf_alpha', 'jf_gongitsune', 'jm_kumo'],
             "fr": ['ff_siwis']
         }
-        self.pipeline = None
+        self.enabled = enable and IMPORT_FOUND
         self.language = language
-        if enable and IMPORT_FOUND:
-            self.pipeline = KPipeline(lang_code=self.lang_map[language])
         self.voice = self.voice_map[language][voice_idx]
         self.speed = 1.2
         self.voice_folder = ".voices"
         self.create_voice_folder(self.voice_folder)
     
+    @property
+    def pipeline(self):
+        """
+        Kokoro pipeline of the language, loaded on the first sentence spoken and shared through the model registry.
+        """
+        if not self.enabled:
+            return None
+        lang_code = self.lang_map[self.language]
+        return get_model_registry().get(f"kokoro:{lang_code}", lambda: KPipeline(lang_code=lang_code))
+
     def create_voice_folder(self, path: str = ".voices") -> None:
         """
         Create a folder to store the voices.
@@ -62,7 +72,7 @@ class Speech():
             sentence (str): The text to convert to speech. Will be pre-processed.
             voice_idx (int, optional): Index of the voice to use from the voice map.
         """
-        if not self.pipeline or not IMPORT_FOUND:
+        if not self.enabled:
             return
         if voice_idx >= len(self.voice_map[self.language]):
             pretty_print("Invalid voice number, using default voice", color="error")
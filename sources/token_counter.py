@@ -0,0 +1,169 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import List
+
+from sources.logger import Logger
+
+class ApproximateTokenizer():
+    """
+    Tokenizer used when the model tokenizer is unknown.
+    Splits text into pieces of at most 4 letters, punctuation marks and whitespace runs, close to the BPE tokenizers of most models on english and code.
+    """
+    pattern = re.compile(r" ?\w{1,4}| ?[^\w\s]|\s+")
+
+    def encode(self, text: str) -> List[str]:
+        return self.pattern.findall(text)
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+class HuggingFaceTokenizer():
+    """
+    Tokenizer of a model on the Hugging Face hub.
+    """
+    def __init__(self, name: str):
+        from transformers import AutoTokenizer
+        self.tokenizer = AutoTokenizer.from_pretrained(name)
+
+    def encode(self, text: str) -> List[int]:
+        return self.tokenizer.encode(text, add_special_tokens=False)
+
+    def decode(self, tokens: List[int]) -> str:
+        return self.tokenizer.decode(tokens)
+
+class TokenCounter():
+    """
+    Count the tokens of texts and messages with the tokenizer of a model.
+    Counts are cached by text, so counting a long history again only tokenizes the new messages.
+    """
+    def __init__(self, tokenizer=None, message_overhead: int = 4, max_cached: int = 4096):
+        """
+        Args:
+            tokenizer: Object with encode(text) -> tokens and decode(tokens) -> text, approximate if None.
+            message_overhead (int): Tokens added by the chat template around each message.
+            max_cached (int): Number of texts whose count is kept.
+        """
+        self.tokenizer = tokenizer or ApproximateTokenizer()
+        self.message_overhead = message_overhead
+        self.max_cached = max_cached
+        self.counts = OrderedDict() # text -> number of tokens, least recently used first
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, text: str) -> int:
+        """Number of tokens of a text."""
+        with self.lock:
+            if text in self.counts:
+                self.counts.move_to_end(text)
+                self.hits += 1
+                return self.counts[text]
+        n_tokens = len(self.tokenizer.encode(text))
+        with self.lock:
+            self.misses += 1
+            self.counts[text] = n_tokens
+            if len(self.counts) > self.max_cached:
+                self.counts.popitem(last=False)
+        return n_tokens
+
+    def count_message(self, message: dict) -> int:
+        return self.count(message['content']) + self.message_overhead
+
+    def count_messages(self, messages: List[dict]) -> int:
+        return sum(self.count_message(message) for message in messages)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Keep the first max_tokens tokens of a text."""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        return self.tokenizer.decode(self.tokenizer.encode(text)[:max_tokens])
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {"cached": len(self.counts), "hits": self.hits, "misses": self.misses}
+
+class ContextBudget():
+    """
+    Fit the messages of a conversation into the context of a model.
+    The system prompt and the last message are always kept, older messages are dropped first.
+    """
+    def __init__(self, counter: TokenCounter, context_length: int, reserve: int = 0):
+        """
+        Args:
+            counter (TokenCounter): Token counter of the model.
+            context_length (int): Context length of the model in tokens.
+            reserve (int): Tokens left free for the answer.
+        """
+        self.counter = counter
+        self.context_length = context_length
+        self.reserve = reserve
+
+    @property
+    def budget(self) -> int:
+        """Tokens available for the prompt."""
+        return self.context_length - self.reserve
+
+    def room_for(self, messages: List[dict]) -> int:
+        """Tokens left for the content of a new message after the given messages."""
+        return self.budget - self.counter.count_messages(messages) - self.counter.message_overhead
+
+    def fits(self, messages: List[dict]) -> bool:
+        return self.counter.count_messages(messages) <= self.budget
+
+    def fit(self, messages: List[dict]) -> List[dict]:
+        """
+        Drop the oldest messages after the system prompt until the conversation fits,
+        the last message is truncated if it doesn't fit with the system prompt alone.
+        """
+        if self.fits(messages) or len(messages) < 2:
+            return messages
+        system = [messages[0]] if messages[0]['role'] == 'system' else []
+        history = messages[len(system):-1]
+        last = messages[-1]
+        room = self.room_for(system)
+        if self.counter.count(last['content']) > room:
+            return system + [{**last, 'content': self.counter.truncate(last['content'], room)}]
+        room -= self.counter.count_message(last) - self.counter.message_overhead
+        kept = []
+        for message in reversed(history):
+            room -= self.counter.count_message(message)
+            if room < 0:
+                break
+            kept.append(message)
+        return system + kept[::-1] + [last]
+
+token_counters = {}
+custom_tokenizers = {}
+token_counters_lock = threading.Lock()
+
+def register_tokenizer(model_name: str, tokenizer) -> None:
+    """
+    Use a tokenizer for a model, for models whose tokenizer isn't on the Hugging Face hub.
+    """
+    with token_counters_lock:
+        custom_tokenizers[model_name] = tokenizer
+        token_counters.pop(model_name, None)
+
+def get_token_counter(model_name: str, tokenizer_name: str | None = None) -> TokenCounter:
+    """
+    Get the token counter of a model, shared by every agent using the model.
+    Args:
+        model_name (str): Name of the model.
+        tokenizer_name (str): Hugging Face repository of the tokenizer of the model, the count is approximate if None.
+    """
+    with token_counters_lock:
+        if model_name in token_counters:
+            return token_counters[model_name]
+        tokenizer = custom_tokenizers.get(model_name)
+        if tokenizer is None and tokenizer_name:
+            logger = Logger("token_counter.log")
+            try:
+                tokenizer = HuggingFaceTokenizer(tokenizer_name)
+                logger.info(f"Loaded tokenizer {tokenizer_name} for {model_name}")
+            except Exception as e:
+                logger.warning(f"Can't load tokenizer {tokenizer_name}, token counts of {model_name} are approximate: {e}")
+        token_counters[model_name] = TokenCounter(tokenizer)
+        return token_counters[model_name]
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Benchmark the overhead of the framework around the LLM (agent, memory, logging, answer parsing).
+Agents answer with a fake LLM of known latency, the time above that latency is the framework overhead.
+"""
+
+import sys
+import os
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from sources.llm_provider import Provider
+from sources.fake_llm import FakeLLM
+from sources.agents.casual_agent import CasualAgent
+
+ANSWER = "Sure! Here is a short answer with a few words so there are some tokens to stream back to the agent."
+
+async def run_turn(agent: CasualAgent, prompt: str) -> float:
+    start = time.perf_counter()
+    await agent.process(prompt, None)
+    return time.perf_counter() - start
+
+async def bench(agents: int, turns: int, ttft: float, tps: float) -> None:
+    fake_llm = FakeLLM(script={"default": [ANSWER]}, ttft=ttft, tokens_per_sec=tps)
+    provider = Provider("test", "fake", fake_llm=fake_llm)
+    prompt_path = os.path.join(os.path.dirname(__file__), '..', 'prompts', 'base', 'casual_agent.txt')
+    pool = [CasualAgent(name=f"agent_{i}", prompt_path=prompt_path, provider=provider) for i in range(agents)]
+    simulated = ttft + (len(FakeLLM.tokenize(ANSWER)) - 1) / tps if tps > 0 else ttft
+
+    latencies = []
+    start = time.perf_counter()
+    for turn in range(turns):
+        latencies += await asyncio.gather(*[run_turn(agent, f"Question {turn}") for agent in pool])
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    mean = sum(latencies) / len(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"agents={agents} turns={turns} simulated LLM time={simulated * 1000:.1f} ms")
+    print(f"mean turn={mean * 1000:.1f} ms  p95={p95 * 1000:.1f} ms  overhead={(mean - simulated) * 1000:.1f} ms")
+    print(f"throughput={len(latencies) / wall:.1f} turns/s")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the framework overhead with a fake LLM')
+    parser.add_argument('-a', '--agents', type=int, default=8, help='Number of concurrent agents')
+    parser.add_argument('-t', '--turns', type=int, default=10, help='Number of turns per agent')
+    parser.add_argument('--ttft', type=float, default=0.05, help='Simulated time to first token in seconds')
+    parser.add_argument('--tps', type=float, default=200, help='Simulated tokens per second')
+    args = parser.parse_args()
+    asyncio.run(bench(args.agents, args.turns, args.ttft, args.tps))
+
+if __name__ == "__main__":
+    main()
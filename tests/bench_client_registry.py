@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-call overhead of providers with fresh clients vs pooled clients.
+A fake LLM server speaking the Ollama and OpenAI wire formats is used so only the client cost is measured.
+"""
+
+import sys
+import os
+import time
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from sources.llm_provider import Provider
+from sources.fake_llm import FakeLLM, FakeLLMServer
+
+def bench(provider: Provider, calls: int, pooled: bool) -> float:
+    """Return the mean latency per call in milliseconds."""
+    history = [{"role": "user", "content": "Hello"}]
+    provider.respond(history, verbose=False) # warm-up
+    start = time.perf_counter()
+    for _ in range(calls):
+        if not pooled:
+            provider.clients.close() # previous behavior: a new client for every call
+        provider.respond(history, verbose=False)
+    return (time.perf_counter() - start) * 1000 / calls
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark provider client pooling')
+    parser.add_argument('-n', '--calls', type=int, default=200, help='Number of calls per provider')
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    server = FakeLLMServer(FakeLLM(script={"default": ["Hello world"]})).start()
+    address = server.address
+    providers = [
+        Provider("ollama", "stub-model", address, is_local=False),
+        Provider("openai", "stub-model", address, is_local=True),
+        Provider("lm-studio", "stub-model", address, is_local=True),
+    ]
+    print(f"{'provider':<12}{'fresh (ms)':>12}{'pooled (ms)':>14}{'speedup':>10}")
+    for provider in providers:
+        fresh = bench(provider, args.calls, pooled=False)
+        pooled = bench(provider, args.calls, pooled=True)
+        print(f"{provider.provider_name:<12}{fresh:>12.3f}{pooled:>14.3f}{fresh / pooled:>9.1f}x")
+        provider.clients.close()
+    server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark the throughput of the memory summarization.
+Compares one text at a time with summarize_many batches, beam search with greedy decoding, and the extractive mode.
+The abstractive runs download the summarization model (pszemraj/led-base-book-summary).
+"""
+
+import sys
+import os
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from sources.memory import Memory
+
+SENTENCES = [
+    "The browser agent opened the documentation page of the library.",
+    "The error comes from a missing include path when compiling the CUDA file.",
+    "Use quotes instead of angle brackets for local headers.",
+    "The planner split the task into a search step and a coding step.",
+    "The code agent ran the script and the tests passed after the fix.",
+    "Check that the file exists in the directory given with the -I flag.",
+    "The search returned three results about the same compilation error.",
+    "The answer should explain the fix in a few sentences with an example.",
+]
+
+def make_texts(count: int, sentences: int) -> list:
+    rng = random.Random(0)
+    return [" ".join(rng.choice(SENTENCES) for _ in range(sentences)) for _ in range(count)]
+
+def run(memory: Memory, texts: list, batched: bool) -> float:
+    start = time.perf_counter()
+    if batched:
+        memory.summarize_many(texts)
+    else:
+        for text in texts:
+            memory.summarize(text)
+    return time.perf_counter() - start
+
+def report(name: str, seconds: float, texts: list) -> None:
+    chars = sum(len(text) for text in texts)
+    print(f"{name:<32} {seconds:8.2f} s  {len(texts) / seconds:8.2f} texts/s  {chars / seconds / 1000:8.1f} kchars/s")
+
+def bench(count: int, sentences: int, abstractive: bool, batch_size: int) -> None:
+    texts = make_texts(count, sentences)
+    memory = Memory("You are a helpful assistant.", memory_compression=True)
+    memory.summary_batch_size = batch_size
+    print(f"{count} texts of {sum(len(t) for t in texts) // count} chars")
+
+    memory.summary_mode = "extractive"
+    report("extractive", run(memory, texts, batched=True), texts)
+    if not abstractive:
+        return
+    memory.summary_mode = "abstractive"
+    memory.download_model()
+    for beams in [4, 1]:
+        memory.summary_beams = beams
+        report(f"one at a time, {beams} beams", run(memory, texts, batched=False), texts)
+        report(f"summarize_many, {beams} beams", run(memory, texts, batched=True), texts)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the memory summarization throughput')
+    parser.add_argument('-n', '--count', type=int, default=16, help='Number of texts to summarize')
+    parser.add_argument('-s', '--sentences', type=int, default=40, help='Number of sentences per text')
+    parser.add_argument('-b', '--batch-size', type=int, default=8, help='Texts per generate call')
+    parser.add_argument('--abstractive', action='store_true', help='Also benchmark the summarization model')
+    args = parser.parse_args()
+    bench(args.count, args.sentences, args.abstractive, args.batch_size)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark the cost of counting the tokens of a long conversation history.
+The memory counts its tokens on every push and get, only the first count of a message should tokenize it.
+"""
+
+import sys
+import os
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from sources.token_counter import TokenCounter, ContextBudget, HuggingFaceTokenizer
+
+WORDS = ["the", "agent", "searches", "web", "for", "python", "code", "def", "return", "memory", "(", ")", ":",
+         "context", "tokens", "answer", "file", "error", "=", "compress", "browser", "page", "result", "\n"]
+
+def make_history(messages: int, words: int) -> list:
+    rng = random.Random(0)
+    history = [{'role': 'system', 'content': "You are a helpful assistant. " * 50}]
+    for i in range(messages):
+        content = " ".join(rng.choice(WORDS) for _ in range(words))
+        history.append({'role': 'user' if i % 2 == 0 else 'assistant', 'content': content})
+    return history
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+def bench(messages: int, words: int, repeat: int, tokenizer_name: str | None) -> None:
+    tokenizer = HuggingFaceTokenizer(tokenizer_name) if tokenizer_name else None
+    history = make_history(messages, words)
+    total_chars = sum(len(m['content']) for m in history)
+
+    cold = timed(lambda: TokenCounter(tokenizer).count_messages(history), repeat)
+    counter = TokenCounter(tokenizer)
+    n_tokens = counter.count_messages(history)
+    warm = timed(lambda: counter.count_messages(history), repeat)
+    chars = timed(lambda: sum(len(m['content']) for m in history), repeat)
+
+    def push_and_count():
+        turn = history + [{'role': 'user', 'content': f"new question {random.random()}"}]
+        counter.count_messages(turn)
+    incremental = timed(push_and_count, repeat)
+
+    budget = ContextBudget(counter, context_length=n_tokens // 2, reserve=1024)
+    fit = timed(lambda: budget.fit(history), repeat)
+
+    print(f"history: {len(history)} messages, {total_chars} chars, {n_tokens} tokens ({tokenizer_name or 'approximate'} tokenizer)")
+    print(f"cold count={cold * 1000:.2f} ms  cached count={warm * 1000:.3f} ms  count after push={incremental * 1000:.3f} ms")
+    print(f"character count={chars * 1000:.3f} ms  fit to half the history={fit * 1000:.3f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark token counting on long histories')
+    parser.add_argument('-m', '--messages', type=int, default=500, help='Number of messages in the history')
+    parser.add_argument('-w', '--words', type=int, default=300, help='Number of words per message')
+    parser.add_argument('-r', '--repeat', type=int, default=20, help='Number of runs averaged')
+    parser.add_argument('--tokenizer', type=str, default=None, help='Hugging Face tokenizer, approximate tokenizer if not set')
+    args = parser.parse_args()
+    bench(args.messages, args.words, args.repeat, args.tokenizer)
+
+if __name__ == "__main__":
+    main()
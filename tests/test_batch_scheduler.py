@@ -0,0 +1,69 @@
+import unittest
+import os, sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from llm_server.sources.batching import BatchScheduler
+from llm_server.sources.generator import GenerationState
+
+EOS = 0
+
+class CountdownBackend:
+    """
+    Backend answering each prompt [n] with the tokens n-1, n-2, ... 1 then EOS, and recording the batch sizes.
+    """
+    def __init__(self):
+        self.batch_sizes = []
+        self.released = []
+
+    def prefill(self, seq_id, tokens):
+        return tokens[-1] - 1
+
+    def decode(self, entries):
+        self.batch_sizes.append(len(entries))
+        return [token - 1 for _, token, _ in entries]
+
+    def is_eos(self, token):
+        return token == EOS
+
+    def detokenize(self, token):
+        return f"{token} ".encode()
+
+    def release(self, seq_id):
+        self.released.append(seq_id)
+
+class TestBatchScheduler(unittest.TestCase):
+    def run_sequences(self, scheduler, prompts, max_new_tokens=100):
+        states = [GenerationState(str(i)) for i in range(len(prompts))]
+        with scheduler.cond: # hold the scheduler until every sequence is queued
+            sequences = [scheduler.submit([n], state, max_new_tokens) for n, state in zip(prompts, states)]
+        for sequence in sequences:
+            self.assertTrue(sequence.done.wait(timeout=5))
+        return [state.current_buffer for state in states]
+
+    def test_sequences_are_interleaved(self):
+        """Test that active sequences are decoded together and each streams its own text"""
+        backend = CountdownBackend()
+        scheduler = BatchScheduler(backend, max_sequences=4)
+        texts = self.run_sequences(scheduler, [5, 3, 4])
+        self.assertEqual(texts, ["4 3 2 1 ", "2 1 ", "3 2 1 "])
+        self.assertGreater(max(backend.batch_sizes), 1)
+        self.assertEqual(len(backend.released), 3)
+        self.assertEqual(scheduler.get_stats()["active"], 0)
+
+    def test_admission_control(self):
+        """Test that no more than max_sequences are decoded at once and waiting sequences get the freed slots"""
+        backend = CountdownBackend()
+        scheduler = BatchScheduler(backend, max_sequences=2)
+        texts = self.run_sequences(scheduler, [3, 3, 3, 3, 3])
+        self.assertEqual(texts, ["2 1 "] * 5)
+        self.assertLessEqual(max(backend.batch_sizes), 2)
+        self.assertEqual(len(backend.released), 5)
+
+    def test_max_new_tokens(self):
+        """Test that a sequence stops at its token limit"""
+        scheduler = BatchScheduler(CountdownBackend(), max_sequences=2)
+        self.assertEqual(self.run_sequences(scheduler, [10], max_new_tokens=3), ["9 8 7 "])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import os, sys
+import asyncio
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from sources.health_monitor import HealthMonitor
+from sources.fake_llm import FakeLLM, FakeLLMServer
+from sources.llm_provider import Provider
+from sources.memory import Memory
+
+class TestContextLength(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeLLMServer(FakeLLM(script={"default": ["ok"]}, context_length=32768)).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_ollama_model_info(self):
+        """Test that the context length is read from the Ollama model info once and sent as num_ctx"""
+        provider = Provider("ollama", "fake", self.server.address, health_monitor=HealthMonitor(background=False))
+        self.assertEqual(provider.get_context_length(), 32768)
+        self.server.stop()
+        self.assertEqual(provider.get_context_length(), 32768)
+        self.assertEqual(provider.ollama_options(), {"num_ctx": 32768})
+
+    def test_modelfile_num_ctx(self):
+        """Test that a num_ctx parameter of the modelfile takes precedence over the model info"""
+        info = {"parameters": "stop \"<|end|>\"\nnum_ctx 8192", "model_info": {"llama.context_length": 131072}}
+        self.assertEqual(Provider.parse_ollama_context_length(info), 8192)
+        self.assertEqual(Provider.parse_ollama_context_length({"model_info": {"llama.context_length": 131072}}), 131072)
+
+    def test_openai_model_list(self):
+        """Test that the context length is read from an OpenAI compatible model list and capped"""
+        provider = Provider("openai", "fake", self.server.address, is_local=True,
+                            health_monitor=HealthMonitor(background=False), max_context_length=16384)
+        provider.api_key = "local"
+        self.assertEqual(provider.get_context_length(), 16384)
+
+    def test_unknown_context_length(self):
+        """Test that an unreachable backend gives None, and is asked again only after the retry delay"""
+        self.server.stop()
+        provider = Provider("ollama", "fake", self.server.address, health_monitor=HealthMonitor(background=False))
+        self.assertIsNone(provider.get_context_length())
+        self.assertNotIn("fake", provider.context_lengths)
+        calls = []
+        provider.fetch_context_length = lambda: calls.append(1) or 4096
+        self.assertIsNone(provider.get_context_length())
+        self.assertEqual(calls, [])
+        provider.context_length_retry = 0
+        self.assertEqual(provider.get_context_length(), 4096)
+        self.assertEqual(calls, [1])
+
+    def test_lookup_off_event_loop(self):
+        """Test that the context length isn't fetched on the event loop, but in a background thread"""
+        provider = Provider("ollama", "fake", self.server.address, health_monitor=HealthMonitor(background=False))
+        release = threading.Event()
+        fetch = provider.fetch_context_length
+        provider.fetch_context_length = lambda: release.wait(5) and fetch()
+        async def lookup():
+            return provider.get_context_length()
+        self.assertIsNone(asyncio.run(lookup()))
+        release.set()
+        provider.context_length_thread.join(5)
+        self.assertEqual(provider.get_context_length(), 32768)
+
+    def test_memory_budget(self):
+        """Test that the memory uses the context length of the provider and falls back to the name estimate"""
+        provider = Provider("test", "fake", fake_llm=FakeLLM(context_length=2048))
+        memory = Memory("system", memory_compression=False, model_provider="deepseek-r1:14b",
+                        context_length=provider.get_context_length)
+        self.assertEqual(memory.get_context_length(), 2048)
+        self.assertEqual(memory.get_budget().budget, 2048 - 512)
+        trimmed = memory.trim_text_to_max_ctx("word " * 4096)
+        self.assertEqual(memory.token_counter.count(trimmed), memory.get_text_budget())
+        memory = Memory("system", memory_compression=False, model_provider="deepseek-r1:14b",
+                        context_length=lambda: None)
+        self.assertEqual(memory.get_context_length(), memory.get_ideal_ctx("deepseek-r1:14b"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import os, sys
+import time
+import socket
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from sources.fake_llm import FakeLLM, FakeLLMError, FakeLLMServer
+from sources.llm_provider import Provider
+
+class TestFakeLLM(unittest.TestCase):
+    def setUp(self):
+        self.script = {"coder": ["first", "second"], "default": ["Hello world, how are you?"]}
+        self.history = [{"role": "user", "content": "Hello"}]
+
+    def test_script_per_agent(self):
+        """Test that answers are replayed in order per agent and loop at the end"""
+        fake = FakeLLM(script=self.script)
+        answers = [fake.respond(self.history, "coder") for _ in range(3)]
+        self.assertEqual(answers, ["first", "second", "first"])
+        self.assertEqual(fake.respond(self.history, "Jarvis"), "Hello world, how are you?")
+
+    def test_tokens_join_to_answer(self):
+        """Test that the streamed tokens add up to the answer"""
+        fake = FakeLLM(script=self.script)
+        tokens = list(fake.stream(self.history))
+        self.assertEqual(tokens, ["Hello", " world,", " how", " are", " you?"])
+
+    def test_simulated_latency(self):
+        """Test that the time to first token and the token rate are simulated"""
+        fake = FakeLLM(script=self.script, ttft=0.1, tokens_per_sec=50)
+        start = time.perf_counter()
+        tokens = fake.stream(self.history)
+        next(tokens)
+        ttft = time.perf_counter() - start
+        list(tokens)
+        total = time.perf_counter() - start
+        self.assertGreaterEqual(ttft, 0.1)
+        self.assertGreaterEqual(total, 0.1 + 4 / 50)
+
+    def test_error_injection_deterministic(self):
+        """Test that the same seed injects errors on the same calls"""
+        def failures(fake):
+            result = []
+            for _ in range(20):
+                try:
+                    fake.respond(self.history)
+                    result.append(False)
+                except FakeLLMError:
+                    result.append(True)
+            return result
+        first = failures(FakeLLM(script=self.script, error_rate=0.3, seed=1))
+        self.assertIn(True, first)
+        self.assertEqual(first, failures(FakeLLM(script=self.script, error_rate=0.3, seed=1)))
+
+    def test_async_stream(self):
+        """Test that the async stream gives the same tokens"""
+        async def collect():
+            return [token async for token in FakeLLM(script=self.script).astream(self.history)]
+        self.assertEqual("".join(asyncio.run(collect())), "Hello world, how are you?")
+
+class TestFakeLLMServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault("OPENAI_API_KEY", "fake")
+        cls.server = FakeLLMServer(FakeLLM(script={"default": ["Hello world"]})).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_ollama_wire_format(self):
+        """Test that the ollama provider can talk to the fake server"""
+        provider = Provider("ollama", "fake", self.server.address)
+        self.assertEqual(provider.respond([{"role": "user", "content": "Hi"}], verbose=False), "Hello world")
+
+    def test_openai_wire_format(self):
+        """Test that the openai provider can stream from the fake server"""
+        provider = Provider("openai", "fake", self.server.address, is_local=True)
+        chunks = list(provider.stream_respond([{"role": "user", "content": "Hi"}], verbose=False))
+        self.assertEqual("".join(chunks), "Hello world")
+
+    def test_script_per_agent_over_http(self):
+        """Test that the provider sends the agent name, so the server replays the answers of each agent"""
+        server = FakeLLMServer(FakeLLM(script={"coder": ["code answer"], "default": ["default answer"]})).start()
+        try:
+            history = [{"role": "user", "content": "Hi"}]
+            provider = Provider("ollama", "fake", server.address)
+            self.assertEqual(provider.respond(history, verbose=False, agent_name="coder"), "code answer")
+            self.assertEqual(provider.respond(history, verbose=False, agent_name="casual"), "default answer")
+            provider = Provider("openai", "fake", server.address, is_local=True)
+            self.assertEqual("".join(provider.stream_respond(history, verbose=False, agent_name="coder")), "code answer")
+        finally:
+            server.stop()
+
+    def test_client_disconnect(self):
+        """Test that a client leaving in the middle of a stream does not break the server"""
+        server = FakeLLMServer(FakeLLM(script={"default": ["one two three four five six"]}, tokens_per_sec=20)).start()
+        try:
+            host, port = server.address.split(":")
+            body = b'{"model": "fake", "messages": [{"role": "user", "content": "Hi"}], "stream": true}'
+            with socket.create_connection((host, int(port))) as sock:
+                sock.sendall(b"POST /api/chat HTTP/1.1\r\nHost: fake\r\nContent-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+                sock.recv(64)
+            provider = Provider("ollama", "fake", server.address)
+            self.assertEqual(provider.respond([{"role": "user", "content": "Hi"}], verbose=False), "one two three four five six")
+        finally:
+            server.stop()
+
+if __name__ == '__main__':
+    unittest.main()
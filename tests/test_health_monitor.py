@@ -0,0 +1,62 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os, sys
+import socket
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from sources.health_monitor import HealthMonitor
+from sources.llm_provider import Provider
+
+class TestHealthMonitor(unittest.TestCase):
+    def setUp(self):
+        self.monitor = HealthMonitor(interval=60, failure_threshold=2, reset_timeout=0.2, background=False)
+        self.address = "http://127.0.0.1:9"
+
+    def test_probe_listening_port(self):
+        """Test that a probe succeeds on a listening port and fails on a closed one"""
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        port = server.getsockname()[1]
+        self.assertTrue(self.monitor.probe(f"127.0.0.1:{port}"))
+        server.close()
+        self.assertFalse(self.monitor.probe(f"http://127.0.0.1:{port}"))
+
+    def test_is_online_reads_cache(self):
+        """Test that the request path never probes the endpoint itself"""
+        with patch.object(self.monitor, 'probe', return_value=False) as probe:
+            self.assertTrue(self.monitor.is_online(self.address))
+            probe.assert_not_called()
+
+    def test_circuit_opens_after_failures(self):
+        """Test that the circuit opens after the failure threshold"""
+        self.monitor.report_failure(self.address)
+        self.assertTrue(self.monitor.allow_request(self.address))
+        self.monitor.report_failure(self.address)
+        self.assertFalse(self.monitor.allow_request(self.address))
+
+    def test_circuit_half_open_then_closed(self):
+        """Test that a trial request is allowed after the reset timeout and a success closes the circuit"""
+        for _ in range(2):
+            self.monitor.report_failure(self.address)
+        self.assertFalse(self.monitor.allow_request(self.address))
+        time.sleep(0.25)
+        self.assertTrue(self.monitor.allow_request(self.address))
+        self.monitor.report_success(self.address)
+        self.assertEqual(self.monitor.get_status()[0]["circuit"], "closed")
+
+    def test_provider_fails_fast_when_circuit_open(self):
+        """Test that the provider doesn't call an endpoint with an open circuit"""
+        provider = Provider("server", "test-model", self.address, is_local=True, health_monitor=self.monitor)
+        for _ in range(2):
+            self.monitor.report_failure(self.address)
+        server_stream_fn = MagicMock()
+        with patch.dict(provider.available_stream_providers, {"server": server_stream_fn}):
+            answer = "".join(provider.stream_respond([], verbose=False))
+        server_stream_fn.assert_not_called()
+        self.assertIn("seem offline", answer)
+
+if __name__ == '__main__':
+    unittest.main()
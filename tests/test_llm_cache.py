@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import MagicMock
+import os, sys
+import tempfile
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from sources.llm_cache import LLMCache
+from sources.llm_provider import Provider
+
+class TestLLMCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "cache.sqlite")
+        self.history = [{"role": "user", "content": "Hello"}]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_ignores_message_metadata(self):
+        """Test that the key only depends on what is sent to the model"""
+        key = LLMCache.make_key("ollama", "model", self.history)
+        with_time = [{"role": "user", "content": "Hello", "time": "2025-01-01 10:00:00", "model_used": "model"}]
+        self.assertEqual(key, LLMCache.make_key("ollama", "model", with_time))
+        self.assertNotEqual(key, LLMCache.make_key("ollama", "other", self.history))
+        self.assertNotEqual(key, LLMCache.make_key("ollama", "model", self.history, {"temperature": 0.7}))
+
+    def test_memory_lru_eviction(self):
+        """Test that the least recently used answer leaves the memory tier first"""
+        cache = LLMCache(max_entries=2, db_path=None)
+        cache.put("a", "1")
+        cache.put("b", "2")
+        cache.get("a")
+        cache.put("c", "3")
+        self.assertEqual(cache.get("a"), "1")
+        self.assertIsNone(cache.get("b"))
+        stats = cache.get_stats()
+        self.assertEqual(stats["memory_hits"], 2)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_disk_tier_persists(self):
+        """Test that answers are found on disk by a new cache instance"""
+        LLMCache(db_path=self.db_path).put("a", "answer")
+        cache = LLMCache(db_path=self.db_path)
+        self.assertEqual(cache.get("a"), "answer")
+        self.assertEqual(cache.get("a"), "answer")
+        stats = cache.get_stats()
+        self.assertEqual(stats["disk_hits"], 1)
+        self.assertEqual(stats["memory_hits"], 1)
+
+    def test_disk_size_eviction(self):
+        """Test that the disk tier is kept under its size budget"""
+        cache = LLMCache(max_entries=1, db_path=self.db_path, max_disk_bytes=25)
+        for key in ["a", "b", "c"]:
+            cache.put(key, "x" * 10)
+        stats = cache.get_stats()
+        self.assertEqual(stats["disk_entries"], 2)
+        self.assertEqual(stats["evictions"], 1)
+        self.assertIsNone(cache.get("a"))
+
+    def test_provider_served_from_cache(self):
+        """Test that an identical request doesn't call the provider again"""
+        provider = Provider("test", "test-model", response_cache=LLMCache(db_path=None))
+        first = "".join(provider.stream_respond(self.history, verbose=False))
+        provider.available_stream_providers["test"] = MagicMock()
+        provider.available_providers["test"] = MagicMock()
+        self.assertEqual("".join(provider.stream_respond(self.history, verbose=False)), first)
+        self.assertEqual(provider.respond(self.history, verbose=False), first)
+        self.assertEqual(asyncio.run(provider.arespond(self.history, verbose=False)), first)
+        provider.available_stream_providers["test"].assert_not_called()
+        provider.available_providers["test"].assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+import os, sys
+import json
+import time
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from llm_server.sources.cache import Cache
+from llm_server.sources.generator import GeneratorLLM
+
+class CountingLLM(GeneratorLLM):
+    """
+    Generator counting its generations, answering from the cache like the real handlers.
+    """
+    calls = 0
+
+    def generate(self, history, state):
+        if self.use_cached_answer(history, state):
+            return
+        self.calls += 1
+        state.append(f"answer {self.calls}")
+        self.cache_answer(history, state)
+
+class TestServerCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.history = [{"role": "system", "content": "sys"}, {"role": "user", "content": "Hello"}]
+        self.caches = []
+
+    def tearDown(self):
+        for cache in self.caches:
+            cache.flush()
+        self.tmp.cleanup()
+
+    def make_cache(self, **kwargs) -> Cache:
+        cache = Cache(cache_dir=self.tmp.name, **kwargs)
+        self.caches.append(cache)
+        return cache
+
+    def test_get_put(self):
+        """Test that answers are keyed by the model and the full history"""
+        cache = self.make_cache()
+        cache.put("model-a", self.history, "Hi")
+        self.assertEqual(cache.get("model-a", self.history), "Hi")
+        self.assertEqual(cache.get("model-a", [dict(m, time="10:00") for m in self.history]), "Hi")
+        self.assertIsNone(cache.get("model-b", self.history))
+        self.assertIsNone(cache.get("model-a", self.history[1:]))
+        self.assertEqual(cache.get_stats()["hits"], 2)
+
+    def test_lru_eviction(self):
+        """Test that the least recently used answers are evicted"""
+        cache = self.make_cache(max_entries=2)
+        histories = [[{"role": "user", "content": str(i)}] for i in range(3)]
+        cache.put("m", histories[0], "0")
+        cache.put("m", histories[1], "1")
+        cache.get("m", histories[0])
+        cache.put("m", histories[2], "2")
+        self.assertIsNone(cache.get("m", histories[1]))
+        self.assertEqual(cache.get("m", histories[0]), "0")
+
+    def test_persistence(self):
+        """Test that the cache is reloaded from disk and an old format file is ignored"""
+        cache = self.make_cache()
+        cache.put("m", self.history, "Hi")
+        cache.flush()
+        self.assertEqual(self.make_cache().get("m", self.history), "Hi")
+        self.assertEqual([f for f in os.listdir(self.tmp.name) if f.endswith(".tmp")], [])
+        with open(os.path.join(self.tmp.name, "old.json"), "w") as f:
+            json.dump([{"user": "Hello", "assistant": "Hi"}], f)
+        self.assertEqual(self.make_cache(cache_file="old.json").get_stats()["entries"], 0)
+
+    def test_debounced_save(self):
+        """Test that a burst of puts is saved once, after the save delay"""
+        cache = self.make_cache(save_delay=0.2)
+        saves = []
+        save = cache.save
+        cache.save = lambda entries=None: saves.append(len(entries)) or save(entries)
+        for i in range(10):
+            cache.put("m", [{"role": "user", "content": str(i)}], str(i))
+        self.assertEqual(saves, [])
+        time.sleep(0.5)
+        self.assertEqual(saves, [10])
+        self.assertEqual(self.make_cache().get_stats()["entries"], 10)
+
+    def test_cache_opt_in(self):
+        """Test that the prompt cache is off unless asked for, so a retried conversation is generated again"""
+        self.assertIsNone(GeneratorLLM().cache)
+        generator = CountingLLM()
+        generator.set_model("m")
+        for _ in range(2):
+            request_id = generator.start(self.history)
+            while generator.get_status(request_id)["is_generating"]:
+                generator.wait_for_update(10**9, timeout=5, request_id=request_id)
+        self.assertEqual(generator.calls, 2)
+
+    def test_generation_skipped(self):
+        """Test that a repeated conversation is answered without generating"""
+        generator = CountingLLM(use_cache=False)
+        generator.cache = self.make_cache()
+        generator.set_model("m")
+        for _ in range(2):
+            request_id = generator.start(self.history)
+            status = generator.wait_for_update(0, timeout=5, request_id=request_id)
+            while not status["is_complete"]:
+                status = generator.wait_for_update(status["offset"], timeout=5, request_id=request_id)
+            self.assertEqual(generator.get_status(request_id)["sentence"], "answer 1")
+        self.assertEqual(generator.calls, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import os, sys
+import time
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from llm_server.sources.generator import GeneratorLLM
+from llm_server.sources.metrics import Histogram
+
+class WordsLLM(GeneratorLLM):
+    """
+    Generator streaming the words of the last message, once released.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(use_cache=False, **kwargs)
+        self.release = threading.Event()
+
+    def load_model(self, model):
+        time.sleep(0.01)
+        return model, 1024
+
+    def generate(self, history, state):
+        with self.models.use(state.model):
+            self.release.wait(5)
+            for word in history[-1]["content"].split(" "):
+                state.append(word + " ")
+
+def wait_done(generator: GeneratorLLM, request_id: str) -> None:
+    while generator.get_status(request_id)["is_generating"]:
+        generator.wait_for_update(10**9, timeout=5, request_id=request_id)
+
+class TestServerMetrics(unittest.TestCase):
+    def test_histogram_render(self):
+        """Test that histogram buckets are cumulative and labeled"""
+        histogram = Histogram("latency_seconds", "Latency.", [0.1, 1.0])
+        for value in [0.05, 0.5, 0.5, 3.0]:
+            histogram.observe(value, model='a"b')
+        lines = histogram.render()
+        self.assertIn('latency_seconds_bucket{model="a\\"b",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{model="a\\"b",le="1"} 3', lines)
+        self.assertIn('latency_seconds_bucket{model="a\\"b",le="+Inf"} 4', lines)
+        self.assertIn('latency_seconds_count{model="a\\"b"} 4', lines)
+        self.assertIn('latency_seconds_sum{model="a\\"b"} 4.05', lines)
+
+    def test_generation_metrics(self):
+        """Test that queue depth, active generations, tokens and load times are exported"""
+        generator = WordsLLM(max_workers=1, max_queue=0)
+        generator.set_model("words")
+        first = generator.start([{"role": "user", "content": "one two three"}])
+        time.sleep(0.05)
+        self.assertIsNone(generator.start([{"role": "user", "content": "refused"}]))
+        text = generator.render_metrics()
+        self.assertIn("llm_server_active_generations 1", text)
+        self.assertIn("llm_server_queue_depth 0", text)
+        self.assertIn('llm_server_requests_total{status="rejected"} 1', text)
+
+        generator.release.set()
+        wait_done(generator, first)
+        text = generator.render_metrics()
+        self.assertIn("llm_server_active_generations 0", text)
+        self.assertIn('llm_server_requests_total{status="accepted"} 1', text)
+        self.assertIn('llm_server_generated_tokens_total{model="words"} 3', text)
+        self.assertIn('llm_server_generations_total{model="words",outcome="completed"} 1', text)
+        self.assertIn('llm_server_time_to_first_token_seconds_count{model="words"} 1', text)
+        self.assertIn('llm_server_model_load_seconds_count{model="words"} 1', text)
+        self.assertIn("llm_server_models_resident 1", text)
+        self.assertIn("llm_server_model_memory_bytes 1024", text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import os, sys
+import time
+import asyncio
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from llm_server.sources.generator import GeneratorLLM
+
+class EchoLLM(GeneratorLLM):
+    """
+    Generator answering with the last message, word by word.
+    """
+    def __init__(self, delay: float = 0.0, **kwargs):
+        super().__init__(use_cache=False, **kwargs)
+        self.delay = delay
+        self.release = threading.Event()
+        self.release.set()
+
+    def generate(self, history, state):
+        self.release.wait()
+        for word in history[-1]["content"].split(" "):
+            time.sleep(self.delay)
+            state.append(word + " ")
+
+def read_all(generator: GeneratorLLM, request_id: str) -> str:
+    text, offset = "", 0
+    while True:
+        status = generator.wait_for_update(offset, timeout=5, request_id=request_id)
+        text += status["sentence"]
+        offset = status["offset"]
+        if status["is_complete"]:
+            return text
+
+class TestGenerationSessions(unittest.TestCase):
+    def test_concurrent_sessions(self):
+        """Test that concurrent generations keep their own buffer"""
+        generator = EchoLLM(delay=0.01, max_workers=2)
+        generator.set_model("echo")
+        self.assertIsNone(generator.get_session())
+        first = generator.start([{"role": "user", "content": "one two three"}])
+        second = generator.start([{"role": "user", "content": "four five"}])
+        self.assertNotEqual(first, second)
+        self.assertEqual(read_all(generator, first), "one two three ")
+        self.assertEqual(read_all(generator, second), "four five ")
+        self.assertIsNone(generator.get_status("unknown"))
+        self.assertIs(generator.get_session(), generator.get_session(second))
+
+    def test_model_not_set(self):
+        """Test that a generation without a model set is refused"""
+        generator = EchoLLM()
+        with self.assertRaises(ValueError):
+            generator.start([{"role": "user", "content": "one"}])
+        self.assertIsNone(generator.get_session())
+
+    def test_queue_limit(self):
+        """Test that requests over the worker pool and the queue are refused, and accepted again later"""
+        generator = EchoLLM(max_workers=1, max_queue=1)
+        generator.set_model("echo")
+        generator.release.clear()
+        history = [{"role": "user", "content": "hi"}]
+        self.assertIsNotNone(generator.start(history, "a"))
+        self.assertIsNone(generator.start(history, "a"))
+        self.assertIsNotNone(generator.start(history, "b"))
+        self.assertIsNone(generator.start(history, "c"))
+        generator.release.set()
+        self.assertEqual(read_all(generator, "b"), "hi ")
+        self.assertIsNotNone(generator.start(history, "c"))
+
+    def test_async_waiters(self):
+        """Test that many async clients wait for new text without a thread each and only get the delta"""
+        generator = EchoLLM(delay=0.02)
+        generator.set_model("echo")
+        generator.release.clear()
+        request_id = generator.start([{"role": "user", "content": "one two"}])
+        async def scenario():
+            waiters = [generator.async_wait_for_update(0, timeout=5, request_id=request_id) for _ in range(50)]
+            generator.release.set()
+            return await asyncio.gather(*waiters)
+        statuses = asyncio.run(scenario())
+        self.assertTrue(all(status["sentence"].startswith("one") for status in statuses))
+        self.assertLess(threading.active_count(), 50)
+        read_all(generator, request_id)
+        self.assertEqual(generator.get_status(request_id, offset=4)["sentence"], "two ")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import os, sys
+import time
+import socket
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from sources.load_balancer import LoadBalancer
+from sources.health_monitor import HealthMonitor
+from sources.fake_llm import FakeLLM, FakeLLMServer
+from sources.llm_provider import Provider
+
+def closed_port_address() -> str:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"127.0.0.1:{port}"
+
+class TestLoadBalancer(unittest.TestCase):
+    def test_least_outstanding(self):
+        """Test that requests go to the endpoint with the fewest requests in flight"""
+        balancer = LoadBalancer(["a", "b"])
+        self.assertEqual(balancer.acquire(), "a")
+        self.assertEqual(balancer.acquire(), "b")
+        balancer.release("b")
+        self.assertEqual(balancer.acquire(), "b")
+
+    def test_round_robin(self):
+        """Test that round robin uses each endpoint in turn and skips ejected ones"""
+        balancer = LoadBalancer(["a", "b", "c"], strategy="round_robin")
+        picks = [balancer.acquire() for _ in range(4)]
+        self.assertEqual(picks, ["a", "b", "c", "a"])
+        self.assertEqual(balancer.acquire(is_allowed=lambda e: e != "b"), "c")
+
+    def test_ejection(self):
+        """Test that ejected endpoints are skipped and offline ones used only as a last resort"""
+        balancer = LoadBalancer(["a", "b"])
+        self.assertIsNone(balancer.acquire(is_allowed=lambda e: False))
+        self.assertEqual(balancer.acquire(is_online=lambda e: e == "b"), "b")
+        self.assertEqual(balancer.acquire(is_online=lambda e: False, exclude=["b"]), "a")
+
+class TestProviderEndpoints(unittest.TestCase):
+    def setUp(self):
+        self.servers = []
+        self.history = [{"role": "user", "content": "Hi"}]
+
+    def tearDown(self):
+        for server in self.servers:
+            server.stop()
+
+    def start_server(self, answer: str, ttft: float = 0.0) -> str:
+        server = FakeLLMServer(FakeLLM(script={"default": [answer]}, ttft=ttft)).start()
+        self.servers.append(server)
+        return server.address
+
+    def make_provider(self, addresses: list, **kwargs) -> Provider:
+        return Provider("ollama", "fake", ", ".join(addresses),
+                        health_monitor=HealthMonitor(background=False), **kwargs)
+
+    def test_parse_endpoints(self):
+        """Test that a comma separated address gives a list of endpoints"""
+        self.assertEqual(Provider.parse_endpoints("a:1, b:2"), ["a:1", "b:2"])
+        self.assertEqual(Provider.parse_endpoints(["a:1"]), ["a:1"])
+
+    def test_failover(self):
+        """Test that a request failing on an endpoint is answered by another one"""
+        provider = self.make_provider([closed_port_address(), self.start_server("from b")])
+        self.assertEqual(provider.respond(self.history, verbose=False), "from b")
+        self.assertEqual("".join(provider.stream_respond(self.history, verbose=False)), "from b")
+        self.assertEqual(asyncio.run(provider.arespond(self.history, verbose=False)), "from b")
+
+    def test_spread_over_endpoints(self):
+        """Test that concurrent requests are spread over the endpoints"""
+        provider = self.make_provider([self.start_server("a", ttft=0.05), self.start_server("b", ttft=0.05)])
+        async def scenario():
+            return await asyncio.gather(*[provider.arespond(self.history, verbose=False) for _ in range(4)])
+        self.assertEqual(sorted(asyncio.run(scenario())), ["a", "a", "b", "b"])
+
+    def test_hedged_request(self):
+        """Test that a slow endpoint is hedged by a faster one"""
+        provider = self.make_provider([self.start_server("slow", ttft=1.0), self.start_server("fast")], hedge_after=0.05)
+        start = time.perf_counter()
+        answer = asyncio.run(provider.arespond(self.history, verbose=False))
+        self.assertEqual(answer, "fast")
+        self.assertLess(time.perf_counter() - start, 0.8)
+        self.assertTrue(all(e["outstanding"] == 0 for e in provider.balancer.get_status()))
+
+    def test_hedged_request_endpoint(self):
+        """Test that the endpoint of the call is the one that answered, not the backup tried last"""
+        first = self.start_server("first", ttft=0.2)
+        provider = self.make_provider([first, self.start_server("backup", ttft=1.0)], hedge_after=0.05)
+        async def scenario():
+            async for chunk in provider.astream_respond(self.history, verbose=False):
+                return chunk, provider.current_endpoint.get()
+        self.assertEqual(asyncio.run(scenario()), ("first", first))
+
+    def test_hedged_request_cancelled(self):
+        """Test that the endpoints are released when a hedged stream is cancelled before its first chunk"""
+        provider = self.make_provider([self.start_server("a", ttft=1.0), self.start_server("b", ttft=1.0)], hedge_after=0.05)
+        async def scenario():
+            task = asyncio.create_task(provider.arespond(self.history, verbose=False))
+            await asyncio.sleep(0.2)
+            self.assertEqual(sum(e["outstanding"] for e in provider.balancer.get_status()), 2)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        asyncio.run(scenario())
+        self.assertTrue(all(e["outstanding"] == 0 for e in provider.balancer.get_status()))
+
+if __name__ == '__main__':
+    unittest.main()
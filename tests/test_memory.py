@@ -3,6 +3,7 @@ import os
 import sys
 import json
 import datetime
+import threading
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
 from sources.memory import Memory
@@ -73,6 +74,99 @@ class TestMemory(unittest.TestCase):
         memory_content = self.memory.get()
         self.assertEqual(len(memory_content), 2)
 
+    def test_get_stable_prefix(self):
+        self.memory.push("user", "Hello")
+        prompt = self.memory.get()
+        self.memory.push("assistant", "Hi")
+        self.assertEqual(self.memory.get()[:2], prompt)
+        self.assertEqual(set(prompt[1].keys()), {"role", "content"})
+
+    def test_get_fits_context(self):
+        memory = Memory(self.system_prompt, memory_compression=False, context_length=256)
+        for i in range(20):
+            memory.push("user" if i % 2 == 0 else "assistant", f"Message {i} " + "word " * 20)
+        prompt = memory.get()
+        budget = memory.get_budget()
+        self.assertLessEqual(memory.count_tokens(prompt), budget.budget)
+        self.assertEqual(prompt[0]['content'], self.system_prompt)
+        self.assertEqual(prompt[-1]['content'], memory.memory[-1]['content'])
+        self.assertLess(len(prompt), len(memory.memory))
+
+    def test_compress_incremental(self):
+        """Test that compress only summarizes new messages and reuses cached summaries"""
+        summarized = []
+        def summarize_many(texts, min_length=64):
+            summarized.extend(texts)
+            return [text[:100] for text in texts]
+        self.memory.tokenizer = self.memory.model = object()
+        self.memory.summarize_many = summarize_many
+        self.memory.memory_compression = True
+        long_a, long_b = "a" * 2000 + " incremental", "b" * 2000 + " incremental"
+        self.memory.push("user", long_a)
+        self.memory.push("assistant", "short answer")
+        self.memory.compress()
+        self.assertEqual(summarized, [long_a])
+        self.assertTrue(self.memory.memory[1]['compressed'])
+        self.memory.compress()
+        self.memory.push("user", long_b)
+        self.memory.compress()
+        self.assertEqual(summarized, [long_a, long_b])
+        self.memory.compressed_count = 0 # a recovered session is checked again but not summarized again
+        self.memory.compress()
+        self.assertEqual(len(summarized), 2)
+        self.memory.push("user", long_a)
+        self.memory.compress()
+        self.assertEqual(len(summarized), 2)
+        self.assertEqual(self.memory.memory[-1]['content'], long_a[:100])
+        self.assertEqual(set(self.memory.get()[1].keys()), {"role", "content"})
+
+    def test_background_compression(self):
+        """Test that push doesn't wait for the summarization and the compressed memory is swapped in"""
+        memory = Memory(self.system_prompt, memory_compression=False, context_length=1024)
+        release = threading.Event()
+        def summarize_many(texts, min_length=64):
+            release.wait(5)
+            return ["summary of " + text[:10] for text in texts]
+        memory.tokenizer = memory.model = object()
+        memory.summarize_many = summarize_many
+        long_text = "background " * 400
+        memory.push("user", long_text)
+        memory.memory_compression = True
+        version = memory.version
+        memory.push("assistant", "next " * 400) # over budget, compression starts in the background
+        self.assertEqual(memory.memory[1]['content'], long_text)
+        self.assertEqual(len(memory.memory), 3)
+        release.set()
+        memory.wait_for_compression(timeout=5)
+        self.assertEqual(memory.memory[1]['content'], "summary of " + long_text[:10])
+        self.assertEqual(memory.memory[2]['content'], "next " * 400)
+        self.assertGreater(memory.version, version + 1)
+
+    def test_summarize_many_batches(self):
+        batches = []
+        def generate_summaries(texts, min_length):
+            batches.append(len(texts))
+            return [text[:10] for text in texts]
+        self.memory.tokenizer = self.memory.model = object()
+        self.memory.generate_summaries = generate_summaries
+        self.memory.memory_compression = True
+        self.memory.summary_batch_size = 2
+        texts = ["long text " * 50 for _ in range(5)] + ["short"]
+        summaries = self.memory.summarize_many(texts)
+        self.assertEqual(batches, [2, 2, 1])
+        self.assertEqual(summaries[:5], ["long text "] * 5)
+        self.assertEqual(summaries[5], "short")
+
+    def test_extractive_summary(self):
+        self.memory.summary_mode = "extractive"
+        self.memory.memory_compression = True
+        text = ("The agent searched the web for the python error. " * 3 + "Bananas are yellow. " +
+                "The python error came from a missing import in the agent code. " * 3)
+        summary = self.memory.summarize(text)
+        self.assertLessEqual(len(summary), len(text) // 2)
+        self.assertIn("python error", summary)
+        self.assertNotIn("Bananas", summary)
+
     def test_reset(self):
         self.memory.push("user", "Hello")
         new_memory = [{"role": "system", "content": "New prompt"}]
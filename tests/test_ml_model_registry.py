@@ -0,0 +1,82 @@
+import unittest
+import os, sys
+import time
+import threading
+from unittest import mock
+
+import torch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from sources.model_registry import ModelRegistry, model_size, get_model_registry
+
+def linear(size: int) -> torch.nn.Module:
+    return torch.nn.Linear(size, 1, bias=False) # size float32 weights
+
+class TestMLModelRegistry(unittest.TestCase):
+    def test_model_size(self):
+        self.assertEqual(model_size(linear(256)), 1024)
+        self.assertEqual(model_size((object(), linear(256))), 1024)
+        self.assertEqual(model_size({"a": linear(256), "b": linear(512)}), 3072)
+
+    def test_loaded_once_and_shared(self):
+        """Test that concurrent users of a model share a single load"""
+        registry = ModelRegistry()
+        loads = []
+        def load():
+            loads.append(1)
+            time.sleep(0.05)
+            return linear(8)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry.get("model", load))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(loads), 1)
+        self.assertTrue(all(model is results[0] for model in results))
+        self.assertEqual(registry.get_stats()["loaded"][0]["uses"], 4)
+
+    def test_unload_over_budget(self):
+        """Test that the least recently used models are unloaded and loaded again on their next use"""
+        registry = ModelRegistry(max_bytes=2048)
+        loads = []
+        def loader(name):
+            def load():
+                loads.append(name)
+                return linear(256)
+            return load
+        registry.get("a", loader("a"))
+        registry.get("b", loader("b"))
+        registry.get("a", loader("a"))
+        registry.get("c", loader("c")) # b is the least recently used
+        self.assertFalse(registry.is_loaded("b"))
+        self.assertTrue(registry.is_loaded("a") and registry.is_loaded("c"))
+        self.assertLessEqual(registry.total_bytes, 2048)
+        registry.get("b", loader("b"))
+        self.assertEqual(loads, ["a", "b", "c", "b"])
+        self.assertEqual(registry.get_stats()["evictions"], 2)
+
+    def test_collect_without_lock(self):
+        """Test that the memory of an unloaded model is collected after the registry lock is released"""
+        registry = ModelRegistry(max_bytes=1024)
+        locked = []
+        with mock.patch("sources.model_registry.gc.collect", lambda: locked.append(registry.lock.locked())):
+            registry.get("a", lambda: linear(256))
+            registry.get("b", lambda: linear(256))
+            registry.unload("b")
+        self.assertEqual(locked, [False, False])
+
+    def test_failed_load_is_retried(self):
+        registry = ModelRegistry()
+        def fail():
+            raise Exception("download failed")
+        with self.assertRaises(Exception):
+            registry.get("model", fail)
+        self.assertIsNotNone(registry.get("model", lambda: linear(8)))
+
+    def test_process_registry(self):
+        self.assertIs(get_model_registry(), get_model_registry())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import os, sys
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from llm_server.sources.model_registry import ModelRegistry
+
+GB = 1024**3
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        self.sizes = {"router": 1 * GB, "reasoner": 8 * GB, "coder": 6 * GB}
+        self.loaded = []
+        self.unloaded = []
+
+    def load(self, name):
+        self.loaded.append(name)
+        return f"weights of {name}", self.sizes[name]
+
+    def unload(self, name, handle):
+        self.unloaded.append(name)
+
+    def test_models_stay_resident(self):
+        """Test that models fitting in the budget are loaded once and kept side by side"""
+        registry = ModelRegistry(self.load, self.unload, max_bytes=10 * GB)
+        for name in ["router", "reasoner", "router", "reasoner"]:
+            with registry.use(name) as handle:
+                self.assertEqual(handle, f"weights of {name}")
+        self.assertEqual(self.loaded, ["router", "reasoner"])
+        metrics = registry.get_metrics()
+        self.assertEqual(metrics["bytes"], 9 * GB)
+        self.assertEqual(metrics["loads"], 2)
+        self.assertIsNotNone(metrics["resident"][0]["load_time"])
+
+    def test_lru_eviction(self):
+        """Test that the least recently used model is unloaded to fit a new one"""
+        registry = ModelRegistry(self.load, self.unload, max_bytes=10 * GB)
+        for name in ["router", "reasoner", "router", "coder"]:
+            with registry.use(name):
+                pass
+        self.assertEqual(self.unloaded, ["reasoner"])
+        self.assertEqual([m["model"] for m in registry.get_metrics()["resident"]], ["router", "coder"])
+
+    def test_unload_without_lock(self):
+        """Test that evicted models are unloaded after the registry lock is released"""
+        registry = ModelRegistry(self.load, lambda name, handle: self.unloaded.append(registry.lock.locked()), max_bytes=10 * GB)
+        for name in ["router", "reasoner", "coder"]:
+            with registry.use(name):
+                pass
+        self.assertEqual(self.unloaded, [False, False])
+
+    def test_model_in_use_not_evicted(self):
+        """Test that a model used by a generation is kept over the budget and unloaded once released"""
+        registry = ModelRegistry(self.load, self.unload, max_bytes=10 * GB)
+        registry.acquire("reasoner")
+        with registry.use("coder"):
+            pass
+        self.assertEqual(self.unloaded, ["coder"])
+        registry.acquire("coder")
+        self.assertEqual(self.unloaded, ["coder"])
+        registry.release("reasoner")
+        self.assertEqual(self.unloaded, ["coder", "reasoner"])
+
+    def test_concurrent_load_once(self):
+        """Test that concurrent requests for a model wait for a single load"""
+        registry = ModelRegistry(self.load, self.unload, max_models=2)
+        threads = [threading.Thread(target=registry.acquire, args=("router",)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+        self.assertEqual(self.loaded, ["router"])
+
+    def test_failed_load(self):
+        """Test that a failed load is raised and retried on the next request"""
+        registry = ModelRegistry(self.load, self.unload)
+        with self.assertRaises(KeyError):
+            registry.acquire("missing")
+        self.sizes["missing"] = GB
+        self.assertEqual(registry.acquire("missing"), "weights of missing")
+
+    def test_failed_load_releases_its_entry(self):
+        """Test that the release after a failed load doesn't touch the entry of a newer load of the same model"""
+        test = self
+        class RacingRegistry(ModelRegistry):
+            def load(self, entry):
+                super().load(entry)
+                if entry.error is not None: # a new request for the model comes in before the failed one is released
+                    test.sizes["missing"] = GB
+                    self.acquire("missing")
+        registry = RacingRegistry(self.load, self.unload)
+        with self.assertRaises(KeyError):
+            registry.acquire("missing")
+        self.assertEqual(registry.get_metrics()["resident"][0]["in_use"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
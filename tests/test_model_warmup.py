@@ -0,0 +1,57 @@
+import unittest
+import os, sys
+import time
+import socket
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from sources.health_monitor import HealthMonitor
+from sources.fake_llm import FakeLLM, FakeLLMServer
+from sources.llm_provider import Provider
+
+class TestModelWarmup(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeLLMServer(FakeLLM(script={"default": ["ready"]}, load_time=0.3)).start()
+        self.provider = Provider("ollama", "fake", self.server.address, keep_alive="-1",
+                                 health_monitor=HealthMonitor(background=False))
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_keep_alive_parsing(self):
+        """Test that numeric keep_alive values from the config are sent as numbers"""
+        self.assertEqual(self.provider.keep_alive, -1)
+        self.assertEqual(Provider("test", "fake", keep_alive="30m").keep_alive, "30m")
+
+    def test_warm_up_reports_load_time(self):
+        """Test that the warm-up loads the model and reports the load time"""
+        self.provider.start_warm_up()
+        self.assertFalse(self.provider.is_warm())
+        self.assertTrue(self.provider.wait_until_warm(timeout=5))
+        status = list(self.provider.warm_status.values())[0]
+        self.assertTrue(status["loaded"])
+        self.assertGreaterEqual(status["load_time"], 0.3)
+        start = time.perf_counter()
+        self.assertEqual(self.provider.respond([{"role": "user", "content": "Hi"}], verbose=False), "ready")
+        self.assertLess(time.perf_counter() - start, 0.3)
+
+    def test_requests_wait_for_warm_up(self):
+        """Test that a request sent during the warm-up is answered after it"""
+        self.provider.start_warm_up()
+        answer = self.provider.respond([{"role": "user", "content": "Hi"}], verbose=False)
+        self.assertEqual(answer, "ready")
+        self.assertTrue(self.provider.is_warm())
+
+    def test_failed_warm_up_does_not_block(self):
+        """Test that an unreachable host is reported without blocking requests for ever"""
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        address = f"127.0.0.1:{sock.getsockname()[1]}"
+        sock.close()
+        provider = Provider("ollama", "fake", address, health_monitor=HealthMonitor(background=False))
+        provider.start_warm_up()
+        self.assertTrue(provider.wait_until_warm(timeout=5))
+        self.assertFalse(list(provider.warm_status.values())[0]["loaded"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import os, sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from llm_server.sources.state_cache import PrefixStateCache, prefix_hashes
+
+class TestPrefixStateCache(unittest.TestCase):
+    def setUp(self):
+        self.history = [{"role": "system", "content": "You are a planner."},
+                        {"role": "user", "content": "Plan a trip"}]
+
+    def test_prefix_hashes(self):
+        """Test that a prefix hash only depends on the role and content of the messages before it"""
+        longer = self.history + [{"role": "assistant", "content": "Sure"}]
+        self.assertEqual(prefix_hashes(longer)[:2], prefix_hashes(self.history))
+        timed = [dict(m, time="2025-01-01 10:00:00") for m in self.history]
+        self.assertEqual(prefix_hashes(timed), prefix_hashes(self.history))
+
+    def test_longest_prefix(self):
+        """Test that the state of the longest cached prefix of a conversation is returned"""
+        cache = PrefixStateCache()
+        cache.put(self.history[:1], "system state")
+        cache.put(self.history, "turn state")
+        next_turn = self.history + [{"role": "assistant", "content": "Sure"}, {"role": "user", "content": "In June"}]
+        self.assertEqual(cache.lookup(next_turn), (2, "turn state"))
+        other = self.history[:1] + [{"role": "user", "content": "Other task"}]
+        self.assertEqual(cache.lookup(other), (1, "system state"))
+        self.assertEqual(cache.lookup([{"role": "system", "content": "You are a coder."}]), (0, None))
+
+    def test_eviction(self):
+        """Test that the least recently used states are evicted over the count and size limits"""
+        cache = PrefixStateCache(max_states=2, max_bytes=100)
+        conversations = [[{"role": "user", "content": str(i)}] for i in range(3)]
+        cache.put(conversations[0], "a", 10)
+        cache.put(conversations[1], "b", 10)
+        cache.lookup(conversations[0])
+        cache.put(conversations[2], "c", 10)
+        self.assertEqual(cache.lookup(conversations[1]), (0, None))
+        self.assertEqual(cache.lookup(conversations[0]), (1, "a"))
+        cache.put(conversations[1], "big", 95)
+        self.assertEqual(cache.get_stats()["states"], 1)
+        self.assertLessEqual(cache.get_stats()["bytes"], 100)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,70 +1,79 @@
 import unittest
-from unittest.mock import patch, MagicMock
+import asyncio
 import os, sys
-import socket
-import subprocess
-from urllib.parse import urlparse
-import platform
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
 
 from sources.llm_provider import Provider
 
-class TestIsIpOnline(unittest.TestCase):
+class TestStreamRespond(unittest.TestCase):
     def setUp(self):
-        self.checker = Provider("ollama", "deepseek-r1:32b")
+        self.provider = Provider("test", "test-model")
 
-    def test_empty_address(self):
-        """Test with empty address"""
-        result = self.checker.is_ip_online("")
-        self.assertFalse(result)
+    def test_stream_matches_respond(self):
+        """Test that the streamed chunks add up to the full answer"""
+        chunks = list(self.provider.stream_respond([], verbose=False))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), self.provider.respond([], verbose=False))
 
-    def test_localhost(self):
-        """Test with localhost"""
-        test_cases = [
-            "localhost",
-            "http://localhost",
-            "https://localhost",
-            "127.0.0.1",
-            "http://127.0.0.1",
-            "https://127.0.0.1:8080"
-        ]
-        for address in test_cases:
-            with self.subTest(address=address):
-                result = self.checker.is_ip_online(address)
-                self.assertTrue(result)
+    def test_fallback_single_chunk(self):
+        """Test that providers without streaming yield their whole answer once"""
+        del self.provider.available_stream_providers["test"]
+        chunks = list(self.provider.stream_respond([], verbose=False))
+        self.assertEqual(chunks, [self.provider.respond([], verbose=False)])
 
-    def test_google_ips(self):
-        """Test with known Google IPs"""
-        google_ips = [
-            "74.125.197.100",
-            "74.125.197.139",
-            "74.125.197.101",
-            "74.125.197.113",
-            "74.125.197.102",
-            "74.125.197.138"
-        ]
-        for ip in google_ips:
-            with self.subTest(ip=ip), \
-                 patch('socket.gethostbyname', return_value=ip), \
-                 patch('subprocess.run', return_value=MagicMock(returncode=0)):
-                result = self.checker.is_ip_online(ip)
-                self.assertTrue(result)
+    def test_stream_error_after_chunks(self):
+        """Test that an error after the first chunks is raised instead of being appended to the answer"""
+        def refused(history, verbose):
+            yield "partial"
+            raise Exception("Connection refused")
+        self.provider.available_stream_providers["test"] = refused
+        chunks = []
+        with self.assertRaises(Exception):
+            for chunk in self.provider.stream_respond([], verbose=False):
+                chunks.append(chunk)
+        self.assertEqual(chunks, ["partial"])
 
-    def test_unresolvable_hostname(self):
-        """Test with unresolvable hostname"""
-        address = "nonexistent.example.com"
-        with patch('socket.gethostbyname', side_effect=socket.gaierror):
-            result = self.checker.is_ip_online(address)
-            self.assertFalse(result)
+class TestAsyncRespond(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.provider = Provider("test", "test-model")
+
+    async def test_arespond_matches_respond(self):
+        """Test that the async path gives the same answer as the sync path"""
+        answer = await self.provider.arespond([], verbose=False)
+        self.assertEqual(answer, self.provider.respond([], verbose=False))
+
+    async def test_concurrent_calls(self):
+        """Test that many async calls can run on the same event loop"""
+        answers = await asyncio.gather(*[self.provider.arespond([], verbose=False) for _ in range(8)])
+        self.assertEqual(len(set(answers)), 1)
+
+    async def test_thread_fallback(self):
+        """Test that providers without async implementation are run in a worker thread"""
+        del self.provider.available_async_stream_providers["test"]
+        chunks = [chunk async for chunk in self.provider.astream_respond([], verbose=False)]
+        self.assertEqual("".join(chunks), self.provider.respond([], verbose=False))
+
+    async def test_astream_error_after_chunks(self):
+        """Test that the async path raises an error coming after the first chunks too"""
+        async def refused(history, verbose):
+            yield "partial"
+            raise Exception("Connection refused")
+        self.provider.available_async_stream_providers["test"] = refused
+        chunks = []
+        with self.assertRaises(Exception):
+            async for chunk in self.provider.astream_respond([], verbose=False):
+                chunks.append(chunk)
+        self.assertEqual(chunks, ["partial"])
 
-    def test_valid_domain(self):
-        """Test with valid domain name"""
-        address = "google.com"
-        with patch('socket.gethostbyname', return_value="142.250.190.78"), \
-             patch('subprocess.run', return_value=MagicMock(returncode=0)):
-            result = self.checker.is_ip_online(address)
-            self.assertTrue(result)
+class TestClientRegistry(unittest.TestCase):
+    def test_client_reused(self):
+        """Test that the provider reuses its client between calls"""
+        provider = Provider("lm-studio", "test-model", "127.0.0.1:1234", is_local=True)
+        session = provider.clients.session(provider.lm_studio_url())
+        self.assertIs(session, provider.clients.session(provider.lm_studio_url()))
+        provider.clients.close()
+        self.assertIsNot(session, provider.clients.session(provider.lm_studio_url()))
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
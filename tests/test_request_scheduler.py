@@ -0,0 +1,90 @@
+import unittest
+import os, sys
+import time
+import asyncio
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from sources.request_scheduler import RequestScheduler, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from sources.fake_llm import FakeLLM
+from sources.llm_provider import Provider
+
+class TestRequestScheduler(unittest.TestCase):
+    def test_concurrency_limit(self):
+        """Test that no more than max_concurrent requests run at once"""
+        scheduler = RequestScheduler(max_concurrent=2)
+        running = []
+        peak = []
+        lock = threading.Lock()
+        def work():
+            with scheduler.slot():
+                with lock:
+                    running.append(1)
+                    peak.append(len(running))
+                time.sleep(0.02)
+                with lock:
+                    running.pop()
+        threads = [threading.Thread(target=work) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(max(peak), 2)
+        metrics = scheduler.get_metrics()
+        self.assertEqual(metrics["active"], 0)
+        self.assertEqual(metrics["wait_time"][PRIORITY_INTERACTIVE]["requests"], 6)
+        self.assertGreater(metrics["max_queue_depth"], 0)
+
+    def test_interactive_before_background(self):
+        """Test that waiting user turns are served before waiting background work"""
+        scheduler = RequestScheduler(max_concurrent=1)
+        order = []
+        scheduler.acquire()
+        def work(priority, name):
+            with scheduler.slot(priority):
+                order.append(name)
+        background = threading.Thread(target=work, args=(PRIORITY_BACKGROUND, "background"))
+        background.start()
+        while scheduler.get_metrics()["queue_depth"] < 1:
+            time.sleep(0.001)
+        interactive = threading.Thread(target=work, args=(PRIORITY_INTERACTIVE, "interactive"))
+        interactive.start()
+        while scheduler.get_metrics()["queue_depth"] < 2:
+            time.sleep(0.001)
+        scheduler.release()
+        background.join()
+        interactive.join()
+        self.assertEqual(order, ["interactive", "background"])
+
+    def test_cancelled_waiter_leaves_queue(self):
+        """Test that a cancelled async request doesn't keep its place in the queue"""
+        async def scenario():
+            scheduler = RequestScheduler(max_concurrent=1)
+            await scheduler.aacquire()
+            waiting = asyncio.create_task(scheduler.aacquire())
+            await asyncio.sleep(0.01)
+            waiting.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+            scheduler.release()
+            return scheduler.get_metrics()
+        metrics = asyncio.run(scenario())
+        self.assertEqual(metrics["active"], 0)
+        self.assertEqual(metrics["queue_depth"], 0)
+
+    def test_provider_respects_limit(self):
+        """Test that concurrent provider calls are admitted max_concurrent at a time"""
+        scheduler = RequestScheduler(max_concurrent=2)
+        provider = Provider("test", "test-model", fake_llm=FakeLLM(script={"default": ["ok"]}, ttft=0.05), scheduler=scheduler)
+        async def scenario():
+            return await asyncio.gather(*[provider.arespond([], verbose=False) for _ in range(4)])
+        start = time.perf_counter()
+        answers = asyncio.run(scenario())
+        elapsed = time.perf_counter() - start
+        self.assertEqual(answers, ["ok"] * 4)
+        self.assertGreaterEqual(elapsed, 0.1)
+        self.assertEqual(scheduler.get_metrics()["max_queue_depth"], 2)
+
+if __name__ == '__main__':
+    unittest.main()
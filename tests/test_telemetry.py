@@ -0,0 +1,83 @@
+import unittest
+import os, sys
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from sources.telemetry import Telemetry, Histogram
+from sources.health_monitor import HealthMonitor
+from sources.fake_llm import FakeLLM, FakeLLMServer
+from sources.llm_provider import Provider
+
+class TestTelemetry(unittest.TestCase):
+    def test_histogram(self):
+        """Test that a histogram counts values in buckets and estimates quantiles"""
+        histogram = Histogram([1, 2, 5])
+        for value in [0.5, 1.5, 1.5, 10]:
+            histogram.observe(value)
+        summary = histogram.summary()
+        self.assertEqual(summary["buckets"], {"1": 1, "2": 2, "5": 0, "+Inf": 1})
+        self.assertEqual(summary["p50"], 2)
+        self.assertEqual(summary["max"], 10)
+
+    def test_summary_per_agent_and_model(self):
+        """Test that calls are aggregated per agent and per model"""
+        telemetry = Telemetry()
+        for agent, model in [("coder", "a"), ("coder", "b"), ("planner", "a")]:
+            telemetry.track(agent, "test", model, [{"role": "user", "content": "12345678"}]).finish("1234")
+        by_agent = telemetry.get_summary("agent")
+        self.assertEqual(by_agent["coder"]["calls"], 2)
+        self.assertEqual(by_agent["planner"]["prompt_tokens"], 2)
+        self.assertEqual(telemetry.get_summary("model")["a"]["calls"], 2)
+        self.assertIn("coder/b", telemetry.get_summary("agent_model"))
+
+    def test_provider_records_calls(self):
+        """Test that streamed calls record the time to first token and the completion tokens"""
+        provider = Provider("test", "fake", fake_llm=FakeLLM(script={"default": ["one two three"]}, ttft=0.05, tokens_per_sec=100))
+        asyncio.run(provider.arespond([{"role": "user", "content": "Hi"}], verbose=False, agent_name="coder"))
+        record = provider.telemetry.get_records()[-1]
+        self.assertEqual(record["agent"], "coder")
+        self.assertTrue(record["success"])
+        self.assertGreaterEqual(record["ttft"], 0.05)
+        self.assertGreater(record["latency"], record["ttft"])
+        self.assertIsNotNone(record["tokens_per_sec"])
+
+    def test_backend_usage_reported(self):
+        """Test that the token counts given by the backend are used instead of estimates"""
+        server = FakeLLMServer(FakeLLM(script={"default": ["one two three"]})).start()
+        try:
+            provider = Provider("ollama", "fake", server.address, health_monitor=HealthMonitor(background=False))
+            provider.respond([{"role": "user", "content": "Hi"}], verbose=False, agent_name="casual")
+        finally:
+            server.stop()
+        record = provider.telemetry.get_records()[-1]
+        self.assertFalse(record["estimated_tokens"])
+        self.assertEqual(record["completion_tokens"], 3)
+
+    def test_openai_stream_usage_reported(self):
+        """Test that the usage chunk ending an OpenAI stream is used, in the sync and async paths"""
+        server = FakeLLMServer(FakeLLM(script={"default": ["one two three", "four five six"]})).start()
+        try:
+            provider = Provider("openai", "fake", server.address, is_local=True, health_monitor=HealthMonitor(background=False))
+            provider.api_key = "local"
+            history = [{"role": "user", "content": "Hi"}]
+            self.assertEqual("".join(provider.stream_respond(history, verbose=False, agent_name="casual")), "one two three")
+            async def collect():
+                return "".join([chunk async for chunk in provider.astream_respond(history, verbose=False, agent_name="casual")])
+            self.assertEqual(asyncio.run(collect()), "four five six")
+        finally:
+            server.stop()
+        for record in provider.telemetry.get_records()[-2:]:
+            self.assertFalse(record["estimated_tokens"])
+            self.assertEqual(record["completion_tokens"], 3)
+
+    def test_offline_call_recorded(self):
+        """Test that a call to an offline server is recorded as failed"""
+        provider = Provider("ollama", "fake", "127.0.0.1:1", health_monitor=HealthMonitor(background=False))
+        provider.acquire_endpoint = lambda tried: None
+        provider.respond([{"role": "user", "content": "Hi"}], verbose=False, agent_name="casual")
+        record = provider.telemetry.get_records()[-1]
+        self.assertFalse(record["success"])
+
+if __name__ == '__main__':
+    unittest.main()
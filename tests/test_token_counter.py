@@ -0,0 +1,70 @@
+import unittest
+import os, sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from sources.token_counter import TokenCounter, ContextBudget, ApproximateTokenizer, get_token_counter, register_tokenizer
+
+class WordTokenizer():
+    """
+    One token per word, so the budgets are easy to compute.
+    """
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, text):
+        self.calls += 1
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+def message(role, words):
+    return {'role': role, 'content': " ".join(["w"] * words)}
+
+class TestTokenCounter(unittest.TestCase):
+    def test_counts_are_cached(self):
+        """Test that a text is tokenized once"""
+        tokenizer = WordTokenizer()
+        counter = TokenCounter(tokenizer, message_overhead=2)
+        history = [message('user', 10), message('assistant', 5)]
+        self.assertEqual(counter.count_messages(history), 19)
+        self.assertEqual(counter.count_messages(history), 19)
+        self.assertEqual(tokenizer.calls, 2)
+
+    def test_truncate(self):
+        counter = TokenCounter(WordTokenizer())
+        self.assertEqual(counter.truncate("a b c d", 2), "a b")
+        self.assertEqual(counter.truncate("a b", 5), "a b")
+        approximate = TokenCounter(ApproximateTokenizer())
+        text = "The memory is compressed when the conversation is too long. " * 10
+        self.assertLessEqual(approximate.count(approximate.truncate(text, 20)), 20)
+        self.assertTrue(text.startswith(approximate.truncate(text, 20)))
+
+    def test_fit_drops_oldest_messages(self):
+        """Test that the system prompt and last message are kept and the budget is exact"""
+        counter = TokenCounter(WordTokenizer(), message_overhead=1)
+        budget = ContextBudget(counter, context_length=40, reserve=10)
+        messages = [message('system', 5), message('user', 10), message('assistant', 10), message('user', 8)]
+        fitted = budget.fit(messages)
+        self.assertEqual(fitted, [messages[0], messages[2], messages[3]])
+        self.assertEqual(counter.count_messages(fitted), 26)
+        self.assertEqual(budget.room_for(messages[:1]), 23)
+        self.assertEqual(budget.fit(messages[:2]), messages[:2])
+
+    def test_fit_truncates_last_message(self):
+        counter = TokenCounter(WordTokenizer(), message_overhead=1)
+        budget = ContextBudget(counter, context_length=20)
+        fitted = budget.fit([message('system', 5), message('user', 10), message('user', 30)])
+        self.assertEqual(len(fitted), 2)
+        self.assertEqual(counter.count_messages(fitted), 20)
+
+    def test_registered_tokenizer(self):
+        tokenizer = WordTokenizer()
+        register_tokenizer("word-model", tokenizer)
+        counter = get_token_counter("word-model")
+        self.assertIs(counter.tokenizer, tokenizer)
+        self.assertIs(get_token_counter("word-model"), counter)
+
+if __name__ == '__main__':
+    unittest.main()